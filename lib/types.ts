@@ -99,6 +99,18 @@ export interface LivePlaybackStatus {
   volume: number
   brightness?: number
   errorMessage?: string
+  // Gap between the end of one item and the first frame of the next
+  transitionMs?: number | null
+  // Compact player metrics; the full set is served on the device's /metrics endpoint
+  metrics?: {
+    commands: number
+    commandErrors: number
+    firstFrameMs: number | null
+    listenerLagMs: number | null
+    cacheHitRatio: number | null
+    downloadKBps: number | null
+    startupFirstFrameMs: number | null
+  }
 }
 
 // Device registration types
@@ -117,12 +129,14 @@ export interface DeviceRegistration {
 export interface PlaybackCommand {
   commandId: string
   displayId: string
-  type: "play" | "pause" | "stop" | "skip" | "volume" | "brightness" | "restart"
+  type: "play" | "pause" | "stop" | "skip" | "volume" | "brightness" | "restart" | "upload_logs"
   payload?: {
     contentId?: string
     volume?: number
     brightness?: number
     scheduleId?: string
+    limit?: number
+    level?: string
   }
   timestamp: number
   status: "pending" | "executed" | "failed"
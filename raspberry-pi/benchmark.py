@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+PanelSena Player Benchmarks
+Runs PanelSenaPlayer against the fake_backend stand-ins and reports latency percentiles and backend traffic
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from fake_backend import FakeFirebase, FakeVLC, percentile, latency_summary
+from player import PanelSenaPlayer
+
+DEVICE_ID = "bench-device"
+DEVICE_KEY = "bench-key"
+USER_ID = "bench-user"
+DISPLAY_ID = "bench-display"
+SCHEDULE_ID = "bench-schedule"
+DISPLAY_PATH = f"users/{USER_ID}/displays/{DISPLAY_ID}"
+
+BENCH_CONFIG = {
+    "device_id": DEVICE_ID,
+    "device_key": DEVICE_KEY,
+    "display_name": "Benchmark Display",
+    "log_level": "WARNING",
+    "metrics_port": 0,
+}
+
+WAIT_TIMEOUT_SECONDS = 30
+
+# Boot scenario: a request round trip to Firebase, and libvlc's start-up time
+BOOT_RTT_SECONDS = 0.08
+BOOT_VLC_INIT_SECONDS = 0.4
+
+
+class BenchPlayer:
+    """A player running in a scratch directory against fresh stand-ins"""
+
+    def __init__(self, content_count=5, content_bytes=256 * 1024, media_seconds=0.2,
+                 bytes_per_second=None, config=None, workdir=None, rtt_seconds=0, vlc_init_seconds=0):
+        # Reusing a workdir boots with the previous player's cache and stored link
+        self.workdir = workdir or tempfile.mkdtemp(prefix="panelsena-bench-")
+        self.previous_cwd = os.getcwd()
+        # The player keeps its content and cache directories relative to the cwd
+        os.chdir(self.workdir)
+
+        self.firebase = FakeFirebase(bytes_per_second, rtt_seconds)
+        self.firebase.seed_device(DEVICE_ID, DEVICE_KEY, USER_ID, DISPLAY_ID)
+        self.content_ids = [f"content-{i}" for i in range(content_count)]
+        for content_id in self.content_ids:
+            self.firebase.seed_content(content_id, content_bytes)
+        self.firebase.seed_schedule(SCHEDULE_ID, self.content_ids)
+
+        self.vlc = FakeVLC(media_seconds=media_seconds, init_seconds=vlc_init_seconds)
+        self.created_at = time.monotonic()
+        self.player = PanelSenaPlayer(
+            config={**BENCH_CONFIG, **(config or {})},
+            firebase=self.firebase,
+            vlc_module=self.vlc
+        )
+        self.command_ids = itertools.count(1)
+
+        self.thread = threading.Thread(target=self.player.run)
+        self.thread.daemon = True
+        self.thread.start()
+        self.wait_for(lambda: self.firebase.db.listeners, "command listener")
+        self.online_at = time.monotonic()
+
+    def send(self, command_type, payload=None):
+        """Write a pending command the way the dashboard does; returns (command_id, sent_at)"""
+        command_id = f"cmd-{next(self.command_ids)}"
+        sent_at = time.monotonic()
+        self.firebase.db.reference(f"{DISPLAY_PATH}/commands/{command_id}").set({
+            'commandId': command_id,
+            'displayId': DISPLAY_ID,
+            'type': command_type,
+            'payload': payload or {},
+            'timestamp': int(time.time() * 1000),
+            'status': 'pending',
+        })
+        return command_id, sent_at
+
+    def play_schedule(self):
+        """Start the seeded schedule and wait for its first frame; returns the latency"""
+        frames = len(self.vlc.events_of('playing'))
+        _, sent_at = self.send('play', {'scheduleId': SCHEDULE_ID})
+        self.wait_for(lambda: len(self.vlc.events_of('playing')) > frames, "first frame")
+        return self.vlc.events_of('playing')[frames][0] - sent_at
+
+    def ack_times(self):
+        """command_id -> monotonic time its status was first written back"""
+        acks = {}
+        commands_path = f"{DISPLAY_PATH}/commands"
+        for written_at, op, path, payload in self.firebase.stats.write_log:
+            if op != 'rtdb.update' or path != commands_path:
+                continue
+            for key in payload:
+                command_id, _, field = key.partition('/')
+                if field == 'status':
+                    acks.setdefault(command_id, written_at)
+        return acks
+
+    @staticmethod
+    def wait_for(predicate, what, timeout=WAIT_TIMEOUT_SECONDS):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for {what}")
+            time.sleep(0.005)
+
+    def close(self, keep_workdir=False):
+        self.player.running = False
+        self.thread.join(timeout=10)
+        os.chdir(self.previous_cwd)
+        if not keep_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def bench_cold_start(iterations):
+    """Play command to first frame on a fresh player with an empty cache"""
+    latencies = []
+    traffic = []
+    for _ in range(iterations):
+        bench = BenchPlayer()
+        try:
+            bench.firebase.stats.reset()
+            latencies.append(bench.play_schedule())
+            traffic.append(bench.firebase.stats.summary())
+        finally:
+            bench.close()
+    return {
+        'firstFrame': latency_summary(latencies),
+        'perStart': {key: sum(t[key] for t in traffic) / len(traffic) for key in traffic[0]},
+    }
+
+
+def bench_boot(iterations):
+    """Player start to first frame and to listening for commands, rebooting into a cached schedule"""
+    options = {'rtt_seconds': BOOT_RTT_SECONDS, 'vlc_init_seconds': BOOT_VLC_INIT_SECONDS}
+    # The first run links the device and caches the whole schedule
+    seed = BenchPlayer(**options)
+    workdir = seed.workdir
+    try:
+        seed.play_schedule()
+        seed.wait_for(lambda: len(seed.vlc.events_of('playing')) > len(seed.content_ids), "first loop")
+    finally:
+        seed.close(keep_workdir=True)
+
+    first_frames = []
+    online = []
+    try:
+        for _ in range(iterations):
+            bench = BenchPlayer(workdir=workdir, **options)
+            try:
+                bench.wait_for(lambda: bench.vlc.events_of('playing'), "first frame")
+                first_frames.append(bench.vlc.events_of('playing')[0][0] - bench.created_at)
+                online.append(bench.online_at - bench.created_at)
+            finally:
+                bench.close(keep_workdir=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'firstFrame': latency_summary(first_frames),
+        'listening': latency_summary(online),
+        'rttMs': BOOT_RTT_SECONDS * 1000,
+        'vlcInitMs': BOOT_VLC_INIT_SECONDS * 1000,
+    }
+
+
+def bench_queue_looping(iterations):
+    """Transition gaps and backend traffic while a schedule loops over cached content"""
+    bench = BenchPlayer(content_count=5, media_seconds=0.05)
+    try:
+        bench.play_schedule()
+        # Let the first pass fill the cache, then measure
+        items = len(bench.content_ids)
+        bench.wait_for(lambda: len(bench.vlc.events_of('playing')) > items, "first loop")
+        bench.firebase.stats.reset()
+        start = len(bench.vlc.events_of('playing'))
+        target = start + iterations * items
+        bench.wait_for(lambda: len(bench.vlc.events_of('playing')) >= target, "queue loops")
+
+        ended = bench.vlc.events_of('ended')
+        frames = bench.vlc.events_of('playing')[start:target]
+        gaps = []
+        for frame_at, _ in frames:
+            previous = [t for t, _ in ended if t <= frame_at]
+            if previous:
+                gaps.append(frame_at - previous[-1])
+        traffic = bench.firebase.stats.summary()
+    finally:
+        bench.close()
+    return {
+        'transition': latency_summary(gaps),
+        'perItem': {key: value / len(frames) for key, value in traffic.items()},
+    }
+
+
+def bench_command_burst(iterations):
+    """Time from command write to ack for bursts of control commands during playback"""
+    bench = BenchPlayer(media_seconds=60)
+    latencies = []
+    try:
+        bench.play_schedule()
+        bench.firebase.stats.reset()
+        burst = itertools.cycle([
+            ('volume', {'volume': 40}), ('volume', {'volume': 60}), ('pause', None),
+            ('pause', None), ('upload_logs', {'limit': 50}),
+        ])
+        sent = {}
+        for _ in range(iterations):
+            for command_type, payload in itertools.islice(burst, 20):
+                command_id, sent_at = bench.send(command_type, payload)
+                sent[command_id] = sent_at
+            bench.wait_for(lambda: set(sent) <= set(bench.ack_times()), "command acks")
+        acks = bench.ack_times()
+        latencies = [acks[command_id] - sent_at for command_id, sent_at in sent.items()]
+        traffic = bench.firebase.stats.summary()
+        commands_path = f"{DISPLAY_PATH}/commands"
+        ack_writes = sum(1 for _, op, path, _ in bench.firebase.stats.write_log
+                         if op == 'rtdb.update' and path == commands_path)
+    finally:
+        bench.close()
+    return {
+        'commandToAck': latency_summary(latencies),
+        'commands': len(latencies),
+        'ackWrites': ack_writes,
+        # Includes the benchmark's own command writes
+        'traffic': traffic,
+    }
+
+
+def bench_heartbeat(iterations):
+    """Status write rate and size over `iterations` seconds of looping playback"""
+    bench = BenchPlayer(media_seconds=1, config={
+        'heartbeat_fast_seconds': 0.2,
+        'heartbeat_idle_seconds': 1,
+        'heartbeat_fast_window_seconds': 1,
+    })
+    try:
+        bench.play_schedule()
+        bench.firebase.stats.reset()
+        time.sleep(iterations)
+        status_path = f"{DISPLAY_PATH}/status"
+        writes = [payload for _, _, path, payload in bench.firebase.stats.write_log if path == status_path]
+    finally:
+        bench.close()
+    sizes = sorted(len(json.dumps(payload)) for payload in writes)
+    heartbeat_only = sum(1 for payload in writes if set(payload) == {'lastHeartbeat'})
+    return {
+        'writesPerSecond': round(len(writes) / iterations, 2),
+        'heartbeatOnlyWrites': heartbeat_only,
+        'changeWrites': len(writes) - heartbeat_only,
+        'bytesP50': percentile(sizes, 50) if sizes else 0,
+        'bytesP99': percentile(sizes, 99) if sizes else 0,
+        'bytesPerSecond': round(sum(sizes) / iterations, 1),
+    }
+
+
+SCENARIOS = {
+    'cold_start': (bench_cold_start, 5),
+    'boot': (bench_boot, 5),
+    'queue_looping': (bench_queue_looping, 10),
+    'command_burst': (bench_command_burst, 5),
+    'heartbeat': (bench_heartbeat, 10),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PanelSena player against in-process stand-ins")
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('-n', '--iterations', type=int,
+                        help="Iterations (starts, loops, bursts or seconds) per scenario")
+    parser.add_argument('--json', metavar='FILE', help="Also write the results to FILE")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.scenarios or list(SCENARIOS):
+        run, default_iterations = SCENARIOS[name]
+        started = time.monotonic()
+        results[name] = run(args.iterations or default_iterations)
+        print(f"{name} ({time.monotonic() - started:.1f}s)")
+        print(json.dumps(results[name], indent=2))
+        sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
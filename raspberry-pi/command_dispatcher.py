@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+PanelSena Command Dispatcher
+Prioritized, coalescing command queue between the Firebase listener and command execution,
+running on the player's asyncio event loop
+"""
+
+import asyncio
+import logging
+import itertools
+import threading
+
+log = logging.getLogger(__name__)
+
+# Lower runs first; stop and restart jump ahead of everything else
+COMMAND_PRIORITIES = {
+    'stop': 0,
+    'restart': 0,
+    'pause': 1,
+    'skip': 1,
+    'volume': 2,
+    'brightness': 2,
+}
+DEFAULT_PRIORITY = 2
+
+# Only the latest value of these matters, so a burst collapses into one
+COALESCED_TYPES = ('volume', 'brightness')
+
+# Commands that cancel a play in progress
+CANCELS_PLAY = ('stop', 'restart')
+
+# How long acks wait for company before being written as one update
+ACK_BATCH_DELAY = 0.2
+ACK_RETRY_DELAY = 5
+
+
+class CommandDispatcher:
+    """Runs commands as tasks on the player's event loop
+
+    Every method must be called on the loop; the Firebase listener hands
+    commands over with `call_soon_threadsafe`.
+    """
+
+    def __init__(self, execute, drop, claim, replay_ack):
+        # await execute(command_id, command) runs a command; plays are cancelled through their task
+        self.execute = execute
+        # drop(command_id, command, status, result) acknowledges a command that will not run
+        self.drop = drop
+        # claim(command_id) -> False if the command was processed before, even in an earlier run
+        self.claim = claim
+        # replay_ack(command_id) re-sends the outcome of a command processed in an earlier run
+        self.replay_ack = replay_ack
+
+        self.sequence = itertools.count()
+
+        # Control lane: everything except play, one worker, by priority then arrival
+        self.control_queue = None  # asyncio.PriorityQueue, created on the loop by start()
+        self.queued = {}       # command_id -> command, for control commands not yet started
+        self.latest_of_type = {}  # coalesced type -> command_id of its newest queued command
+
+        # Play lane: plays can take minutes (downloads), so they run on their own
+        # worker. At most one play waits, and a newer play cancels the running one.
+        self.pending_play = None
+        self.play_task = None
+        self.play_ready = None  # asyncio.Event, created on the loop by start()
+
+        # Commands seen by this run; forgotten once compaction deletes them
+        self.known_ids = set()
+        self.workers = []
+
+    def start(self):
+        self.control_queue = asyncio.PriorityQueue()
+        self.play_ready = asyncio.Event()
+        self.workers = [asyncio.ensure_future(self.control_loop()), asyncio.ensure_future(self.play_loop())]
+
+    async def stop(self):
+        """Cancel the workers and any play in progress
+
+        A command that stops the player (restart) calls this from its own
+        worker, which is left to finish that command.
+        """
+        current = asyncio.current_task()
+        tasks = [task for task in self.workers + [self.play_task] if task is not None and task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+
+    def forget(self, command_ids):
+        """Drop commands deleted from the commands node; the listener cannot deliver them again"""
+        self.known_ids.difference_update(command_ids)
+
+    def submit(self, command_id, command):
+        """Queue a command from the listener; never waits on execution"""
+        command_type = command.get('type')
+        # Listener reconnects deliver every still-pending command again
+        if command_id in self.known_ids:
+            return
+        self.known_ids.add(command_id)
+
+        if not self.claim(command_id):
+            # Handled before a restart; only its ack may have been lost
+            log.info("Command %s already processed, not running it again", command_id)
+            self._drop_later(command_id, command, None, None, replay=True)
+            return
+
+        if command_type == 'play':
+            self._submit_play(command_id, command)
+            return
+
+        if command_type in CANCELS_PLAY:
+            self._cancel_play(f"Cancelled by {command_type} command")
+
+        if command_type in COALESCED_TYPES:
+            previous_id = self.latest_of_type.get(command_type)
+            if previous_id in self.queued:
+                previous = self.queued.pop(previous_id)
+                self._drop_later(previous_id, previous, 'executed', f"Superseded by a newer {command_type} command")
+            self.latest_of_type[command_type] = command_id
+
+        self.queued[command_id] = command
+        priority = COMMAND_PRIORITIES.get(command_type, DEFAULT_PRIORITY)
+        self.control_queue.put_nowait((priority, next(self.sequence), command_id))
+
+    def _submit_play(self, command_id, command):
+        """Replace any waiting play and cancel the one in progress"""
+        self._cancel_play("Superseded by a newer play command")
+        self.pending_play = (command_id, command)
+        self.play_ready.set()
+
+    def _cancel_play(self, reason):
+        """Cancel the running play and drop the waiting one"""
+        if self.pending_play is not None:
+            command_id, command = self.pending_play
+            self.pending_play = None
+            self._drop_later(command_id, command, 'failed', reason)
+        if self.play_task is not None and not self.play_task.done():
+            log.info("Cancelling play in progress: %s", reason)
+            self.play_task.cancel()
+
+    def _drop_later(self, command_id, command, status, result, replay=False):
+        """Acknowledge a dropped command after submit() returns"""
+        loop = asyncio.get_running_loop()
+        if replay:
+            loop.call_soon(self.replay_ack, command_id)
+        else:
+            loop.call_soon(self.drop, command_id, command, status, result)
+
+    async def control_loop(self):
+        while True:
+            _, _, command_id = await self.control_queue.get()
+            command = self.queued.pop(command_id, None)
+            if command is not None and self.latest_of_type.get(command.get('type')) == command_id:
+                del self.latest_of_type[command.get('type')]
+            # Coalesced commands leave a stale entry in the queue; skip it
+            if command is None:
+                continue
+            await self.execute(command_id, command)
+
+    async def play_loop(self):
+        while True:
+            await self.play_ready.wait()
+            self.play_ready.clear()
+            if self.pending_play is None:
+                continue
+            command_id, command = self.pending_play
+            self.pending_play = None
+
+            # The play runs as its own task so a newer command can cancel it
+            self.play_task = asyncio.ensure_future(self.execute(command_id, command))
+            try:
+                await asyncio.wait([self.play_task])
+            finally:
+                self.play_task = None
+
+
+class CommandAcker:
+    """Collects command status acks and writes each burst as one multi-path update
+
+    `ack` is called on the event loop; the update itself runs through
+    `run_blocking` on the player's SDK executor.
+    """
+
+    def __init__(self, commands_ref_factory, run_blocking):
+        # Returns the commands reference, which depends on the current device link
+        self.commands_ref_factory = commands_ref_factory
+        self.run_blocking = run_blocking
+        self.pending = {}  # command_id -> {'status': ..., 'result': ...}
+        self.timer = None
+        self.flushes = set()
+
+    def ack(self, command_id, status, result):
+        self.pending[command_id] = {'status': status, 'result': result}
+        if self.timer is None:
+            self._schedule(ACK_BATCH_DELAY)
+
+    def _schedule(self, delay):
+        self.timer = asyncio.get_running_loop().call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        task = asyncio.ensure_future(self.flush())
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+
+    async def flush(self):
+        """Write all pending acks, and wait for writes already in flight; failed writes are retried later"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch = self.pending
+        self.pending = {}
+
+        current = asyncio.current_task()
+        others = [task for task in self.flushes if task is not current]
+        if others:
+            await asyncio.gather(*others, return_exceptions=True)
+
+        if not batch:
+            return
+
+        updates = {}
+        for command_id, outcome in batch.items():
+            updates[f'{command_id}/status'] = outcome['status']
+            updates[f'{command_id}/result'] = outcome['result']
+
+        try:
+            await self.run_blocking(self.commands_ref_factory().update, updates)
+            log.debug("Acknowledged %s command(s) in one update", len(batch))
+        except Exception as e:
+            log.error("Failed to update command status: %s", e)
+            # Newer outcomes for the same command win over the failed batch
+            for command_id, outcome in batch.items():
+                self.pending.setdefault(command_id, outcome)
+            if self.timer is None:
+                self._schedule(ACK_RETRY_DELAY)
+
+
+class CommandCompactor:
+    """Removes finished commands from the commands node so it stays small
+
+    Entries are deleted once they have been finished for `retention_seconds`,
+    optionally moving them to `commandHistory` in the same multi-path update.
+    """
+
+    def __init__(self, display_ref_factory, retention_seconds, archive=False):
+        # Returns the display reference, which depends on the current device link
+        self.display_ref_factory = display_ref_factory
+        self.retention_ms = int(retention_seconds * 1000)
+        self.archive = archive
+
+        self.commands = {}  # command_id -> command data as last seen
+        self.finished = {}  # command_id -> time it finished, in ms
+        self.lock = threading.Lock()
+
+    def note_command(self, command_id, command, finished_at=None):
+        """Remember a command seen by the listener; pass `finished_at` if it is already done"""
+        with self.lock:
+            self.commands[command_id] = dict(command)
+            if finished_at is not None:
+                self.finished.setdefault(command_id, finished_at)
+
+    def note_finished(self, command_id, status, result, finished_at):
+        with self.lock:
+            command = self.commands.setdefault(command_id, {})
+            command.update({'status': status, 'result': result})
+            self.finished[command_id] = finished_at
+
+    def compact(self, now_ms):
+        """Delete (or archive) commands finished more than the retention period ago; returns their IDs"""
+        with self.lock:
+            due = [command_id for command_id, finished_at in self.finished.items()
+                   if now_ms - finished_at >= self.retention_ms]
+            if not due:
+                return []
+            updates = {}
+            for command_id in due:
+                updates[f'commands/{command_id}'] = None
+                if self.archive:
+                    updates[f'commandHistory/{command_id}'] = self.commands.get(command_id) or None
+
+        try:
+            self.display_ref_factory().update(updates)
+        except Exception as e:
+            log.error("Failed to compact commands: %s", e)
+            return []
+
+        with self.lock:
+            for command_id in due:
+                self.finished.pop(command_id, None)
+                self.commands.pop(command_id, None)
+        log.info("Compacted %s finished command(s)", len(due))
+        return due
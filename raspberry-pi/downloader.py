@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+PanelSena Content Downloader
+Resumable, atomic, checksum-verified downloads from HTTPS URLs and Firebase Storage blobs
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+CHECKPOINT_BYTES = 8 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ChecksumError(DownloadError):
+    """The downloaded bytes do not match the checksum published by the server"""
+
+
+class _Hasher:
+    """MD5 of a file's bytes in order, and CRC32C too when google-crc32c is installed
+
+    The CRC32C is only computed for objects without an MD5, such as
+    composite GCS objects.
+    """
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.md5 = hashlib.md5()
+        self.crc32c = None
+        if expected.get('crc32c') and not expected.get('md5'):
+            try:
+                # Installed with google-cloud-storage
+                import google_crc32c
+                self.crc32c = google_crc32c.Checksum()
+            except ImportError:
+                log.debug("google-crc32c not installed, CRC32C not checked")
+
+    def update(self, data):
+        self.md5.update(data)
+        if self.crc32c is not None:
+            self.crc32c.update(data)
+
+    def update_from_file(self, path):
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                self.update(chunk)
+
+    def verify(self):
+        """Raise ChecksumError on a mismatch; returns the hex MD5"""
+        actual = {'md5': base64.b64encode(self.md5.digest()).decode('ascii')}
+        if self.crc32c is not None:
+            actual['crc32c'] = base64.b64encode(self.crc32c.digest()).decode('ascii')
+        for kind, value in actual.items():
+            if self.expected.get(kind) and self.expected[kind] != value:
+                raise ChecksumError(f"{kind} mismatch: expected {self.expected[kind]}, got {value}")
+        return self.md5.hexdigest()
+
+
+class Downloader:
+    def __init__(self, storage_bucket, segments=4, segment_min_bytes=16 * 1024 * 1024, pool_size=8):
+        self.storage_bucket = storage_bucket
+        self.segments = max(1, segments)
+        self.segment_min_bytes = segment_min_bytes
+
+        # One keep-alive session shared by every download and revalidation
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @staticmethod
+    def is_url(source):
+        return source.startswith('http://') or source.startswith('https://')
+
+    def download(self, source, local_path):
+        """Download `source` to `local_path`
+
+        Data is written to `<local_path>.part` and only renamed into place once
+        complete, so `local_path` never holds a truncated file. Progress is
+        checkpointed to `<local_path>.part.json`, and an interrupted download
+        resumes from the last checkpoint with HTTP Range requests. Large files
+        are fetched as several ranges in parallel.
+
+        The file is checked against the MD5 or CRC32C the server publishes (blob
+        metadata, or an x-goog-hash header) before it is renamed into place,
+        and a mismatch raises ChecksumError. A single-stream download is
+        hashed as it arrives; resumed or parallel ones are read back once.
+
+        Returns (validators, md5): the validators (ETag/Last-Modified, or blob
+        generation/md5) used later by `revalidate`, and the file's hex MD5.
+        """
+        part_path = local_path + '.part'
+        state_path = part_path + '.json'
+
+        if self.is_url(source):
+            log.info("Downloading from URL...")
+            size, ranges_supported, validators, expected = self._probe_url(source)
+            fetch_range = lambda start, end, writer: self._fetch_url_range(source, start, end, writer)
+        else:
+            log.info("Downloading from blob path...")
+            blob = self.storage_bucket.blob(source)
+            blob.reload()
+            size, ranges_supported = blob.size, True
+            validators = self._blob_validators(blob)
+            expected = {'md5': blob.md5_hash, 'crc32c': blob.crc32c}
+            fetch_range = lambda start, end, writer: self._fetch_blob_range(blob, start, end, writer)
+
+        # Partial data is useless if the server cannot resume it
+        state = self._load_state(state_path, part_path, source, size) if ranges_supported else None
+        if state is None:
+            state = {
+                'source': source,
+                'size': size,
+                'segments': self._plan_segments(size, ranges_supported),
+            }
+            with open(part_path, 'wb') as f:
+                if size:
+                    f.truncate(size)
+        else:
+            done = sum(segment[2] for segment in state['segments'])
+            log.info("Resuming download at %s bytes", done)
+
+        self._save_state(state_path, state)
+
+        state_lock = threading.Lock()
+        pending = [segment for segment in state['segments'] if not self._segment_done(segment)]
+
+        whole_file = len(state['segments']) == 1
+        hasher = _Hasher(expected)
+        # Only a single stream from the first byte arrives in order
+        streamed = whole_file and len(pending) == 1 and pending[0][2] == 0
+
+        def run_segment(segment):
+            with open(part_path, 'r+b') as f:
+                writer = _SegmentWriter(f, segment, state, state_path, state_lock, self._save_state,
+                                        hasher if streamed else None)
+                start = segment[0] + segment[2]
+                f.seek(start)
+                # A single segment is open-ended, so no Range is needed from 0
+                fetch_range(start, None if whole_file else segment[1], writer)
+                writer.checkpoint()
+
+        if len(pending) > 1:
+            log.info("Downloading %s segments in parallel", len(pending))
+            with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                for future in [pool.submit(run_segment, segment) for segment in pending]:
+                    future.result()
+        elif pending:
+            run_segment(pending[0])
+
+        # The part file is allocated at full size up front, so only the bytes
+        # each segment actually received show a response that ended early
+        received = sum(segment[2] for segment in state['segments'])
+        if any(segment[2] > segment[1] - segment[0] + 1 for segment in state['segments'] if segment[1] is not None):
+            # More data than was asked for; the progress cannot be trusted
+            self._remove(part_path)
+            self._remove(state_path)
+            raise DownloadError(f"Size mismatch: expected {size}, got {received}")
+        if not all(self._segment_done(segment) for segment in state['segments'] if segment[1] is not None):
+            # The checkpointed bytes are good, so a retry resumes from them
+            raise DownloadError(f"Download incomplete: got {received} of {size} bytes")
+
+        if not streamed:
+            hasher.update_from_file(part_path)
+        try:
+            checksum = hasher.verify()
+        except ChecksumError:
+            # Corrupt data must not be resumed either
+            self._remove(part_path)
+            self._remove(state_path)
+            raise
+
+        os.replace(part_path, local_path)
+        self._remove(state_path)
+        return validators, checksum
+
+    def revalidate(self, source, validators):
+        """Return True if the remote copy still matches `validators`
+
+        URLs cost one conditional HEAD (normally a 304), blobs one metadata
+        call. Missing validators are treated as stale, including a server that
+        sent neither an ETag nor a Last-Modified.
+        """
+        if not validators or not any(validators.values()):
+            return False
+
+        if self.is_url(source):
+            headers = {}
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('lastModified'):
+                headers['If-Modified-Since'] = validators['lastModified']
+
+            response = self.session.head(source, headers=headers, allow_redirects=True, timeout=30)
+            if response.status_code == 304:
+                return True
+            response.raise_for_status()
+            current = self._url_validators(response)
+        else:
+            blob = self.storage_bucket.blob(source)
+            blob.reload()
+            current = self._blob_validators(blob)
+
+        return all(current.get(key) == value for key, value in validators.items() if value)
+
+    @staticmethod
+    def _url_validators(response):
+        return {
+            'etag': response.headers.get('ETag'),
+            'lastModified': response.headers.get('Last-Modified'),
+        }
+
+    @staticmethod
+    def _blob_validators(blob):
+        return {
+            'generation': blob.generation,
+            'md5': blob.md5_hash,
+        }
+
+    def _plan_segments(self, size, ranges_supported):
+        """Split a download into [start, end, done] segments (end inclusive)"""
+        if not size or not ranges_supported or self.segments == 1 or size < self.segment_min_bytes:
+            return [[0, size - 1 if size else None, 0]]
+
+        segment_size = -(-size // self.segments)
+        return [
+            [start, min(start + segment_size, size) - 1, 0]
+            for start in range(0, size, segment_size)
+        ]
+
+    @staticmethod
+    def _segment_done(segment):
+        start, end, done = segment
+        return end is not None and start + done > end
+
+    @staticmethod
+    def _url_hashes(response):
+        """MD5/CRC32C from GCS's x-goog-hash header (e.g. 'crc32c=n03x6A==,md5=...'), as blob metadata has them"""
+        hashes = {}
+        for item in response.headers.get('x-goog-hash', '').split(','):
+            kind, _, value = item.strip().partition('=')
+            if kind in ('md5', 'crc32c') and value:
+                hashes[kind] = value
+        if not hashes.get('md5') and response.headers.get('Content-MD5'):
+            hashes['md5'] = response.headers['Content-MD5']
+        return hashes
+
+    def _probe_url(self, url):
+        """Return (size, supports_ranges, validators, hashes) for a URL, size None if unknown"""
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=30)
+            response.raise_for_status()
+            length = response.headers.get('Content-Length')
+            size = int(length) if length and length.isdigit() else None
+            ranges_supported = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            return size, ranges_supported, self._url_validators(response), self._url_hashes(response)
+        except Exception as e:
+            log.warning("HEAD request failed, downloading without resume: %s", e)
+            return None, False, {}, {}
+
+    def _fetch_url_range(self, url, start, end, writer):
+        headers = {}
+        if start > 0 or end is not None:
+            headers['Range'] = f"bytes={start}-{'' if end is None else end}"
+
+        with self.session.get(url, headers=headers, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            if headers and response.status_code != 206:
+                raise DownloadError("Server ignored range request")
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                writer.write(chunk)
+
+    def _fetch_blob_range(self, blob, start, end, writer):
+        if start == 0 and end is None:
+            blob.download_to_file(writer)
+        else:
+            blob.download_to_file(writer, start=start, end=end)
+
+    def _load_state(self, state_path, part_path, source, size):
+        """Load resume state for a partial download, or None to start fresh"""
+        if not os.path.exists(state_path) or not os.path.exists(part_path):
+            self._remove(part_path)
+            self._remove(state_path)
+            return None
+
+        try:
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+        except Exception:
+            state = None
+
+        if not state or state.get('source') != source or state.get('size') != size:
+            self._remove(part_path)
+            self._remove(state_path)
+            return None
+        return state
+
+    @staticmethod
+    def _save_state(state_path, state):
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class _SegmentWriter:
+    """File-like writer for one segment that checkpoints progress periodically, hashing it if given a hasher"""
+
+    def __init__(self, f, segment, state, state_path, state_lock, save_state, hasher=None):
+        self.f = f
+        self.hasher = hasher
+        self.segment = segment
+        self.state = state
+        self.state_path = state_path
+        self.state_lock = state_lock
+        self.save_state = save_state
+        self.unsaved = 0
+
+    def write(self, data):
+        self.f.write(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+        self.unsaved += len(data)
+        if self.unsaved >= CHECKPOINT_BYTES:
+            self.checkpoint()
+        return len(data)
+
+    def checkpoint(self):
+        """Make written data durable, then record it as done"""
+        if not self.unsaved:
+            return
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        with self.state_lock:
+            self.segment[2] += self.unsaved
+            self.save_state(self.state_path, self.state)
+        self.unsaved = 0
@@ -0,0 +1,672 @@
+#!/usr/bin/env python3
+"""
+PanelSena Fake Backend
+In-process stand-ins for the Realtime Database, Firestore, Storage and libvlc, for benchmarks
+"""
+
+import base64
+import copy
+import hashlib
+import json
+import queue
+import threading
+import time
+from types import SimpleNamespace
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(samples)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def latency_summary(samples):
+    """p50/p90/p99/max of samples in seconds, reported in ms"""
+    if not samples:
+        return {'n': 0}
+    return {
+        'n': len(samples),
+        'p50Ms': round(percentile(samples, 50) * 1000, 1),
+        'p90Ms': round(percentile(samples, 90) * 1000, 1),
+        'p99Ms': round(percentile(samples, 99) * 1000, 1),
+        'maxMs': round(max(samples) * 1000, 1),
+    }
+
+
+def _payload_bytes(value):
+    return len(json.dumps(value, default=str)) if value is not None else 0
+
+
+def _split(path):
+    return [part for part in path.strip('/').split('/') if part]
+
+
+class BackendStats:
+    """Operation counts and byte totals, shared by every fake service"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+            self.bytes = {}
+            # (monotonic time, op, path, payload) for every RTDB write
+            self.write_log = []
+
+    def record(self, op, nbytes=0, path=None, payload=None):
+        with self.lock:
+            self.counts[op] = self.counts.get(op, 0) + 1
+            self.bytes[op] = self.bytes.get(op, 0) + nbytes
+            if op in ('rtdb.set', 'rtdb.update'):
+                self.write_log.append((time.monotonic(), op, path, payload))
+
+    def snapshot(self):
+        with self.lock:
+            return {'counts': dict(self.counts), 'bytes': dict(self.bytes)}
+
+    def summary(self):
+        """Traffic totals grouped the way the benchmarks report them"""
+        stats = self.snapshot()
+        counts, nbytes = stats['counts'], stats['bytes']
+        return {
+            'rtdbReads': counts.get('rtdb.get', 0) + counts.get('rtdb.listen', 0),
+            'rtdbWrites': counts.get('rtdb.set', 0) + counts.get('rtdb.update', 0),
+            'rtdbWriteBytes': nbytes.get('rtdb.set', 0) + nbytes.get('rtdb.update', 0),
+            'rtdbReadBytes': nbytes.get('rtdb.get', 0) + nbytes.get('rtdb.listen', 0),
+            'rtdbEvents': counts.get('rtdb.event', 0),
+            'rtdbEventBytes': nbytes.get('rtdb.event', 0),
+            'firestoreReads': counts.get('firestore.read', 0) + counts.get('firestore.listen', 0),
+            'storageRequests': counts.get('storage.metadata', 0) + counts.get('storage.download', 0),
+            'storageBytes': nbytes.get('storage.download', 0),
+        }
+
+
+# Realtime Database
+
+class FakeRealtimeDatabase:
+    """A JSON tree with get/set/update/listen, delivering events on one thread like the SDK
+
+    Each call blocks for `rtt_seconds`, like a request to the real database.
+    """
+
+    def __init__(self, stats, rtt_seconds=0):
+        self.stats = stats
+        self.rtt_seconds = rtt_seconds
+        self.tree = {}
+        self.lock = threading.RLock()
+        self.listeners = {}  # path parts tuple -> [callback]
+        # Every proper prefix of a listened path, with how many listeners are below it
+        self.listener_prefixes = {}
+        self.events = queue.Queue()
+        thread = threading.Thread(target=self._deliver, name='fake-rtdb-events')
+        thread.daemon = True
+        thread.start()
+
+    def reference(self, path='/'):
+        return FakeReference(self, path)
+
+    def _deliver(self):
+        while True:
+            callback, event = self.events.get()
+            try:
+                callback(event)
+            except Exception:
+                pass
+
+    def _get(self, parts):
+        node = self.tree
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _set(self, parts, value):
+        if not parts:
+            self.tree = value if isinstance(value, dict) else {}
+            return
+        node = self.tree
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = {}
+                node[part] = child
+            node = child
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+
+    def _round_trip(self):
+        if self.rtt_seconds:
+            time.sleep(self.rtt_seconds)
+
+    def get(self, path):
+        self._round_trip()
+        with self.lock:
+            value = copy.deepcopy(self._get(_split(path)))
+        self.stats.record('rtdb.get', _payload_bytes(value))
+        return value
+
+    def set(self, path, value):
+        self._round_trip()
+        value = copy.deepcopy(value)
+        self.stats.record('rtdb.set', _payload_bytes(value), path, value)
+        with self.lock:
+            self._set(_split(path), value)
+            self._notify(_split(path), 'put', value)
+
+    def update(self, path, updates):
+        self._round_trip()
+        updates = copy.deepcopy(updates)
+        self.stats.record('rtdb.update', _payload_bytes(updates), path, updates)
+        base = _split(path)
+        with self.lock:
+            for child, value in updates.items():
+                self._set(base + _split(child), value)
+            self._notify(base, 'patch', updates)
+
+    def listen(self, path, callback):
+        self._round_trip()
+        parts = tuple(_split(path))
+        with self.lock:
+            entry = (parts, callback)
+            self.listeners.setdefault(parts, []).append(callback)
+            for depth in range(len(parts)):
+                prefix = parts[:depth]
+                self.listener_prefixes[prefix] = self.listener_prefixes.get(prefix, 0) + 1
+            initial = copy.deepcopy(self._get(parts))
+        self.stats.record('rtdb.listen', _payload_bytes(initial))
+        self.events.put((callback, SimpleNamespace(event_type='put', path='/', data=initial)))
+        return FakeListenerRegistration(self, entry)
+
+    def _remove_listener(self, entry):
+        parts, callback = entry
+        with self.lock:
+            callbacks = self.listeners.get(parts, [])
+            if callback not in callbacks:
+                return
+            callbacks.remove(callback)
+            if not callbacks:
+                del self.listeners[parts]
+            for depth in range(len(parts)):
+                prefix = parts[:depth]
+                self.listener_prefixes[prefix] -= 1
+                if not self.listener_prefixes[prefix]:
+                    del self.listener_prefixes[prefix]
+
+    def _notify(self, parts, event_type, data):
+        """Queue events for listeners at, above or below a written path (lock held)"""
+        parts = tuple(parts)
+        targets = []
+        # Listeners at or above the written path see the write itself
+        for depth in range(len(parts) + 1):
+            for callback in self.listeners.get(parts[:depth], ()):
+                rel = '/' + '/'.join(parts[depth:])
+                targets.append((callback, SimpleNamespace(event_type=event_type, path=rel, data=data)))
+        # A write above a listener replaces what it sees
+        if parts in self.listener_prefixes:
+            for listener_parts, callbacks in self.listeners.items():
+                if len(listener_parts) > len(parts) and listener_parts[:len(parts)] == parts:
+                    value = self._get(listener_parts)
+                    for callback in callbacks:
+                        targets.append((callback, SimpleNamespace(event_type='put', path='/', data=value)))
+
+        for callback, event in targets:
+            event.data = copy.deepcopy(event.data)
+            self.stats.record('rtdb.event', _payload_bytes(event.data))
+            self.events.put((callback, event))
+
+
+class FakeReference:
+    def __init__(self, database, path):
+        self.database = database
+        self.path = path
+
+    def get(self):
+        return self.database.get(self.path)
+
+    def set(self, value):
+        self.database.set(self.path, value)
+
+    def update(self, updates):
+        self.database.update(self.path, updates)
+
+    def delete(self):
+        self.database.set(self.path, None)
+
+    def listen(self, callback):
+        return self.database.listen(self.path, callback)
+
+
+class FakeListenerRegistration:
+    def __init__(self, database, entry):
+        self.database = database
+        self.entry = entry
+
+    def close(self):
+        self.database._remove_listener(self.entry)
+
+
+# Firestore
+
+class FakeDocumentSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeFirestore:
+    """Collections of documents with get, get_all and on_snapshot listeners
+
+    Reads block for `rtt_seconds`; get_all pays it once for the whole batch.
+    """
+
+    def __init__(self, stats, rtt_seconds=0):
+        self.stats = stats
+        self.rtt_seconds = rtt_seconds
+        self.collections = {}
+        self.lock = threading.RLock()
+        # (collection, matches(doc_id, data), callback, query): document and ID
+        # watches match deleted documents too; field queries report their full result set
+        self.watches = []
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def get_all(self, refs):
+        self._round_trip()
+        for ref in refs:
+            yield self._read(ref.collection, ref.id)
+
+    def _round_trip(self):
+        if self.rtt_seconds:
+            time.sleep(self.rtt_seconds)
+
+    def put(self, collection, doc_id, data):
+        """Create, replace or (with None) delete a document, notifying watchers"""
+        with self.lock:
+            documents = self.collections.setdefault(collection, {})
+            old = documents.get(doc_id)
+            if data is None:
+                documents.pop(doc_id, None)
+            else:
+                documents[doc_id] = copy.deepcopy(data)
+            watches = [w for w in self.watches
+                       if w[0] == collection and (w[1](doc_id, old) or w[1](doc_id, data))]
+        snapshot = FakeDocumentSnapshot(doc_id, copy.deepcopy(data))
+        for _, matches, callback, query in watches:
+            if data is None or not matches(doc_id, data):
+                change_type = 'REMOVED'
+            else:
+                change_type = 'MODIFIED' if matches(doc_id, old) else 'ADDED'
+            change = SimpleNamespace(type=SimpleNamespace(name=change_type), document=snapshot)
+            self.stats.record('firestore.listen', _payload_bytes(data))
+            callback(self._results(collection, matches) if query else [snapshot], [change], time.time())
+
+    def _read(self, collection, doc_id):
+        with self.lock:
+            data = copy.deepcopy(self.collections.get(collection, {}).get(doc_id))
+        self.stats.record('firestore.read', _payload_bytes(data))
+        return FakeDocumentSnapshot(doc_id, data)
+
+    def _results(self, collection, matches):
+        with self.lock:
+            return [FakeDocumentSnapshot(doc_id, copy.deepcopy(data))
+                    for doc_id, data in self.collections.get(collection, {}).items() if matches(doc_id, data)]
+
+    def _watch(self, collection, doc_ids, callback, matches=None):
+        """Watch documents by ID, or (with `matches`) the documents of a field query"""
+        if matches is None:
+            doc_ids = set(doc_ids)
+            watch = (collection, lambda doc_id, data: doc_id in doc_ids, callback, False)
+        else:
+            watch = (collection, matches, callback, True)
+        with self.lock:
+            self.watches.append(watch)
+        if matches is None:
+            snapshots = [self._read(collection, doc_id) for doc_id in doc_ids]
+        else:
+            snapshots = self._results(collection, matches)
+        changes = [SimpleNamespace(type=SimpleNamespace(name='ADDED'), document=snapshot)
+                   for snapshot in snapshots if snapshot.exists]
+        callback(snapshots, changes, time.time())
+        return FakeWatch(self, watch)
+
+
+class FakeCollection:
+    def __init__(self, firestore_db, name):
+        self.firestore_db = firestore_db
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self.firestore_db, self.name, doc_id)
+
+    def where(self, field, op, value):
+        return FakeQuery(self.firestore_db, self.name).where(field, op, value)
+
+
+class FakeDocumentReference:
+    def __init__(self, firestore_db, collection, doc_id):
+        self.firestore_db = firestore_db
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self):
+        self.firestore_db._round_trip()
+        return self.firestore_db._read(self.collection, self.id)
+
+    def on_snapshot(self, callback):
+        return self.firestore_db._watch(self.collection, [self.id], callback)
+
+
+class FakeQuery:
+    """Document ID 'in' queries, and field queries with '==' and 'array_contains'"""
+
+    def __init__(self, firestore_db, collection, doc_ids=None, filters=()):
+        self.firestore_db = firestore_db
+        self.collection = collection
+        self.doc_ids = doc_ids
+        self.filters = filters
+
+    def where(self, field, op, value):
+        if op == 'in':
+            if field != '__name__':
+                raise ValueError(f"'in' is only supported on the document ID, not {field}")
+            doc_ids = [item.id if isinstance(item, FakeDocumentReference) else item for item in value]
+            return FakeQuery(self.firestore_db, self.collection, doc_ids, self.filters)
+        if op not in ('==', 'array_contains'):
+            raise ValueError(f"Unsupported operator: {op}")
+        return FakeQuery(self.firestore_db, self.collection, self.doc_ids, self.filters + ((field, op, value),))
+
+    def _matches(self, doc_id, data):
+        if data is None:
+            return False
+        for field, op, value in self.filters:
+            if op == '==' and data.get(field) != value:
+                return False
+            if op == 'array_contains' and value not in (data.get(field) or []):
+                return False
+        return True
+
+    def on_snapshot(self, callback):
+        if not self.filters:
+            return self.firestore_db._watch(self.collection, self.doc_ids, callback)
+        return self.firestore_db._watch(self.collection, None, callback, matches=self._matches)
+
+
+class FakeWatch:
+    def __init__(self, firestore_db, watch):
+        self.firestore_db = firestore_db
+        self.watch = watch
+
+    def unsubscribe(self):
+        with self.firestore_db.lock:
+            if self.watch in self.firestore_db.watches:
+                self.firestore_db.watches.remove(self.watch)
+
+
+# Storage
+
+class FakeNotFound(Exception):
+    pass
+
+
+class FakeBucket:
+    """Blobs held in memory, served at `bytes_per_second` (unlimited if None)"""
+
+    def __init__(self, stats, bytes_per_second=None):
+        self.stats = stats
+        self.bytes_per_second = bytes_per_second
+        self.objects = {}  # path -> (data, generation)
+        self.lock = threading.Lock()
+
+    def upload(self, path, data):
+        with self.lock:
+            generation = self.objects.get(path, (None, 0))[1] + 1
+            self.objects[path] = (data, generation)
+
+    def blob(self, path):
+        return FakeBlob(self, path)
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.size = None
+        self.generation = None
+        self.md5_hash = None
+        self.crc32c = None
+
+    def _object(self):
+        with self.bucket.lock:
+            stored = self.bucket.objects.get(self.name)
+        if stored is None:
+            raise FakeNotFound(self.name)
+        return stored
+
+    def reload(self):
+        data, generation = self._object()
+        self.bucket.stats.record('storage.metadata')
+        self.size = len(data)
+        self.generation = generation
+        self.md5_hash = base64.b64encode(hashlib.md5(data).digest()).decode('ascii')
+
+    def download_to_file(self, file_obj, start=None, end=None):
+        data, _ = self._object()
+        # GCS ranges are inclusive
+        chunk = data[start or 0:(end + 1) if end is not None else None]
+        if self.bucket.bytes_per_second:
+            time.sleep(len(chunk) / self.bucket.bytes_per_second)
+        self.bucket.stats.record('storage.download', len(chunk))
+        file_obj.write(chunk)
+
+
+# libvlc
+
+class FakeVLC:
+    """Module-shaped stand-in for python-vlc
+
+    Media "play" for `media_seconds` (images and videos alike) after a
+    `startup_seconds` delay before their first frame. Every engine event is
+    recorded in `events` as (monotonic time, kind, path).
+    """
+
+    class EventType:
+        MediaPlayerPlaying = 'playing'
+        MediaPlayerEndReached = 'ended'
+        MediaPlayerEncounteredError = 'error'
+        MediaPlayerTimeChanged = 'time'
+        MediaStateChanged = 'state'
+
+    class State:
+        NothingSpecial, Opening, Buffering, Playing, Paused, Stopped, Ended, Error = range(8)
+
+    class MediaParseFlag:
+        local = 0
+
+    def __init__(self, media_seconds=0.2, startup_seconds=0.01, init_seconds=0):
+        self.media_seconds = media_seconds
+        self.startup_seconds = startup_seconds
+        # Time Instance() takes, standing in for libvlc loading its plugins
+        self.init_seconds = init_seconds
+        self.events = []
+        self.lock = threading.Lock()
+
+    def Instance(self, *args):
+        if self.init_seconds:
+            time.sleep(self.init_seconds)
+        return FakeVLCInstance(self)
+
+    def record(self, kind, path):
+        with self.lock:
+            self.events.append((time.monotonic(), kind, path))
+
+    def events_of(self, kind):
+        with self.lock:
+            return [(t, path) for t, k, path in self.events if k == kind]
+
+
+class FakeVLCInstance:
+    def __init__(self, vlc_module):
+        self.vlc = vlc_module
+
+    def media_player_new(self):
+        return FakeMediaPlayer(self.vlc)
+
+    def media_new_path(self, path):
+        return FakeMedia(path)
+
+
+class FakeMedia:
+    def __init__(self, path):
+        self.path = path
+        self.options = []
+        self.events = FakeEventManager()
+
+    def event_manager(self):
+        return self.events
+
+    def set_state(self, state):
+        self.events.fire(FakeVLC.EventType.MediaStateChanged, new_state=state)
+
+    def add_option(self, option):
+        self.options.append(option)
+
+    def parse_with_options(self, flags, timeout):
+        return 0
+
+    def release(self):
+        pass
+
+
+class FakeEventManager:
+    def __init__(self):
+        self.callbacks = {}
+
+    def event_attach(self, event_type, callback, *args):
+        self.callbacks.setdefault(event_type, []).append((callback, args))
+
+    def fire(self, event_type, **fields):
+        for callback, args in self.callbacks.get(event_type, []):
+            callback(SimpleNamespace(type=event_type, u=SimpleNamespace(**fields)), *args)
+
+
+class FakeMediaPlayer:
+    def __init__(self, vlc_module):
+        self.vlc = vlc_module
+        self.events = FakeEventManager()
+        self.media = None
+        self.state = FakeVLC.State.NothingSpecial
+        self.timer = None
+        self.remaining = None
+        self.lock = threading.Lock()
+
+    def event_manager(self):
+        return self.events
+
+    def set_fullscreen(self, value):
+        pass
+
+    def set_media(self, media):
+        self.media = media
+
+    def play(self):
+        with self.lock:
+            self._cancel()
+            self.state = FakeVLC.State.Opening
+            self._schedule(self.vlc.startup_seconds, self._first_frame, self.media)
+        return 0
+
+    def _schedule(self, delay, target, media):
+        self.timer = threading.Timer(delay, target, args=(media,))
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _cancel(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def _first_frame(self, media):
+        with self.lock:
+            if media is not self.media or self.state != FakeVLC.State.Opening:
+                return
+            self.state = FakeVLC.State.Playing
+            self.started_at = time.monotonic()
+            self.remaining = self.vlc.media_seconds
+            self._schedule(self.remaining, self._end, media)
+        self.vlc.record('playing', media.path)
+        self.events.fire(FakeVLC.EventType.MediaPlayerPlaying)
+        media.set_state(FakeVLC.State.Playing)
+
+    def _end(self, media):
+        with self.lock:
+            if media is not self.media or self.state != FakeVLC.State.Playing:
+                return
+            self.state = FakeVLC.State.Ended
+        self.vlc.record('ended', media.path)
+        self.events.fire(FakeVLC.EventType.MediaPlayerEndReached)
+        media.set_state(FakeVLC.State.Ended)
+
+    def set_pause(self, paused):
+        with self.lock:
+            if paused and self.state == FakeVLC.State.Playing:
+                self._cancel()
+                self.remaining = max(0, self.remaining - (time.monotonic() - self.started_at))
+                self.state = FakeVLC.State.Paused
+            elif not paused and self.state == FakeVLC.State.Paused:
+                self.state = FakeVLC.State.Playing
+                self.started_at = time.monotonic()
+                self._schedule(self.remaining, self._end, self.media)
+
+    def stop(self):
+        with self.lock:
+            self._cancel()
+            self.state = FakeVLC.State.Stopped
+
+    def get_state(self):
+        return self.state
+
+    def audio_set_volume(self, volume):
+        return 0
+
+    def release(self):
+        self.stop()
+
+
+class FakeFirebase:
+    """The three clients PanelSenaPlayer takes through its `firebase` argument"""
+
+    def __init__(self, bytes_per_second=None, rtt_seconds=0):
+        self.stats = BackendStats()
+        self.db = FakeRealtimeDatabase(self.stats, rtt_seconds)
+        self.firestore_db = FakeFirestore(self.stats, rtt_seconds)
+        self.storage_bucket = FakeBucket(self.stats, bytes_per_second)
+
+    def seed_device(self, device_id, device_key, user_id, display_id):
+        """Register a device and link it to a display, as the dashboard would"""
+        now = int(time.time() * 1000)
+        with self.db.lock:
+            self.db._set(['device_registry', device_id], {
+                'deviceId': device_id, 'deviceKey': device_key, 'registeredAt': now, 'lastSeen': now,
+            })
+            self.db._set(['device_links', device_id], {'userId': user_id, 'displayId': display_id})
+
+    def seed_content(self, content_id, size, content_type='video'):
+        extension = {'video': 'mp4', 'image': 'jpg', 'document': 'pdf'}[content_type]
+        path = f'content/{content_id}.{extension}'
+        self.storage_bucket.upload(path, bytes(size))
+        self.firestore_db.put('content', content_id, {'name': content_id, 'type': content_type, 'url': path})
+
+    def seed_schedule(self, schedule_id, content_ids, **fields):
+        """Store a schedule; `fields` adds e.g. userId, displayIds and its time window"""
+        self.firestore_db.put('schedules', schedule_id, {'name': schedule_id, 'contentIds': list(content_ids), **fields})
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+PanelSena Fleet Simulator
+Runs many virtual players in one asyncio loop against the fake_backend Realtime Database,
+and reports how backend traffic and broadcast fan-out latency grow with fleet size
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from fake_backend import FakeFirebase, latency_summary
+from status_publisher import StatusPublisher
+from command_dispatcher import ACK_BATCH_DELAY
+
+# Mirrors the player's defaults (player.py), in simulated seconds
+HEARTBEAT_FAST_SECONDS = 2
+HEARTBEAT_IDLE_SECONDS = 30
+HEARTBEAT_FAST_WINDOW_SECONDS = 30
+LINK_RECHECK_MIN_SECONDS = 5
+LINK_RECHECK_MAX_SECONDS = 300
+
+DEFAULT_SIZES = "10,100,1000"
+DEFAULT_DURATION_SECONDS = 120
+DEFAULT_SPEED = 10
+DEFAULT_BROADCASTS = 3
+DEFAULT_UNLINKED_FRACTION = 0.05
+DEFAULT_ITEM_SECONDS = 20
+DEFAULT_LINK_AFTER_SECONDS = 60
+BOOT_TIMEOUT_SECONDS = 60
+LOOP_LAG_PROBE_SECONDS = 0.05
+
+
+class Fleet:
+    """Shared clock and backend for one simulation run"""
+
+    def __init__(self, firebase, speed):
+        self.firebase = firebase
+        self.speed = speed
+        self.loop = asyncio.get_running_loop()
+        self.running = True
+
+    async def sleep(self, sim_seconds):
+        await asyncio.sleep(sim_seconds / self.speed)
+
+
+class VirtualPlayer:
+    """The Realtime Database access pattern of one PanelSenaPlayer
+
+    Follows authenticate_device, wait_for_device_link, heartbeat_loop (with
+    the real StatusPublisher) and listen_for_commands, with acks batched the
+    way CommandAcker batches them. Playback is modelled as the current item
+    changing every `item_seconds`.
+    """
+
+    def __init__(self, fleet, index, item_seconds):
+        self.fleet = fleet
+        self.db = fleet.firebase.db
+        self.index = index
+        self.device_id = f"sim-device-{index}"
+        self.device_key = f"sim-key-{index}"
+        self.item_seconds = item_seconds
+
+        self.user_id = None
+        self.display_id = None
+        self.listening = asyncio.Event()
+        self.listening_at = None
+        self.heartbeat_wake = asyncio.Event()
+        self.last_status_change = 0.0
+        self.last_status_written = 0.0
+        self.publisher = None
+        self.volume = 80
+        self.item = 0
+        self.item_started_at = int(time.time() * 1000)
+
+        self.pending_acks = {}
+        self.ack_task = None
+        # command_id -> monotonic time the listener delivered it
+        self.received = {}
+
+    async def run(self):
+        await self.authenticate()
+        self.publisher = StatusPublisher(self.db.reference(f'{self.display_path}/status'))
+        self.listen_for_commands()
+        await asyncio.gather(self.heartbeat_loop(), self.playback_loop())
+
+    async def authenticate(self):
+        device_ref = self.db.reference(f'device_registry/{self.device_id}')
+        now = int(time.time() * 1000)
+        if device_ref.get():
+            device_ref.update({'lastSeen': now})
+        else:
+            device_ref.set({
+                'deviceId': self.device_id,
+                'deviceKey': self.device_key,
+                'displayName': f"Simulated Display {self.index}",
+                'registeredAt': now,
+                'lastSeen': now,
+                'linkedToUser': None,
+                'status': 'registered',
+            })
+
+        link_ref = self.db.reference(f'device_links/{self.device_id}')
+        link = link_ref.get()
+        if not link:
+            link = await self.wait_for_link(link_ref)
+        if link:
+            self.user_id = link['userId']
+            self.display_id = link['displayId']
+
+    async def wait_for_link(self, link_ref):
+        changed = asyncio.Event()
+
+        def on_event(event):
+            if event.data is not None:
+                self.fleet.loop.call_soon_threadsafe(changed.set)
+
+        registration = link_ref.listen(on_event)
+        delay = LINK_RECHECK_MIN_SECONDS
+        link = None
+        try:
+            while not link and self.fleet.running:
+                try:
+                    await asyncio.wait_for(changed.wait(), random.uniform(delay / 2, delay) / self.fleet.speed)
+                except asyncio.TimeoutError:
+                    delay = min(delay * 2, LINK_RECHECK_MAX_SECONDS)
+                changed.clear()
+                link = link_ref.get()
+        finally:
+            registration.close()
+        return link
+
+    @property
+    def display_path(self):
+        return f'users/{self.user_id}/displays/{self.display_id}'
+
+    def listen_for_commands(self):
+        def on_event(event):
+            # Called on the backend's delivery thread, like the SDK's listener
+            self.fleet.loop.call_soon_threadsafe(self.handle_event, event, time.monotonic())
+
+        self.db.reference(f'{self.display_path}/commands').listen(on_event)
+        self.listening_at = time.monotonic()
+        self.listening.set()
+
+    def handle_event(self, event, received_at):
+        if not isinstance(event.data, dict):
+            return
+        if 'status' in event.data:
+            commands = {event.path.strip('/') or event.data.get('commandId'): event.data}
+        else:
+            commands = event.data
+        for command_id, command in commands.items():
+            if isinstance(command, dict) and command.get('status') == 'pending':
+                self.received.setdefault(command_id, received_at)
+                self.execute(command_id, command)
+
+    def execute(self, command_id, command):
+        if command.get('type') == 'volume':
+            self.volume = command.get('payload', {}).get('volume', self.volume)
+            self.status_changed(control=True)
+        self.pending_acks[command_id] = {'status': 'executed', 'result': 'Command executed successfully'}
+        if self.ack_task is None:
+            self.ack_task = asyncio.ensure_future(self.flush_acks())
+
+    async def flush_acks(self):
+        await asyncio.sleep(ACK_BATCH_DELAY)
+        batch, self.pending_acks, self.ack_task = self.pending_acks, {}, None
+        updates = {}
+        for command_id, outcome in batch.items():
+            updates[f'{command_id}/status'] = outcome['status']
+            updates[f'{command_id}/result'] = outcome['result']
+        self.db.reference(f'{self.display_path}/commands').update(updates)
+
+    def status_changed(self, control=False):
+        """update_status(): write the change now; only control changes open the fast window"""
+        if control:
+            self.last_status_change = time.monotonic()
+        self.publisher.publish(self.snapshot())
+        self.last_status_written = time.monotonic()
+        if control:
+            self.heartbeat_wake.set()
+
+    def snapshot(self):
+        content_id = f"content-{self.item % 5}"
+        return {
+            'displayId': self.display_id,
+            'displayName': f"Simulated Display {self.index}",
+            'status': 'playing',
+            'lastHeartbeat': int(time.time() * 1000),
+            'volume': self.volume,
+            'brightness': 100,
+            'transitionMs': 40,
+            'currentContent': {
+                'id': content_id,
+                'name': content_id,
+                'type': 'video',
+                'url': f'content/{content_id}.mp4',
+                'startedAt': self.item_started_at,
+            },
+            'schedule': {
+                'id': 'sim-schedule',
+                'name': 'Simulated Schedule',
+                'contentQueue': [f"content-{i}" for i in range(5)],
+                'currentIndex': self.item % 5,
+            },
+        }
+
+    async def heartbeat_loop(self):
+        # Startup writes the full status, which counts as a control change
+        self.status_changed(control=True)
+        while self.fleet.running:
+            fast_window = HEARTBEAT_FAST_WINDOW_SECONDS / self.fleet.speed
+            if time.monotonic() - self.last_status_change < fast_window:
+                interval = HEARTBEAT_FAST_SECONDS
+            else:
+                interval = HEARTBEAT_IDLE_SECONDS
+            # Any status write counts as a heartbeat
+            remaining = self.last_status_written + interval / self.fleet.speed - time.monotonic()
+            if remaining > 0:
+                self.heartbeat_wake.clear()
+                try:
+                    await asyncio.wait_for(self.heartbeat_wake.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.publisher.publish(self.snapshot())
+            self.last_status_written = time.monotonic()
+
+    async def playback_loop(self):
+        # Spread item changes so the fleet does not transition in lockstep
+        await self.fleet.sleep(random.uniform(0, self.item_seconds))
+        while self.fleet.running:
+            self.item += 1
+            self.item_started_at = int(time.time() * 1000)
+            self.status_changed()
+            await self.fleet.sleep(self.item_seconds)
+
+
+async def probe_loop_lag(fleet, samples):
+    """Record how late the event loop wakes up; large values mean the run is CPU-bound"""
+    while fleet.running:
+        started = time.monotonic()
+        await asyncio.sleep(LOOP_LAG_PROBE_SECONDS)
+        samples.append(time.monotonic() - started - LOOP_LAG_PROBE_SECONDS)
+
+
+async def broadcast(fleet, players, command_id):
+    """Send one command to every display, as the dashboard does; returns the send time"""
+    sent_at = time.monotonic()
+    for player in players:
+        fleet.firebase.db.reference(f'{player.display_path}/commands/{command_id}').set({
+            'commandId': command_id,
+            'displayId': player.display_id,
+            'type': 'volume',
+            'payload': {'volume': random.randint(0, 100)},
+            'timestamp': int(time.time() * 1000),
+            'status': 'pending',
+        })
+    return sent_at
+
+
+def ack_times(firebase, command_id):
+    """display path -> monotonic time the command's ack was written"""
+    acks = {}
+    for written_at, op, path, payload in firebase.stats.write_log:
+        if op == 'rtdb.update' and f'{command_id}/status' in payload:
+            acks.setdefault(path, written_at)
+    return acks
+
+
+async def simulate(size, duration, speed, broadcasts, unlinked_fraction, item_seconds, link_after):
+    firebase = FakeFirebase()
+    fleet = Fleet(firebase, speed)
+    players = [VirtualPlayer(fleet, i, item_seconds) for i in range(size)]
+    unlinked = set(random.sample(range(size), int(size * unlinked_fraction)))
+    for i, player in enumerate(players):
+        if i not in unlinked:
+            firebase.seed_device(player.device_id, player.device_key, f"sim-user-{i % 10}", f"sim-display-{i}")
+
+    boot_started = time.monotonic()
+    tasks = [asyncio.ensure_future(player.run()) for player in players]
+
+    # Link the unregistered devices later, as a user would in the dashboard
+    await fleet.sleep(link_after)
+    linked_at = time.monotonic()
+    for i in unlinked:
+        firebase.db.reference(f'device_links/{players[i].device_id}').set({
+            'userId': f"sim-user-{i % 10}", 'displayId': f"sim-display-{i}",
+        })
+    await asyncio.wait_for(
+        asyncio.gather(*(player.listening.wait() for player in players)), BOOT_TIMEOUT_SECONDS)
+    boot_seconds = time.monotonic() - boot_started
+    boot = firebase.stats.summary()
+    # In simulated seconds, like the link wait itself
+    link_latency = [(players[i].listening_at - linked_at) * speed for i in unlinked]
+
+    firebase.stats.reset()
+    loop_lag = []
+    lag_task = asyncio.ensure_future(probe_loop_lag(fleet, loop_lag))
+    measure_started = time.monotonic()
+    fanout, acked = [], []
+    for b in range(broadcasts):
+        await fleet.sleep(duration / (broadcasts + 1))
+        command_id = f"broadcast-{b}"
+        sent_at = await broadcast(fleet, players, command_id)
+        # Give every listener time to deliver and every batched ack time to flush
+        await asyncio.sleep(ACK_BATCH_DELAY * 2)
+        await fleet.sleep(HEARTBEAT_FAST_SECONDS)
+        fanout.extend(player.received[command_id] - sent_at
+                      for player in players if command_id in player.received)
+        acked.extend(t - sent_at for t in ack_times(firebase, command_id).values())
+    remaining = duration / speed - (time.monotonic() - measure_started)
+    if remaining > 0:
+        await asyncio.sleep(remaining)
+    sim_seconds = (time.monotonic() - measure_started) * speed
+    steady = firebase.stats.summary()
+
+    fleet.running = False
+    for task in tasks + [lag_task]:
+        task.cancel()
+    await asyncio.gather(*tasks, lag_task, return_exceptions=True)
+
+    # The broadcasts themselves are dashboard writes, not player traffic
+    dashboard_writes = broadcasts * size
+    return {
+        'players': size,
+        'bootSeconds': round(boot_seconds, 2),
+        'bootPerPlayer': {
+            'rtdbReads': round(boot['rtdbReads'] / size, 2),
+            'rtdbWrites': round(boot['rtdbWrites'] / size, 2),
+        },
+        'linkToListeningSim': latency_summary(link_latency),
+        'readsPerSecond': round(steady['rtdbReads'] / sim_seconds, 2),
+        'writesPerSecond': round((steady['rtdbWrites'] - dashboard_writes) / sim_seconds, 2),
+        'eventsPerSecond': round(steady['rtdbEvents'] / sim_seconds, 2),
+        'bytesPerSecond': round(
+            (steady['rtdbWriteBytes'] + steady['rtdbReadBytes'] + steady['rtdbEventBytes']) / sim_seconds, 1),
+        'broadcastFanout': latency_summary(fanout),
+        'broadcastAck': latency_summary(acked),
+        # If this is high the simulator, not the backend, is the bottleneck; lower --speed
+        'loopLag': latency_summary(loop_lag),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of PanelSena players against a local backend")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"Comma-separated fleet sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION_SECONDS,
+                        help="Simulated seconds to measure per fleet size")
+    parser.add_argument('--speed', type=float, default=DEFAULT_SPEED,
+                        help="Simulated seconds per wall-clock second")
+    parser.add_argument('--broadcasts', type=int, default=DEFAULT_BROADCASTS,
+                        help="Broadcast commands sent during each measurement")
+    parser.add_argument('--unlinked', type=float, default=DEFAULT_UNLINKED_FRACTION,
+                        help="Fraction of devices that boot before they are linked")
+    parser.add_argument('--link-after', type=float, default=DEFAULT_LINK_AFTER_SECONDS,
+                        help="Simulated seconds before the unlinked devices are linked")
+    parser.add_argument('--item-seconds', type=float, default=DEFAULT_ITEM_SECONDS,
+                        help="Simulated length of each playing item")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', metavar='FILE', help="Also write the results to FILE")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results = []
+    for size in (int(value) for value in args.sizes.split(',')):
+        result = asyncio.run(simulate(
+            size, args.duration, args.speed, args.broadcasts, args.unlinked, args.item_seconds, args.link_after))
+        results.append(result)
+        print(json.dumps(result, indent=2))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+PanelSena Local Store
+Durable SQLite manifest of the device link, the display's schedules and the last active one, used to boot offline
+"""
+
+import json
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS device_link (
+    device_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    display_id TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS active_schedule (
+    slot INTEGER PRIMARY KEY CHECK (slot = 1),
+    schedule_id TEXT NOT NULL,
+    name TEXT,
+    content_ids TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS schedules (
+    schedule_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS content (
+    content_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    local_path TEXT,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS processed_commands (
+    command_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    result TEXT,
+    updated_at INTEGER NOT NULL
+);
+"""
+
+
+class LocalStore:
+    def __init__(self, path):
+        self.path = path
+        # Every call comes from the player's event loop; none goes through
+        # run_blocking. The loop may not run on the thread that created the
+        # store (the benchmark starts each player on its own thread), hence
+        # check_same_thread=False. The lock covers any caller off the loop.
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _now():
+        return int(time.time() * 1000)
+
+    # Device link
+
+    def save_device_link(self, device_id, user_id, display_id):
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO device_link VALUES (?, ?, ?, ?)',
+                (device_id, user_id, display_id, self._now())
+            )
+
+    def get_device_link(self, device_id):
+        """Return (user_id, display_id) for the last known link, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT user_id, display_id FROM device_link WHERE device_id = ?', (device_id,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    # Active schedule manifest
+
+    def save_active_schedule(self, schedule_id, name, content_ids, documents=None):
+        """Record the schedule being played, with the content documents it needs"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO active_schedule VALUES (1, ?, ?, ?, ?)',
+                (schedule_id, name, json.dumps(content_ids), self._now())
+            )
+            for content_id, data in (documents or {}).items():
+                self.conn.execute(
+                    'INSERT INTO content (content_id, data, updated_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT(content_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+                    (content_id, json.dumps(data, default=str), self._now())
+                )
+
+    def clear_active_schedule(self):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM active_schedule')
+
+    def get_active_schedule(self):
+        """Return the stored manifest as {id, name, contentIds, content}, or None
+
+        `content` maps content IDs to {'data': document, 'localPath': path}.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT schedule_id, name, content_ids FROM active_schedule WHERE slot = 1'
+            ).fetchone()
+            if not row:
+                return None
+            content_ids = json.loads(row[2])
+            placeholders = ','.join('?' * len(content_ids))
+            content_rows = self.conn.execute(
+                f'SELECT content_id, data, local_path FROM content WHERE content_id IN ({placeholders})',
+                content_ids
+            ).fetchall() if content_ids else []
+
+        return {
+            'id': row[0],
+            'name': row[1],
+            'contentIds': content_ids,
+            'content': {
+                content_id: {'data': json.loads(data), 'localPath': local_path}
+                for content_id, data, local_path in content_rows
+            },
+        }
+
+    def set_content_path(self, content_id, local_path):
+        """Remember where a content item's file is cached"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'UPDATE content SET local_path = ?, updated_at = ? WHERE content_id = ?',
+                (local_path, self._now(), content_id)
+            )
+
+    # Display schedules, evaluated locally
+
+    def save_schedules(self, schedules):
+        """Replace the stored schedules with `schedules` ({schedule_id: data})"""
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM schedules')
+            self.conn.executemany(
+                'INSERT INTO schedules VALUES (?, ?, ?)',
+                [(schedule_id, json.dumps(data, default=str), self._now()) for schedule_id, data in schedules.items()]
+            )
+
+    def get_schedules(self):
+        """Return the stored schedules as {schedule_id: data}"""
+        with self.lock:
+            rows = self.conn.execute('SELECT schedule_id, data FROM schedules').fetchall()
+        return {schedule_id: json.loads(data) for schedule_id, data in rows}
+
+    # Processed command index
+
+    def claim_command(self, command_id):
+        """Mark a command as accepted; False if it was already seen in any session"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO processed_commands VALUES (?, ?, NULL, ?)',
+                (command_id, 'accepted', self._now())
+            )
+            return cursor.rowcount == 1
+
+    def finish_command(self, command_id, status, result):
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO processed_commands VALUES (?, ?, ?, ?)',
+                (command_id, status, result, self._now())
+            )
+
+    def get_command_outcome(self, command_id):
+        """Return (status, result) for a processed command, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT status, result FROM processed_commands WHERE command_id = ?', (command_id,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def prune_commands(self, max_age_seconds):
+        """Forget processed commands older than `max_age_seconds`"""
+        cutoff = self._now() - int(max_age_seconds * 1000)
+        with self.lock, self.conn:
+            cursor = self.conn.execute('DELETE FROM processed_commands WHERE updated_at < ?', (cutoff,))
+            return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+PanelSena Media Cache
+Bounded, LRU-evicting store for downloaded content with a persistent index
+"""
+
+import logging
+import os
+import json
+import time
+import hashlib
+import threading
+
+log = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+# Leftovers of interrupted downloads, never adopted as cached content
+PARTIAL_SUFFIXES = ('.part', '.part.json', '.tmp')
+
+
+class MediaCache:
+    def __init__(self, content_dir, cache_dir, max_bytes):
+        self.content_dir = content_dir
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+
+        # content_id -> {path, size, lastPlayed, sourceUrl, checksum, validators, validatedAt, verifiedAt, variants}
+        # where variants maps a profile key to {path, size} of a transcoded copy,
+        # with a None path when the original already fits the profile
+        self.entries = {}
+        self.lock = threading.RLock()
+
+        self.load_index()
+
+    def load_index(self):
+        """Load the cache index, rebuilding it from the content directory on first run"""
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    self.entries = json.load(f).get('entries', {})
+                log.info("Media cache index loaded: %s items, %s / %s bytes",
+                         len(self.entries), self.total_bytes(), self.max_bytes)
+                return
+            except Exception as e:
+                log.warning("Media cache index unreadable, rebuilding: %s", e)
+
+        # No usable index: adopt whatever an older player left in the content directory
+        self.entries = {}
+        if os.path.isdir(self.content_dir):
+            for name in os.listdir(self.content_dir):
+                path = os.path.join(self.content_dir, name)
+                if name.endswith(PARTIAL_SUFFIXES) or not os.path.isfile(path):
+                    continue
+                stat = os.stat(path)
+                content_id = os.path.splitext(name)[0]
+                self.entries[content_id] = {
+                    'path': path,
+                    'size': stat.st_size,
+                    'lastPlayed': int(stat.st_mtime * 1000),
+                    'sourceUrl': None,
+                    'checksum': None,
+                }
+        log.info("Media cache index rebuilt: %s items", len(self.entries))
+        self.save_index()
+
+    def save_index(self):
+        """Persist the index atomically so a power cut never leaves it half-written"""
+        with self.lock:
+            tmp_path = self.index_path + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump({'version': 1, 'entries': self.entries}, f)
+                os.replace(tmp_path, self.index_path)
+            except Exception as e:
+                log.error("Failed to save media cache index: %s", e)
+
+    def total_bytes(self):
+        """Total size of all indexed files"""
+        with self.lock:
+            return sum(self._entry_bytes(entry) for entry in self.entries.values())
+
+    @staticmethod
+    def _entry_bytes(entry):
+        return entry.get('size', 0) + sum(v.get('size', 0) for v in entry.get('variants', {}).values())
+
+    def lookup(self, content_id):
+        """Return the cached path for a content item, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(content_id)
+            if not entry:
+                return None
+
+            # Only the single hit is checked on disk, never the whole directory
+            if not os.path.exists(entry['path']):
+                log.warning("Cached file missing, dropping from index: %s", entry['path'])
+                # Transcoded copies would otherwise stay on disk, outside the quota
+                self._remove_variants(entry)
+                del self.entries[content_id]
+                self.save_index()
+                return None
+
+            return entry['path']
+
+    def touch(self, content_id):
+        """Record that a content item was just played"""
+        with self.lock:
+            entry = self.entries.get(content_id)
+            if entry:
+                entry['lastPlayed'] = int(time.time() * 1000)
+                self.save_index()
+
+    def get_entry(self, content_id):
+        """Return a copy of the index entry for a content item, or None"""
+        with self.lock:
+            entry = self.entries.get(content_id)
+            return dict(entry) if entry else None
+
+    def has_variant(self, content_id, profile_key):
+        """True if the item has been checked against a profile, whether or not it needed a copy"""
+        with self.lock:
+            entry = self.entries.get(content_id)
+            return bool(entry) and profile_key in entry.get('variants', {})
+
+    def lookup_variant(self, content_id, profile_key):
+        """Return the path of the item's transcoded copy for a profile, or None"""
+        with self.lock:
+            entry = self.entries.get(content_id)
+            variant = entry.get('variants', {}).get(profile_key) if entry else None
+            if not variant or not variant.get('path'):
+                return None
+            if not os.path.exists(variant['path']):
+                log.warning("Transcoded file missing, dropping from index: %s", variant['path'])
+                del entry['variants'][profile_key]
+                self.save_index()
+                return None
+            return variant['path']
+
+    def add_variant(self, content_id, profile_key, path, source_checksum, protected=()):
+        """Register a transcoded copy (or None when the original fits) of the file with `source_checksum`
+
+        Returns False, deleting the copy, if the item was evicted or replaced
+        while it was being transcoded.
+        """
+        with self.lock:
+            entry = self.entries.get(content_id)
+            if not entry or entry.get('checksum') != source_checksum:
+                if path:
+                    self._remove_file(path)
+                return False
+
+            variants = entry.setdefault('variants', {})
+            old_variant = variants.get(profile_key)
+            if old_variant and old_variant.get('path') and old_variant['path'] != path:
+                self._remove_file(old_variant['path'])
+            variants[profile_key] = {'path': path, 'size': os.path.getsize(path) if path else 0}
+            self.evict(protected=set(protected) | {content_id})
+            self.save_index()
+            return True
+
+    def mark_validated(self, content_id):
+        """Record that a cached item was just confirmed current with the server"""
+        with self.lock:
+            entry = self.entries.get(content_id)
+            if entry:
+                entry['validatedAt'] = int(time.time() * 1000)
+                self.save_index()
+
+    def add(self, content_id, path, source_url, validators=None, protected=(), checksum=None):
+        """Register a freshly downloaded file and enforce the quota
+
+        `checksum` is the file's hex MD5 if the downloader already computed it.
+        """
+        size = os.path.getsize(path)
+        checksum = checksum or self.file_checksum(path)
+
+        with self.lock:
+            old_entry = self.entries.get(content_id)
+            if old_entry:
+                # Transcoded copies were made from the old file
+                self._remove_variants(old_entry)
+                if old_entry['path'] != path and os.path.exists(old_entry['path']):
+                    self._remove_file(old_entry['path'])
+
+            self.entries[content_id] = {
+                'path': path,
+                'size': size,
+                'lastPlayed': int(time.time() * 1000),
+                'sourceUrl': source_url,
+                'checksum': checksum,
+                'validators': validators or {},
+                'validatedAt': int(time.time() * 1000),
+                'verifiedAt': int(time.time() * 1000),
+            }
+            self.evict(protected=set(protected) | {content_id})
+            self.save_index()
+
+    def next_to_verify(self, max_age_seconds):
+        """The item whose file was verified longest ago, if that is over `max_age_seconds` ago, or None
+
+        Items without a checksum (adopted from an older player) are skipped.
+        """
+        cutoff = int((time.time() - max_age_seconds) * 1000)
+        with self.lock:
+            due = [(entry.get('verifiedAt', 0), content_id) for content_id, entry in self.entries.items()
+                   if entry.get('checksum') and entry.get('verifiedAt', 0) < cutoff]
+        return min(due)[1] if due else None
+
+    def verify(self, content_id, bytes_per_second=None, cancelled=None):
+        """Re-hash a cached file and compare it with the checksum recorded when it was downloaded
+
+        Returns True if it matches, False if it is corrupt or missing, and None
+        if there is nothing to check, the file was replaced meanwhile or the
+        `cancelled` event was set.
+        """
+        entry = self.get_entry(content_id)
+        if not entry or not entry.get('checksum'):
+            return None
+        try:
+            checksum = self.file_checksum(entry['path'], bytes_per_second, cancelled)
+        except FileNotFoundError:
+            checksum = ''
+        if checksum is None:
+            return None
+
+        with self.lock:
+            current = self.entries.get(content_id)
+            if not current or current['path'] != entry['path'] or current.get('checksum') != entry['checksum']:
+                return None
+            if checksum != entry['checksum']:
+                return False
+            current['verifiedAt'] = int(time.time() * 1000)
+            self.save_index()
+            return True
+
+    def remove(self, content_id):
+        """Drop a content item from the cache and delete its file"""
+        with self.lock:
+            entry = self.entries.pop(content_id, None)
+            if entry:
+                self._remove_file(entry['path'])
+                self._remove_variants(entry)
+                self.save_index()
+
+    def reserve(self, needed_bytes, protected=()):
+        """Make room for a download of known size before it starts"""
+        with self.lock:
+            self.evict(needed_bytes=needed_bytes, protected=set(protected))
+            self.save_index()
+
+    def evict(self, needed_bytes=0, protected=()):
+        """Evict least recently played items until the cache fits its quota
+
+        Items in `protected` (the active content queue) are never evicted, so the
+        cache may temporarily exceed its quota when the queue alone is larger.
+        """
+        with self.lock:
+            total = self.total_bytes()
+            if total + needed_bytes <= self.max_bytes:
+                return
+
+            candidates = sorted(
+                (item for item in self.entries.items() if item[0] not in protected),
+                key=lambda item: item[1].get('lastPlayed', 0)
+            )
+
+            for content_id, entry in candidates:
+                if total + needed_bytes <= self.max_bytes:
+                    break
+                log.info("Evicting cached content %s (%s bytes)", content_id, self._entry_bytes(entry))
+                self._remove_file(entry['path'])
+                self._remove_variants(entry)
+                total -= self._entry_bytes(entry)
+                del self.entries[content_id]
+
+            if total + needed_bytes > self.max_bytes:
+                log.warning("Media cache over quota: %s bytes used by protected items", total)
+
+    def _remove_variants(self, entry):
+        for variant in entry.get('variants', {}).values():
+            if variant.get('path'):
+                self._remove_file(variant['path'])
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.error("Failed to remove cached file %s: %s", path, e)
+
+    @staticmethod
+    def file_checksum(path, bytes_per_second=None, cancelled=None):
+        """MD5 of a file, hex encoded, reading at most `bytes_per_second` if given
+
+        Returns None if the `cancelled` event is set part way.
+        """
+        md5 = hashlib.md5()
+        started_at = time.monotonic()
+        read = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                if cancelled is not None and cancelled.is_set():
+                    return None
+                md5.update(chunk)
+                read += len(chunk)
+                if bytes_per_second:
+                    ahead = read / bytes_per_second - (time.monotonic() - started_at)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        return md5.hexdigest()
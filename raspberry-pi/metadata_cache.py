@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+PanelSena Metadata Cache
+In-memory and on-disk TTL cache of Firestore content documents
+"""
+
+import logging
+import os
+import json
+import time
+import threading
+
+log = logging.getLogger(__name__)
+
+METADATA_FILE = "metadata.json"
+
+
+class MetadataCache:
+    def __init__(self, cache_dir, ttl_seconds):
+        self.path = os.path.join(cache_dir, METADATA_FILE)
+        self.ttl_ms = int(ttl_seconds * 1000)
+
+        # content_id -> {'data': document dict, 'fetchedAt': ms}
+        self.entries = {}
+        self.lock = threading.RLock()
+
+        self.load()
+
+    def load(self):
+        """Load cached metadata from disk; entries keep their original fetch time"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f).get('entries', {})
+            log.info("Metadata cache loaded: %s items", len(self.entries))
+        except Exception as e:
+            log.warning("Metadata cache unreadable, starting empty: %s", e)
+            self.entries = {}
+
+    def save(self):
+        with self.lock:
+            tmp_path = self.path + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    # Firestore timestamps are not JSON types; keep them as strings
+                    json.dump({'version': 1, 'entries': self.entries}, f, default=str)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                log.error("Failed to save metadata cache: %s", e)
+
+    def get(self, content_id, allow_stale=False):
+        """Return cached metadata, or None if missing or expired (unless allow_stale)"""
+        with self.lock:
+            entry = self.entries.get(content_id)
+            if entry is None:
+                return None
+            if not allow_stale and self._expired(entry):
+                return None
+            return entry['data']
+
+    def missing(self, content_ids):
+        """Content IDs with no fresh cached metadata, in order and without duplicates"""
+        with self.lock:
+            result = []
+            for content_id in content_ids:
+                entry = self.entries.get(content_id)
+                if (entry is None or self._expired(entry)) and content_id not in result:
+                    result.append(content_id)
+            return result
+
+    def put_many(self, documents):
+        """Store several {content_id: data} documents with one disk write"""
+        if not documents:
+            return
+        now = int(time.time() * 1000)
+        with self.lock:
+            for content_id, data in documents.items():
+                self.entries[content_id] = {'data': data, 'fetchedAt': now}
+            self.save()
+
+    def invalidate(self, content_ids=None):
+        """Expire the given content IDs, or every entry if None
+
+        Expired entries are kept as a fallback for when Firestore is unreachable.
+        """
+        with self.lock:
+            for content_id in (self.entries if content_ids is None else content_ids):
+                entry = self.entries.get(content_id)
+                if entry:
+                    entry['fetchedAt'] = 0
+            self.save()
+
+    def remove(self, content_id):
+        with self.lock:
+            if self.entries.pop(content_id, None) is not None:
+                self.save()
+
+    def _expired(self, entry):
+        return int(time.time() * 1000) - entry.get('fetchedAt', 0) >= self.ttl_ms
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+PanelSena Page Cache
+Document (PDF) content rasterized once into display-sized page images, bounded on disk
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+PAGE_DIR = "pages"
+MANIFEST_FILE = "pages.json"
+DEFAULT_PAGE_SIZE = (1920, 1080)
+DEFAULT_PAGE_CACHE_MAX_MB = 256
+DEFAULT_DOCUMENT_MAX_PAGES = 50
+RASTERIZE_TIMEOUT_SECONDS = 300
+
+
+class PageCache:
+    """Page images of documents, rendered with poppler's pdftoppm
+
+    Each document gets a directory of PNG pages that fit within the display,
+    and a manifest listing them in order. The manifest is written last, so
+    a directory without one is never used. Pages are current while the
+    manifest is newer than the document; the least recently shown documents
+    are evicted.
+    """
+
+    def __init__(self, page_dir, size=DEFAULT_PAGE_SIZE, max_bytes=DEFAULT_PAGE_CACHE_MAX_MB * 1024 * 1024,
+                 max_pages=DEFAULT_DOCUMENT_MAX_PAGES, pdftoppm='pdftoppm'):
+        self.page_dir = page_dir
+        self.size = tuple(size)
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.pdftoppm = pdftoppm
+        self.lock = threading.Lock()
+        os.makedirs(page_dir, exist_ok=True)
+
+    @staticmethod
+    def available(pdftoppm='pdftoppm'):
+        return shutil.which(pdftoppm) is not None
+
+    def document_dir(self, path):
+        return os.path.join(self.page_dir, os.path.basename(path))
+
+    def lookup(self, path):
+        """Return the page images of a document if they are ready, or None"""
+        manifest_path = os.path.join(self.document_dir(path), MANIFEST_FILE)
+        try:
+            if os.path.getmtime(manifest_path) < os.path.getmtime(path):
+                return None
+            with open(manifest_path, 'r') as f:
+                pages = json.load(f)['pages']
+            # The manifest's access time orders eviction
+            os.utime(manifest_path, (time.time(), os.path.getmtime(manifest_path)))
+        except (OSError, ValueError, KeyError):
+            return None
+        document_dir = self.document_dir(path)
+        return [os.path.join(document_dir, name) for name in pages]
+
+    def render(self, path):
+        """Rasterize a document unless its pages are already current; returns the page paths
+
+        Calls must not overlap; the player makes them all on one render thread,
+        so a second request for the same document finds its pages.
+        """
+        pages = self.lookup(path)
+        if pages is not None:
+            return pages
+        return self._render(path)
+
+    def _render(self, path):
+        document_dir = self.document_dir(path)
+        tmp_dir = document_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        started_at = time.monotonic()
+        try:
+            # -scale-to sets the page's long side, so scaling to the display's long
+            # side keeps landscape pages full width; the frame cache fits the result
+            result = subprocess.run(
+                [self.pdftoppm, '-png', '-l', str(self.max_pages), '-scale-to', str(max(self.size)),
+                 path, os.path.join(tmp_dir, 'page')],
+                capture_output=True,
+                text=True,
+                timeout=RASTERIZE_TIMEOUT_SECONDS
+            )
+            if result.returncode != 0:
+                raise RuntimeError(f"pdftoppm exited with {result.returncode}: {result.stderr.strip()[-500:]}")
+            # pdftoppm zero-pads page numbers to the same width, so names sort in page order
+            names = sorted(name for name in os.listdir(tmp_dir) if name.endswith('.png'))
+            if not names:
+                raise RuntimeError("Document has no pages")
+            with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+                json.dump({'source': os.path.basename(path), 'pages': names}, f)
+
+            with self.lock:
+                shutil.rmtree(document_dir, ignore_errors=True)
+                os.replace(tmp_dir, document_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        log.info("Rendered %s pages in %.0f ms: %s", len(names), (time.monotonic() - started_at) * 1000, path)
+        self.evict(keep=document_dir)
+        return [os.path.join(document_dir, name) for name in names]
+
+    def evict(self, keep=None):
+        """Delete the least recently shown documents' pages until the cache fits its quota"""
+        with self.lock:
+            documents = []
+            for name in os.listdir(self.page_dir):
+                document_dir = os.path.join(self.page_dir, name)
+                manifest_path = os.path.join(document_dir, MANIFEST_FILE)
+                if not os.path.isfile(manifest_path):
+                    continue
+                size = sum(entry.stat().st_size for entry in os.scandir(document_dir) if entry.is_file())
+                documents.append((os.stat(manifest_path).st_atime, size, document_dir))
+
+            total = sum(size for _, size, _ in documents)
+            for _, size, document_dir in sorted(documents):
+                if total <= self.max_bytes:
+                    break
+                if document_dir == keep:
+                    continue
+                shutil.rmtree(document_dir, ignore_errors=True)
+                total -= size
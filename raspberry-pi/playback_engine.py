@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+PanelSena Playback Engine
+Persistent in-process libvlc player with preloading of the next item, and
+pre-scaled image frames shown by the native slideshow when one is available
+"""
+
+import logging
+import os
+import time
+import threading
+
+log = logging.getLogger(__name__)
+
+DEFAULT_IMAGE_DURATION = 10
+
+
+class PlaybackEngine:
+    def __init__(self, vlc_instance, image_duration=DEFAULT_IMAGE_DURATION, on_event=None, vlc_module=None,
+                 frame_cache=None, slideshow=None):
+        if vlc_module is None:
+            import vlc as vlc_module
+        self.vlc_instance = vlc_instance
+        # python-vlc, or a stand-in with the same names
+        self.vlc = vlc_module
+        self.image_duration = image_duration
+
+        # Called as on_event(kind, path) with kind 'playing', 'ended' or 'error'
+        self.on_event = on_event
+
+        # One long-lived player and video output for every item, so a
+        # transition only swaps the media instead of starting a new VLC
+        self.player = self.vlc_instance.media_player_new()
+        self.player.set_fullscreen(True)
+
+        # Images are shown from their pre-scaled frame when it is ready, by
+        # the slideshow if there is one and by libvlc otherwise
+        self.frame_cache = frame_cache
+        self.slideshow = slideshow
+        if slideshow is not None:
+            slideshow.on_event = self._on_slideshow_event
+
+        self.current_path = None
+        self.current_type = None
+        self.on_slideshow = False
+        self.volume = 80
+        self.preloaded = {}  # absolute path -> parsed vlc.Media
+        self.lock = threading.Lock()
+
+        # Monotonic time of the last sign of progress, for stall detection
+        self.last_progress = time.monotonic()
+
+        # Playing/ended/error come from each media's own events (see _new_media)
+        events = self.player.event_manager()
+        events.event_attach(self.vlc.EventType.MediaPlayerTimeChanged, self._on_time_changed)
+
+    def _on_media_state(self, event, path):
+        """libvlc callback thread: only hand the event off, never call back into libvlc here"""
+        state = event.u.new_state
+        if state == self.vlc.State.Playing:
+            kind = 'playing'
+        elif state == self.vlc.State.Ended:
+            kind = 'ended'
+        elif state == self.vlc.State.Error:
+            kind = 'error'
+        else:
+            return
+        self.last_progress = time.monotonic()
+        if self.on_event:
+            self.on_event(kind, path)
+
+    def _on_slideshow_event(self, kind, path):
+        """Slideshow thread: forwarded like a libvlc event"""
+        self.last_progress = time.monotonic()
+        if self.on_event:
+            self.on_event(kind, path)
+
+    def _on_time_changed(self, event):
+        self.last_progress = time.monotonic()
+
+    def is_stalled(self, timeout):
+        """True if a playing video has shown no progress for `timeout` seconds"""
+        if self.current_path is None or self.current_type == 'image':
+            return False
+        if self.player.get_state() not in (self.vlc.State.Playing, self.vlc.State.Buffering, self.vlc.State.Opening):
+            return False
+        return time.monotonic() - self.last_progress > timeout
+
+    def _frame_for(self, path, content_type):
+        """The ready pre-scaled frame for an image, or None"""
+        if content_type != 'image' or self.frame_cache is None:
+            return None
+        return self.frame_cache.lookup(path)
+
+    def _new_media(self, path, content_type, duration=None):
+        frame_path = self._frame_for(path, content_type)
+        media = self.vlc_instance.media_new_path(frame_path or path)
+        # Tagged with the item's path when attached, so an event that arrives
+        # after the media was replaced is not taken for the new item's
+        media.event_manager().event_attach(self.vlc.EventType.MediaStateChanged, self._on_media_state, path)
+        if content_type == 'image':
+            # Images have no natural length; show them for a fixed time
+            media.add_option(f':image-duration={duration or self.image_duration}')
+        return media
+
+    def preload(self, path, content_type='video', duration=None):
+        """Create and parse the media for an upcoming item ahead of time
+
+        `duration` overrides `image_duration` for an image.
+        """
+        abs_path = os.path.abspath(path)
+        with self.lock:
+            if abs_path in self.preloaded or abs_path == self.current_path:
+                return
+            frame_path = self._frame_for(abs_path, content_type)
+            if frame_path is not None and self.slideshow is not None:
+                self.slideshow.preload(frame_path)
+                return
+            media = self._new_media(abs_path, content_type, duration)
+            media.parse_with_options(self.vlc.MediaParseFlag.local, 0)
+            # Keep only the next item preloaded
+            for old_media in self.preloaded.values():
+                old_media.release()
+            self.preloaded = {abs_path: media}
+        log.debug("Preloaded next media: %s", abs_path)
+
+    def play(self, path, content_type='video', duration=None):
+        """Switch the persistent player to a new file; returns True on success
+
+        `duration` overrides `image_duration` for an image.
+        """
+        abs_path = os.path.abspath(path)
+        with self.lock:
+            self.current_path = abs_path
+            self.current_type = content_type
+            self.last_progress = time.monotonic()
+
+            frame_path = self._frame_for(abs_path, content_type)
+            if frame_path is not None and self.slideshow is not None:
+                # libvlc's window would cover the slideshow's
+                if not self.on_slideshow:
+                    self.player.stop()
+                    self.on_slideshow = True
+                self.slideshow.show(frame_path, abs_path, duration or self.image_duration)
+                return True
+            if self.on_slideshow:
+                self.slideshow.hide()
+                self.on_slideshow = False
+
+            media = self.preloaded.pop(abs_path, None)
+            if media is None:
+                media = self._new_media(abs_path, content_type, duration)
+
+            self.player.set_media(media)
+            media.release()
+
+            if self.player.play() != 0:
+                return False
+            self.player.audio_set_volume(self.volume)
+            return True
+
+    def stop(self):
+        with self.lock:
+            self.player.stop()
+            if self.on_slideshow:
+                self.slideshow.hide()
+                self.on_slideshow = False
+            self.current_path = None
+            self.current_type = None
+
+    def pause(self):
+        if self.on_slideshow:
+            self.slideshow.pause()
+        else:
+            self.player.set_pause(1)
+
+    def resume(self):
+        if self.on_slideshow:
+            self.slideshow.resume()
+        else:
+            self.player.set_pause(0)
+        # Time spent paused is not a stall
+        self.last_progress = time.monotonic()
+
+    def set_volume(self, volume):
+        self.volume = volume
+        self.player.audio_set_volume(volume)
+
+    def release(self):
+        with self.lock:
+            for media in self.preloaded.values():
+                media.release()
+            self.preloaded = {}
+            self.player.stop()
+            self.player.release()
+            if self.slideshow is not None:
+                self.slideshow.close()
@@ -4,27 +4,100 @@ PanelSena Raspberry Pi Player
 A digital signage player that connects to Firebase and plays scheduled content
 """
 
+import asyncio
+import functools
+import logging
 import os
 import sys
 import time
 import json
+import mimetypes
+import random
 import subprocess
 import threading
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-import firebase_admin
-from firebase_admin import credentials, db, storage, firestore
-import vlc
+from media_cache import MediaCache
+from metadata_cache import MetadataCache
+from playback_engine import PlaybackEngine, DEFAULT_IMAGE_DURATION
+from transcoder import Transcoder, TRANSCODE_DIR, DEFAULT_DEVICE_PROFILE, DEFAULT_ENCODER
+from page_cache import PageCache, PAGE_DIR, DEFAULT_PAGE_CACHE_MAX_MB, DEFAULT_DOCUMENT_MAX_PAGES
+from slideshow import FrameCache, Slideshow, FRAME_DIR, DEFAULT_FRAME_SIZE, DEFAULT_FRAME_CACHE_MAX_MB, DEFAULT_CROSSFADE_SECONDS
+from status_publisher import StatusPublisher
+from schedule_watcher import ScheduleWatcher
+from schedule_engine import ScheduleEngine, DEFAULT_HORIZON_HOURS
+from local_store import LocalStore
+from command_dispatcher import CommandDispatcher, CommandAcker, CommandCompactor
+from player_log import setup_logging, DEFAULT_LOG_LEVEL, DEFAULT_LOG_BUFFER_LEVEL, DEFAULT_LOG_BUFFER_SIZE
+from metrics import (MetricsRegistry, MetricsServer, SIZE_BUCKETS, THROUGHPUT_BUCKETS, TRANSCODE_BUCKETS,
+                     DEFAULT_METRICS_HOST, DEFAULT_METRICS_PORT)
+
+log = logging.getLogger("player")
 
 # Configuration
 CONFIG_FILE = "config.json"
 CONTENT_DIR = "content"
 CACHE_DIR = "cache"
+DEFAULT_CACHE_MAX_MB = 2048
+DEFAULT_PREFETCH_COUNT = 2
+DEFAULT_PREFETCH_WORKERS = 2
+DEFAULT_SDK_WORKERS = 4
+DEFAULT_DOWNLOAD_SEGMENTS = 4
+DEFAULT_DOWNLOAD_SEGMENT_MIN_MB = 16
+DEFAULT_CACHE_REVALIDATE_SECONDS = 300
+DEFAULT_CACHE_SCRUB_INTERVAL_SECONDS = 30
+DEFAULT_CACHE_SCRUB_PERIOD_HOURS = 24
+DEFAULT_CACHE_SCRUB_MB_PER_SECOND = 8
+DEFAULT_STALL_TIMEOUT_SECONDS = 15
+DEFAULT_METADATA_TTL_SECONDS = 600
+DEFAULT_HEARTBEAT_FAST_SECONDS = 2
+DEFAULT_HEARTBEAT_IDLE_SECONDS = 30
+DEFAULT_HEARTBEAT_FAST_WINDOW_SECONDS = 30
+STORE_FILE = "player.db"
+RECONNECT_MIN_SECONDS = 5
+RECONNECT_MAX_SECONDS = 300
+LINK_RECHECK_MIN_SECONDS = 5
+LINK_RECHECK_MAX_SECONDS = 300
+QUEUE_RETRY_MIN_SECONDS = 5
+QUEUE_RETRY_MAX_SECONDS = 300
+PROCESSED_COMMAND_RETENTION_SECONDS = 7 * 24 * 3600
+DEFAULT_COMMAND_RETENTION_SECONDS = 3600
+DEFAULT_COMMAND_COMPACT_INTERVAL_SECONDS = 300
+DEFAULT_IMAGE_RENDERER = "auto"
+DEFAULT_TRANSCODE = True
+DEFAULT_DOCUMENT_PAGE_SECONDS = 10
+DEFAULT_LOCAL_SCHEDULING = True
+# The Pi has no RTC and its clock can jump at NTP sync; the transition timer re-reads it at least this often
+SCHEDULE_TIMER_MAX_SECONDS = 300
+
+
+class DeviceAuthError(Exception):
+    """The device key does not match the registered device"""
+
 
 class PanelSenaPlayer:
-    def __init__(self):
-        self.config = self.load_config()
+    def __init__(self, config=None, firebase=None, vlc_module=None):
+        """Create the player from config.json, Firebase and python-vlc
+
+        `config`, `firebase` (an object with `db`, `storage_bucket` and
+        `firestore_db`) and `vlc_module` replace those; the benchmark harness
+        passes in-process stand-ins.
+        """
+        # Startup is measured from here to the first frame
+        self.started_at = time.monotonic()
+        self.config = config if config is not None else self.load_config()
+
+        # Recent log records are kept in memory for the upload_logs command
+        self.log_buffer = setup_logging(
+            self.config.get("log_level", DEFAULT_LOG_LEVEL),
+            self.config.get("log_buffer_level", DEFAULT_LOG_BUFFER_LEVEL),
+            self.config.get("log_buffer_size", DEFAULT_LOG_BUFFER_SIZE)
+        )
+
+        # Counters and histograms, scraped locally and summarized in the status
+        self.init_metrics()
+
         self.device_id = self.config.get("device_id")
         self.device_key = self.config.get("device_key")
         self.display_name = self.config.get("display_name", "Raspberry Pi Display")
@@ -35,44 +108,97 @@ class PanelSenaPlayer:
 
         # State
         self.running = True
-
-        # Initialize Firebase
-        self.init_firebase()
-
-        # Authenticate and get device link
-        self.authenticate_device()
+        self.online = False
+
+        # Orchestration runs on one asyncio loop, created by run(). Blocking
+        # Firebase calls go through run_blocking() on a small bounded executor.
+        self.loop = None
+        self.tasks = set()
+        self.cleaned_up = False
+        self.sdk_pool = ThreadPoolExecutor(
+            max_workers=self.config.get("sdk_workers", DEFAULT_SDK_WORKERS),
+            thread_name_prefix="sdk"
+        )
+        # Listener (un)registration runs in order on one worker of its own
+        self.listener_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="listeners")
 
         # Create content directories
         Path(CONTENT_DIR).mkdir(exist_ok=True)
         Path(CACHE_DIR).mkdir(exist_ok=True)
 
-        # VLC process (used for subprocess mode)
-        self.vlc_process = None
-
-        # VLC player instance with fullscreen and other options
-        # For Linux desktop environments (Ubuntu, etc.)
-        # Detect if running in a desktop environment
-        display = os.environ.get('DISPLAY', '')
-        
-        if display:
-            # Running in X11 desktop environment
-            print(f"[INFO] Detected X11 display: {display}")
-            # Let VLC create its own window - simpler and more reliable
-            self.vlc_instance = vlc.Instance(
-                '--no-video-title-show',
-                '--video-on-top',
-                '--fullscreen',
-                '--mouse-hide-timeout=0'
-            )
-        else:
-            # Headless or console mode
-            print("[INFO] No X11 display detected, using default output")
-            self.vlc_instance = vlc.Instance('--no-video-title-show', '--fullscreen')
-        
-        self.player = self.vlc_instance.media_player_new()
-        self.player.set_fullscreen(True)
-        
-        self.current_media = None
+        # Durable manifest used to boot without network
+        self.local_store = LocalStore(os.path.join(CACHE_DIR, STORE_FILE))
+
+        # Firebase clients, the libvlc engine and the caches are created
+        # concurrently by start_up() once the loop runs
+        self.firebase = firebase
+        self.vlc_module = vlc_module
+        self.firebase_ready = None
+        self.engine_ready = None
+        self.db = None
+        self.storage_bucket = None
+        self.firestore_db = None
+        self.schedule_watcher = None
+        self.downloader = None
+        self.media_cache = None
+        self.metadata_cache = None
+        self.playback = None
+        self.frame_cache = None
+        self.page_cache = None
+        self.display_size = None
+        # asyncio primitives are created by serve() on the running loop; before
+        # Python 3.10 they bind to whichever loop is current when created
+        self.schedule_lock = None
+        self.cache_revalidate_seconds = self.config.get("cache_revalidate_seconds", DEFAULT_CACHE_REVALIDATE_SECONDS)
+
+        # Background prefetch of upcoming queue items, at most `prefetch_workers` at a time
+        prefetch_workers = self.config.get("prefetch_workers", DEFAULT_PREFETCH_WORKERS)
+        self.prefetch_count = self.config.get("prefetch_count", DEFAULT_PREFETCH_COUNT)
+        self.prefetch_workers = prefetch_workers
+        self.prefetch_slots = None
+        # Transfers run on their own pool so a long download never holds up the SDK executor
+        self.download_pool = ThreadPoolExecutor(
+            max_workers=prefetch_workers + 1,
+            thread_name_prefix="download"
+        )
+        self.downloads_in_flight = {}  # content_id -> task resolving to the local path
+
+        # Cached files are re-hashed one at a time while nothing else is downloading,
+        # on a low-priority thread with throttled reads, so playback never stalls on the disk
+        self.scrub_interval = self.config.get("cache_scrub_interval_seconds", DEFAULT_CACHE_SCRUB_INTERVAL_SECONDS)
+        self.scrub_period = self.config.get("cache_scrub_period_hours", DEFAULT_CACHE_SCRUB_PERIOD_HOURS) * 3600
+        self.scrub_bytes_per_second = int(
+            self.config.get("cache_scrub_mb_per_second", DEFAULT_CACHE_SCRUB_MB_PER_SECOND) * 1024 * 1024)
+        self.scrub_pool = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="scrub", initializer=self._lower_thread_priority)
+        self.scrub_cancelled = threading.Event()
+
+        # Videos outside the device profile are transcoded one at a time after download
+        self.transcoder = None
+        self.transcode_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcode")
+        self.transcodes_in_flight = {}  # content_id -> task
+        self.transcode_failed = set()
+
+        # Images and document pages are rendered one at a time on their own thread,
+        # so pdftoppm and Pillow never tie up the SDK executor
+        self.render_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+
+        self.stall_timeout = self.config.get("stall_timeout_seconds", DEFAULT_STALL_TIMEOUT_SECONDS)
+        self.transition_started_at = None
+        self.last_transition_ms = None
+        # Moves the queue on after an item ends; replaced by the next end, a play or a stop
+        self.advance_task = None
+        # Schedules being started; items that end meanwhile do not move the queue
+        self.schedules_starting = 0
+
+        # The display's schedules are evaluated on the device: one timer is
+        # armed for the next time the on-air schedule changes
+        self.schedule_engine = None
+        if self.config.get("local_scheduling", DEFAULT_LOCAL_SCHEDULING):
+            self.schedule_engine = ScheduleEngine(self.config.get("schedule_horizon_hours", DEFAULT_HORIZON_HOURS))
+        self.schedule_timer = None
+        self.timed_schedule_id = None  # on air at the last evaluation
+        self.prefetched_schedule_id = None
 
         # State
         self.is_playing = False
@@ -81,28 +207,195 @@ class PanelSenaPlayer:
         self.current_schedule = None
         self.content_queue = []
         self.current_index = 0
+        # Page images of the document playing, if it was rasterized
+        self.document_pages = []
+        self.document_page = 0
+        self.document_page_seconds = self.config.get("document_page_seconds", DEFAULT_DOCUMENT_PAGE_SECONDS)
         self.volume = 80
         self.brightness = 100  # Default brightness (0-100)
 
-        # Heartbeat thread
-        self.heartbeat_thread = threading.Thread(target=self.heartbeat_loop)
-        self.heartbeat_thread.daemon = True
+        # Delta status writer, created once the status path is known. Writes run
+        # one at a time; a status queued behind a write replaces any older one.
+        self.status_publisher = None
+        self.status_publisher_path = None
+        self.pending_status = None
+        self.status_task = None
+
+        # Heartbeat interval adapts to how recently the status changed
+        self.heartbeat_fast_interval = self.config.get("heartbeat_fast_seconds", DEFAULT_HEARTBEAT_FAST_SECONDS)
+        self.heartbeat_idle_interval = self.config.get("heartbeat_idle_seconds", DEFAULT_HEARTBEAT_IDLE_SECONDS)
+        self.heartbeat_fast_window = self.config.get("heartbeat_fast_window_seconds", DEFAULT_HEARTBEAT_FAST_WINDOW_SECONDS)
+        self.last_status_change = time.monotonic()
+        self.last_control_state = None
+        self.last_status_queued = 0.0
+        self.heartbeat_wake = None
+
+        # Commands run on the loop, by priority, with coalescing,
+        # and at most once across reconnects and restarts
+        self.local_store.prune_commands(PROCESSED_COMMAND_RETENTION_SECONDS)
+        self.dispatcher = CommandDispatcher(
+            execute=self.execute_command,
+            drop=lambda command_id, command, status, result: self.mark_command(command_id, status, result),
+            claim=self.local_store.claim_command,
+            replay_ack=self.replay_command_ack
+        )
+        self.command_acker = CommandAcker(
+            lambda: self.db.reference(f'users/{self.user_id}/displays/{self.display_id}/commands'),
+            self.run_blocking
+        )
+
+        # Finished commands are removed so the listened subtree stays small
+        self.command_compactor = CommandCompactor(
+            lambda: self.db.reference(f'users/{self.user_id}/displays/{self.display_id}'),
+            retention_seconds=self.config.get("command_retention_seconds", DEFAULT_COMMAND_RETENTION_SECONDS),
+            archive=self.config.get("command_archive", False)
+        )
+        self.command_compact_interval = self.config.get("command_compact_interval_seconds", DEFAULT_COMMAND_COMPACT_INTERVAL_SECONDS)
+
+        log.info("PanelSena Player initialized for display: %s", self.display_name)
+
+    def init_metrics(self):
+        """Create the player's metrics; the HTTP endpoint is started by run()"""
+        self.metrics = MetricsRegistry()
+        m = self.metrics
+        self.m_commands = m.counter(
+            'panelsena_commands_total', 'Commands executed, by type and outcome', ('type', 'status'))
+        self.m_command_seconds = m.histogram(
+            'panelsena_command_duration_seconds', 'Time spent executing a command', labelnames=('type',))
+        self.m_listener_lag = m.histogram(
+            'panelsena_command_listener_lag_seconds', 'Time from a command being issued to it starting to run')
+        self.m_first_frame = m.histogram(
+            'panelsena_command_first_frame_seconds', 'Time from a play command starting to its first frame')
+        self.m_cache_requests = m.counter(
+            'panelsena_cache_requests_total', 'Content lookups, by hit, miss or shared in-flight download', ('result',))
+        self.m_downloads = m.counter(
+            'panelsena_downloads_total', 'Content downloads, by outcome (ok, failed or corrupt)', ('status',))
+        self.m_download_bytes = m.counter(
+            'panelsena_download_bytes_total', 'Bytes of content downloaded')
+        self.m_download_seconds = m.histogram(
+            'panelsena_download_duration_seconds', 'Time taken by successful downloads')
+        self.m_download_throughput = m.histogram(
+            'panelsena_download_throughput_bytes_per_second', 'Throughput of successful downloads', THROUGHPUT_BUCKETS)
+        self.m_cache_scrubs = m.counter(
+            'panelsena_cache_scrubs_total', 'Cached files re-verified against their checksum, by outcome', ('result',))
+        self.m_plays = m.counter(
+            'panelsena_plays_total', 'Items handed to the playback engine, by type and outcome', ('type', 'status'))
+        self.m_transition_seconds = m.histogram(
+            'panelsena_transition_seconds', 'Gap between one item ending and the next showing its first frame')
+        self.m_content_ends = m.counter(
+            'panelsena_content_ends_total', 'Items that finished playing, by reason', ('reason',))
+        self.m_status_writes = m.counter(
+            'panelsena_status_writes_total', 'Status writes, by whether anything besides the heartbeat changed', ('changed',))
+        self.m_status_bytes = m.histogram(
+            'panelsena_status_write_bytes', 'Payload size of status writes', SIZE_BUCKETS)
+        self.m_status_bytes_total = m.counter(
+            'panelsena_status_write_bytes_total', 'Bytes of status written')
+
+        self.m_transcodes = m.counter(
+            'panelsena_transcodes_total', 'Videos checked against the device profile, by outcome', ('result',))
+        self.m_transcode_seconds = m.histogram(
+            'panelsena_transcode_duration_seconds', 'Time taken by successful transcodes', TRANSCODE_BUCKETS)
+
+        self.m_startup_first_frame = m.histogram(
+            'panelsena_startup_first_frame_seconds', 'Time from the player starting to its first frame')
+
+        # Set when a play command starts; cleared by its first frame
+        self.first_frame_started_at = None
+        self.startup_first_frame_ms = None
+        self.metrics_server = None
+
+    def metrics_summary(self):
+        """Compact metrics for the status object, rounded so they rarely change"""
+        hits = self.m_cache_requests.total(result='hit') + self.m_cache_requests.total(result='shared')
+        lookups = hits + self.m_cache_requests.total(result='miss')
+        throughput = self.m_download_throughput.last
+        first_frame = self.m_first_frame.last
+        lag = self.m_listener_lag.last
+        return {
+            'commands': self.m_commands.total(),
+            'commandErrors': self.m_commands.total(status='failed'),
+            'firstFrameMs': int(first_frame * 1000) if first_frame is not None else None,
+            'listenerLagMs': int(lag * 1000) if lag is not None else None,
+            'cacheHitRatio': round(hits / lookups, 2) if lookups else None,
+            'downloadKBps': int(throughput / 1024) if throughput is not None else None,
+            'startupFirstFrameMs': self.startup_first_frame_ms,
+        }
+
+    def start_metrics_server(self):
+        port = self.config.get("metrics_port", DEFAULT_METRICS_PORT)
+        if not port:
+            return
+        try:
+            self.metrics_server = MetricsServer(
+                self.metrics, self.config.get("metrics_host", DEFAULT_METRICS_HOST), port)
+            self.metrics_server.start()
+        except OSError as e:
+            log.warning("Metrics endpoint unavailable on port %s: %s", port, e)
+
+    async def run_blocking(self, func, *args, executor=None):
+        """Run a blocking call (Firebase, Storage, disk, subprocess) off the loop and await it"""
+        return await self.loop.run_in_executor(executor or self.sdk_pool, functools.partial(func, *args))
+
+    def from_thread(self, callback, *args):
+        """Schedule `callback(*args)` on the loop from an SDK or libvlc thread
+
+        Coroutine functions are started as tasks. Calls arriving before the
+        loop starts or after it has stopped are dropped.
+        """
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            if asyncio.iscoroutinefunction(callback):
+                loop.call_soon_threadsafe(lambda: self.spawn(callback(*args)))
+            else:
+                loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The loop closed after the check
+            pass
+
+    def spawn(self, coro):
+        """Start a background task, keeping a reference to it and logging its failure"""
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    @staticmethod
+    def _lower_thread_priority():
+        """Run the calling worker thread at the lowest CPU priority (Linux niceness is per thread)"""
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, 19)
+        except (AttributeError, OSError):
+            pass
 
-        print(f"[INFO] PanelSena Player initialized for display: {self.display_name}")
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Background task failed: %s", task.exception(), exc_info=task.exception())
 
     def load_config(self):
         """Load configuration from config.json"""
         if not os.path.exists(CONFIG_FILE):
-            print(f"[ERROR] Configuration file {CONFIG_FILE} not found!")
-            print("Please create a config.json file with your Firebase credentials")
+            log.error("Configuration file %s not found!", CONFIG_FILE)
+            log.info("Please create a config.json file with your Firebase credentials")
             sys.exit(1)
 
         with open(CONFIG_FILE, 'r') as f:
             return json.load(f)
 
     def init_firebase(self):
-        """Initialize Firebase Admin SDK"""
-        try:
+        """Initialize Firebase Admin SDK and the clients built on it, unless stand-ins were given"""
+        if self.firebase is not None:
+            self.db = self.firebase.db
+            self.storage_bucket = self.firebase.storage_bucket
+            self.firestore_db = self.firebase.firestore_db
+        else:
+            # Imported here rather than at startup: the SDK and its gRPC stack
+            # take seconds to load on a Pi, and load alongside libvlc this way
+            import firebase_admin
+            from firebase_admin import credentials, db, storage, firestore
+
             # Initialize with service account
             cred = credentials.Certificate(self.config.get("service_account_path"))
             firebase_admin.initialize_app(cred, {
@@ -115,91 +408,347 @@ class PanelSenaPlayer:
             self.storage_bucket = storage.bucket()
             self.firestore_db = firestore.client()
 
-            print("[INFO] Firebase initialized successfully")
-        except Exception as e:
-            print(f"[ERROR] Failed to initialize Firebase: {e}")
-            sys.exit(1)
+            log.info("Firebase initialized successfully")
+
+        # Live listeners keeping the active schedule and its content up to date;
+        # their callbacks arrive on Firestore threads and are moved onto the loop
+        self.schedule_watcher = ScheduleWatcher(
+            self.firestore_db,
+            on_schedule_change=lambda *args: self.from_thread(self.apply_schedule_change, *args),
+            on_content_change=lambda *args: self.from_thread(self.apply_content_change, *args),
+            on_display_schedules=lambda *args: self.from_thread(self.set_display_schedules, *args)
+        )
+
+        # Resumable downloader shared by the play path and the prefetcher
+        from downloader import Downloader
+        download_segments = self.config.get("download_segments", DEFAULT_DOWNLOAD_SEGMENTS)
+        prefetch_workers = self.config.get("prefetch_workers", DEFAULT_PREFETCH_WORKERS)
+        self.downloader = Downloader(
+            self.storage_bucket,
+            segments=download_segments,
+            segment_min_bytes=int(self.config.get("download_segment_min_mb", DEFAULT_DOWNLOAD_SEGMENT_MIN_MB) * 1024 * 1024),
+            # Enough keep-alive connections for every concurrent download's segments
+            pool_size=download_segments * (prefetch_workers + 1)
+        )
+
+    def init_playback(self):
+        """Create the libvlc instance and the persistent playback engine"""
+        vlc_module = self.vlc_module
+        if vlc_module is None:
+            import vlc as vlc_module
 
-    def authenticate_device(self):
-        """Authenticate device and get user/display link"""
+        # VLC player instance with fullscreen and other options
+        # For Linux desktop environments (Ubuntu, etc.)
+        # Detect if running in a desktop environment
+        display = os.environ.get('DISPLAY', '')
+        
+        if display:
+            # Running in X11 desktop environment
+            log.info("Detected X11 display: %s", display)
+            # Let VLC create its own window - simpler and more reliable
+            self.vlc_instance = vlc_module.Instance(
+                '--no-video-title-show',
+                '--video-on-top',
+                '--fullscreen',
+                '--mouse-hide-timeout=0'
+            )
+        else:
+            # Headless or console mode
+            log.info("No X11 display detected, using default output")
+            self.vlc_instance = vlc_module.Instance('--no-video-title-show', '--fullscreen')
+        
+        slideshow = self.init_slideshow()
+        self.init_page_cache()
+
+        # Persistent libvlc engine shared by every played item. Its events are
+        # handed to the loop rather than handled on libvlc's thread.
+        self.playback = PlaybackEngine(
+            self.vlc_instance,
+            image_duration=self.config.get("image_duration_seconds", DEFAULT_IMAGE_DURATION),
+            on_event=lambda kind, path: self.from_thread(self.on_playback_event, kind, path, time.monotonic()),
+            vlc_module=vlc_module,
+            frame_cache=self.frame_cache,
+            slideshow=slideshow
+        )
+        self.playback.set_volume(self.volume)
+
+    def init_slideshow(self):
+        """Set up pre-scaled image frames and the native slideshow, returning the slideshow
+
+        Without Pillow, libvlc decodes images from the original files. Without
+        pygame or a display it shows the pre-scaled frames instead. Also
+        settles `display_size`, which frames and document pages are fitted to.
+        """
+        self.display_size = self.config.get("frame_size") or DEFAULT_FRAME_SIZE
+        if self.config.get("image_renderer", DEFAULT_IMAGE_RENDERER) == "vlc":
+            return None
+        if not FrameCache.available():
+            log.info("Pillow not installed, images are decoded by libvlc")
+            return None
+
+        slideshow = None
         try:
-            print(f"[INFO] Authenticating device: {self.device_id}")
-
-            # First, register device in registry (or update last seen)
-            device_ref = self.db.reference(f'device_registry/{self.device_id}')
-            device_data = device_ref.get()
-
-            if device_data:
-                # Verify device key
-                if device_data.get('deviceKey') != self.device_key:
-                    print("[ERROR] Invalid device key!")
-                    print("The device key in config.json does not match the registered device.")
-                    sys.exit(1)
-
-                # Update last seen
-                device_ref.update({'lastSeen': int(time.time() * 1000)})
-                print("[INFO] Device authenticated successfully")
-            else:
-                # Register new device
-                print("[INFO] Registering new device...")
-                device_ref.set({
-                    'deviceId': self.device_id,
-                    'deviceKey': self.device_key,
-                    'displayName': self.display_name,
-                    'registeredAt': int(time.time() * 1000),
-                    'lastSeen': int(time.time() * 1000),
-                    'linkedToUser': None,
-                    'status': 'registered'
-                })
-                print("[INFO] Device registered. Please link it in the dashboard.")
-
-            # Check if device is linked to a user
-            link_ref = self.db.reference(f'device_links/{self.device_id}')
-            link_data = link_ref.get()
-
-            if link_data:
-                self.user_id = link_data.get('userId')
-                self.display_id = link_data.get('displayId')
-                print(f"[INFO] Device linked to user: {self.user_id}, display: {self.display_id}")
-            else:
-                print("[WARN] Device not linked to any user yet")
-                print("Please link this device in the dashboard:")
-                print(f"  Device ID:  {self.device_id}")
-                print(f"  Device Key: {self.device_key}")
-                print()
-                print("Waiting for device to be linked...")
+            import pygame
+            slideshow = Slideshow(
+                pygame,
+                crossfade_seconds=self.config.get("image_crossfade_seconds", DEFAULT_CROSSFADE_SECONDS)
+            )
+        except ImportError:
+            log.info("pygame not installed, pre-scaled images are shown by libvlc")
+        except Exception as e:
+            log.warning("Slideshow unavailable, pre-scaled images are shown by libvlc: %s", e)
+
+        if slideshow is not None and not self.config.get("frame_size"):
+            self.display_size = slideshow.size
+        self.frame_cache = FrameCache(
+            os.path.join(CACHE_DIR, FRAME_DIR),
+            self.display_size,
+            int(self.config.get("frame_cache_max_mb", DEFAULT_FRAME_CACHE_MAX_MB) * 1024 * 1024)
+        )
+        return slideshow
+
+    def init_page_cache(self):
+        """Set up rasterized document pages; without pdftoppm, libvlc gets the PDF itself"""
+        if not PageCache.available():
+            log.info("pdftoppm not found, documents are handed to libvlc as they are")
+            return
+        self.page_cache = PageCache(
+            os.path.join(CACHE_DIR, PAGE_DIR),
+            self.display_size,
+            int(self.config.get("page_cache_max_mb", DEFAULT_PAGE_CACHE_MAX_MB) * 1024 * 1024),
+            self.config.get("document_max_pages", DEFAULT_DOCUMENT_MAX_PAGES)
+        )
+
+    def init_caches(self):
+        """Load the media cache and metadata cache indexes from disk"""
+        # Bounded media cache with a persistent index
+        cache_max_mb = self.config.get("cache_max_mb", DEFAULT_CACHE_MAX_MB)
+        self.media_cache = MediaCache(CONTENT_DIR, CACHE_DIR, int(cache_max_mb * 1024 * 1024))
+
+        # TTL cache of Firestore content documents
+        self.metadata_cache = MetadataCache(
+            CACHE_DIR,
+            self.config.get("metadata_ttl_seconds", DEFAULT_METADATA_TTL_SECONDS)
+        )
+
+        # Normalized copies of videos the device would struggle to decode
+        if not self.config.get("transcode", DEFAULT_TRANSCODE):
+            return
+        if not Transcoder.available():
+            log.info("ffmpeg/ffprobe not found, videos play as uploaded")
+            return
+        self.transcoder = Transcoder(
+            os.path.join(CACHE_DIR, TRANSCODE_DIR),
+            profile=self.config.get("device_profile", DEFAULT_DEVICE_PROFILE),
+            encoder=self.config.get("transcode_encoder", DEFAULT_ENCODER)
+        )
+        log.info("Videos are normalized to profile %s", self.transcoder.profile_key)
+
+    async def start_up(self):
+        """Initialize Firebase, libvlc and the caches concurrently, then start playing
+
+        With a stored device link, the stored schedule starts as soon as
+        libvlc and the caches are ready. Authentication runs alongside and
+        the player goes online when both are done.
+        """
+        link = self.local_store.get_device_link(self.device_id)
+        if link is not None:
+            self.user_id, self.display_id = link
+            log.info("Starting with stored link: user %s, display %s", self.user_id, self.display_id)
+
+        # Awaited by connect() and by downloads, which need the Storage client
+        self.firebase_ready = asyncio.ensure_future(self.run_blocking(self.init_firebase))
+        self.engine_ready = asyncio.gather(self.run_blocking(self.init_playback), self.run_blocking(self.init_caches))
+        self.spawn(self.connect())
+        await self.engine_ready
+
+        if link is not None:
+            # The schedules stored last session decide what is on air now, without
+            # the network. Otherwise pick up the schedule that was playing before
+            # shutdown; a play command arriving meanwhile takes over from it.
+            if not self.set_display_schedules(self.local_store.get_schedules(), save=False):
+                self.advance_task = self.spawn(self.resume_from_manifest())
+
+    async def connect(self):
+        """Authenticate the device and go online, retrying while Firebase is unreachable"""
+        try:
+            await self.firebase_ready
+        except Exception as e:
+            log.error("Failed to initialize Firebase: %s", e)
+            self.running = False
+            return
 
-                # Wait for link
-                self.wait_for_device_link()
+        delay = RECONNECT_MIN_SECONDS
+        while self.running:
+            try:
+                user_id, display_id = await self.verify_device()
+                break
+            except DeviceAuthError:
+                log.error("Device key rejected, shutting down")
+                self.running = False
+                return
+            except Exception as e:
+                if not self.running:
+                    return
+                if self.user_id is None:
+                    log.error("Device authentication failed and there is no stored device link: %s", e)
+                    self.running = False
+                    return
+                log.warning("Offline, retrying in %ss: %s", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+        else:
+            return
+
+        # Commands need the playback engine and caches
+        await self.engine_ready
+        if (user_id, display_id) != (self.user_id, self.display_id):
+            if self.user_id is not None:
+                log.warning("Device was relinked to user %s, display %s", user_id, display_id)
+                await self.stop_playback()
+                self.set_display_schedules({})
+            self.user_id, self.display_id = user_id, display_id
+        self.local_store.save_device_link(self.device_id, self.user_id, self.display_id)
+        self.online = True
+
+        log.info("Connected to Firebase, reconciling")
+        await self.reconcile_after_reconnect()
+
+    async def verify_device(self):
+        """Check the device against the registry and resolve its link
+
+        Returns (user_id, display_id), raising on failure. The registry and
+        link are read concurrently, and the lastSeen update is not waited for.
+        """
+        log.info("Authenticating device: %s", self.device_id)
+
+        device_ref = self.db.reference(f'device_registry/{self.device_id}')
+        link_ref = self.db.reference(f'device_links/{self.device_id}')
+        device_data, link_data = await asyncio.gather(
+            self.run_blocking(device_ref.get), self.run_blocking(link_ref.get))
+
+        if device_data:
+            # Verify device key
+            if device_data.get('deviceKey') != self.device_key:
+                log.error("Invalid device key!")
+                log.info("The device key in config.json does not match the registered device.")
+                raise DeviceAuthError("Invalid device key")
+
+            # Update last seen
+            self.spawn(self.run_blocking(device_ref.update, {'lastSeen': int(time.time() * 1000)}))
+            log.info("Device authenticated successfully")
+        else:
+            # Register new device
+            log.info("Registering new device...")
+            await self.run_blocking(device_ref.set, {
+                'deviceId': self.device_id,
+                'deviceKey': self.device_key,
+                'displayName': self.display_name,
+                'registeredAt': int(time.time() * 1000),
+                'lastSeen': int(time.time() * 1000),
+                'linkedToUser': None,
+                'status': 'registered'
+            })
+            log.info("Device registered. Please link it in the dashboard.")
+
+        # Check if device is linked to a user
+        if link_data:
+            log.info("Device linked to user: %s, display: %s", link_data.get('userId'), link_data.get('displayId'))
+        else:
+            log.warning("Device not linked to any user yet")
+            log.info("Please link this device in the dashboard:")
+            log.info("  Device ID:  %s", self.device_id)
+            log.info("  Device Key: %s", self.device_key)
+            log.info("Waiting for device to be linked...")
+
+            # Wait for link
+            link_data = await self.wait_for_device_link()
+
+        return link_data.get('userId'), link_data.get('displayId')
+
+    async def reconcile_after_reconnect(self):
+        """Bring Firebase and the locally started playback back in sync"""
+        if self.status_publisher is not None:
+            self.status_publisher.reset()
+        self.update_status(self.current_status())
+        await self.listen_for_commands()
+        if self.schedule_engine is not None:
+            await self.run_blocking(self.schedule_watcher.watch_display, self.user_id, self.display_id,
+                                    executor=self.listener_pool)
+
+        if self.current_schedule and self.content_queue:
+            schedule_id = self.current_schedule['id']
+            content_ids = self.content_queue
+            documents = await self.resolve_content_metadata(content_ids, refresh=True)
+            self.local_store.save_active_schedule(schedule_id, self.current_schedule.get('name'), content_ids, documents)
+            # The listener's first snapshot applies any edits made while offline
+            await self.run_blocking(self.schedule_watcher.watch, schedule_id, content_ids, executor=self.listener_pool)
+
+    async def wait_for_device_link(self):
+        """Wait for the device to be linked to a user, returning the link
+
+        A realtime listener reports the link as soon as the dashboard writes
+        it. Reads at a jittered, growing interval cover a listener that
+        could not be opened or has silently dropped.
+        """
+        link_ref = self.db.reference(f'device_links/{self.device_id}')
+        changed = asyncio.Event()
 
+        def on_link_event(event):
+            # SDK listener thread; the link is read back on the loop
+            if event.data is not None:
+                self.from_thread(changed.set)
+
+        registration = None
+        try:
+            registration = await self.run_blocking(link_ref.listen, on_link_event)
+            log.info("Listening for the device link...")
         except Exception as e:
-            print(f"[ERROR] Device authentication failed: {e}")
-            sys.exit(1)
+            log.warning("Could not listen for the device link, checking periodically instead: %s", e)
 
-    def wait_for_device_link(self):
-        """Wait for device to be linked to a user"""
-        link_ref = self.db.reference(f'device_links/{self.device_id}')
+        delay = LINK_RECHECK_MIN_SECONDS
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(changed.wait(), random.uniform(delay / 2, delay))
+                except asyncio.TimeoutError:
+                    delay = min(delay * 2, LINK_RECHECK_MAX_SECONDS)
+                changed.clear()
 
-        print("[INFO] Polling for device link every 5 seconds...")
-        while self.running:
-            link_data = link_ref.get()
-            if link_data:
-                self.user_id = link_data.get('userId')
-                self.display_id = link_data.get('displayId')
-                print(f"[INFO] Device linked! User: {self.user_id}, Display: {self.display_id}")
-                break
-            time.sleep(5)
+                try:
+                    link_data = await self.run_blocking(link_ref.get)
+                except Exception as e:
+                    log.warning("Failed to check the device link: %s", e)
+                    continue
+                if link_data and link_data.get('userId') and link_data.get('displayId'):
+                    log.info("Device linked! User: %s, Display: %s", link_data.get('userId'), link_data.get('displayId'))
+                    return link_data
+        finally:
+            # At shutdown the listener goes away with the process
+            if registration is not None and self.running:
+                self.spawn(self.run_blocking(registration.close))
 
     def update_status(self, status="online", error_message=None):
-        """Update display status in Firebase Realtime Database"""
+        """Queue a status update to Firebase Realtime Database
+
+        The status is captured now, on the loop, and written by write_status()
+        without blocking the caller.
+        """
         try:
-            print(f"[DEBUG] update_status called with status={status}")
+            log.debug("update_status called with status=%s", status)
             
+            if not self.online:
+                log.debug("Offline, status update skipped")
+                return
+
             if not self.user_id or not self.display_id:
-                print("[WARN] Cannot update status - user_id or display_id not set")
+                log.warning("Cannot update status - user_id or display_id not set")
                 return
 
-            status_ref = self.db.reference(f'users/{self.user_id}/displays/{self.display_id}/status')
+            status_path = f'users/{self.user_id}/displays/{self.display_id}/status'
+            if self.status_publisher is None or self.status_publisher_path != status_path:
+                self.status_publisher = StatusPublisher(self.db.reference(status_path))
+                self.status_publisher_path = status_path
 
             status_data = {
                 'displayId': self.display_id,
@@ -208,9 +757,11 @@ class PanelSenaPlayer:
                 'lastHeartbeat': int(time.time() * 1000),
                 'volume': self.volume,
                 'brightness': self.brightness,
+                'transitionMs': self.last_transition_ms,
+                'metrics': self.metrics_summary(),
             }
 
-            print(f"[DEBUG] Preparing status update: status={status}, lastHeartbeat={status_data['lastHeartbeat']}")
+            log.debug("Preparing status update: status=%s, lastHeartbeat=%s", status, status_data['lastHeartbeat'])
 
             # Add current content if playing
             if self.current_content:
@@ -239,46 +790,84 @@ class PanelSenaPlayer:
             if error_message:
                 status_data['errorMessage'] = error_message
 
-            print(f"[DEBUG] Setting Firebase status data...")
-            status_ref.set(status_data)
-            print(f"[DEBUG] Firebase status updated successfully with status={status}")
+            self.pending_status = status_data
+            self.last_status_queued = time.monotonic()
+            if self.status_task is None or self.status_task.done():
+                self.status_task = self.spawn(self.write_status())
 
         except Exception as e:
-            print(f"[ERROR] Failed to update status: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Failed to update status: %s", e)
 
-    def heartbeat_loop(self):
-        """Send heartbeat every 10 seconds"""
-        print("[INFO] Heartbeat loop started")
+    async def write_status(self):
+        """Publish queued statuses one write at a time"""
+        while self.pending_status is not None:
+            status_data, self.pending_status = self.pending_status, None
+            try:
+                changed, bytes_written = await self.run_blocking(self.status_publisher.publish, status_data)
+            except Exception as e:
+                log.exception("Failed to update status: %s", e)
+                continue
+            self.m_status_writes.inc(changed=str(changed).lower())
+            self.m_status_bytes.observe(bytes_written)
+            self.m_status_bytes_total.inc(bytes_written)
+            # Beat fast for a while after a command, an error or going online, so the
+            # dashboard follows closely; moving through the queue does not count
+            control_state = (status_data['status'], status_data.get('errorMessage'), status_data['volume'],
+                             status_data['brightness'], (status_data['schedule'] or {}).get('id'))
+            if control_state != self.last_control_state:
+                self.last_control_state = control_state
+                self.last_status_change = time.monotonic()
+                self.heartbeat_wake.set()
+            log.debug("Firebase status published (status=%s, changed=%s, %s bytes)",
+                      status_data['status'], changed, bytes_written)
+
+    def current_status(self):
+        """Status name matching the current playback state"""
+        if self.is_playing and not self.is_paused:
+            return "playing"
+        elif self.is_paused:
+            return "paused"
+        return "online"
+
+    async def heartbeat_loop(self):
+        """Send heartbeats, fast right after a state change and slow when idle
+
+        Any status write counts as a heartbeat, so one is only sent after a
+        full interval without writes.
+        """
+        log.info("Heartbeat loop started")
         while self.running:
+            if time.monotonic() - self.last_status_change < self.heartbeat_fast_window:
+                interval = self.heartbeat_fast_interval
+            else:
+                interval = self.heartbeat_idle_interval
+            remaining = self.last_status_queued + interval - time.monotonic()
+            if remaining > 0:
+                # Woken early when a state change shortens the interval
+                try:
+                    await asyncio.wait_for(self.heartbeat_wake.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                self.heartbeat_wake.clear()
+                continue
+
             try:
-                if self.is_playing and not self.is_paused:
-                    current_status = "playing"
-                elif self.is_paused:
-                    current_status = "paused"
-                else:
-                    current_status = "online"
-                
-                print(f"[DEBUG] Heartbeat: status={current_status}, is_playing={self.is_playing}, is_paused={self.is_paused}")
+                current_status = self.current_status()
+                log.debug("Heartbeat: status=%s, is_playing=%s, is_paused=%s", current_status, self.is_playing, self.is_paused)
                 self.update_status(current_status)
             except Exception as e:
-                print(f"[ERROR] Heartbeat failed: {e}")
-                import traceback
-                traceback.print_exc()
-                # Don't let heartbeat errors crash the loop
-                pass
+                log.exception("Heartbeat failed: %s", e)
+            # Also when offline and nothing was queued, so the loop does not spin
+            self.last_status_queued = time.monotonic()
 
-            time.sleep(10)
-        
-        print("[INFO] Heartbeat loop ended")
+        log.info("Heartbeat loop ended")
 
-    def listen_for_commands(self):
+    async def listen_for_commands(self):
         """Listen for commands from Firebase"""
         commands_ref = self.db.reference(f'users/{self.user_id}/displays/{self.display_id}/commands')
 
         def command_listener(event):
-            """Handle incoming commands"""
+            """Handle incoming commands (on the SDK's listener thread)"""
             if event.data is None:
                 return
 
@@ -289,187 +878,714 @@ class PanelSenaPlayer:
                     # Single command object
                     if event.data.get('status') == 'pending':
                         command_id = event.data.get('commandId', 'unknown')
-                        print(f"[INFO] Received command: {event.data.get('type')}")
-                        self.execute_command(command_id, event.data)
+                        log.info("Received command: %s", event.data.get('type'))
+                        self.from_thread(self.receive_command, command_id, event.data)
                 else:
                     # Multiple commands
                     for command_id, command in event.data.items():
-                        if isinstance(command, dict) and command.get('status') == 'pending':
-                            print(f"[INFO] Received command: {command.get('type')}")
-                            self.execute_command(command_id, command)
-
-        commands_ref.listen(command_listener)
-        print("[INFO] Listening for commands...")
+                        if not isinstance(command, dict):
+                            continue
+                        if command.get('status') == 'pending':
+                            log.info("Received command: %s", command.get('type'))
+                            self.from_thread(self.receive_command, command_id, command)
+                        else:
+                            # Finished earlier (the initial sync includes history); queue it for compaction
+                            finished_at = command.get('timestamp') or int(time.time() * 1000)
+                            self.command_compactor.note_command(command_id, command, finished_at=finished_at)
+
+        # Opening the stream is a blocking request
+        await self.run_blocking(commands_ref.listen, command_listener)
+        log.info("Listening for commands...")
+
+    def receive_command(self, command_id, command):
+        """Hand a pending command from the listener to the dispatcher"""
+        self.command_compactor.note_command(command_id, command)
+        self.dispatcher.submit(command_id, command)
+
+    async def compaction_loop(self):
+        """Periodically remove finished commands from the commands node"""
+        while self.running:
+            await asyncio.sleep(self.command_compact_interval)
+            if self.online:
+                removed = await self.run_blocking(self.command_compactor.compact, int(time.time() * 1000))
+                self.dispatcher.forget(removed)
+
+    async def execute_command(self, command_id, command):
+        """Execute a playback command (called from the command dispatcher)
+
+        Play commands run as their own task, which the dispatcher cancels when
+        a newer play or a stop arrives.
+        """
+        started_at = time.monotonic()
+        command_type = command.get('type')
+        outcome = 'executed'
+        issued_at = command.get('timestamp')
+        if isinstance(issued_at, (int, float)):
+            # Dashboard clock against ours; clamp small skews
+            self.m_listener_lag.observe(max(0, time.time() - issued_at / 1000))
 
-    def execute_command(self, command_id, command):
-        """Execute a playback command"""
-        command_ref = None
         try:
-            command_type = command.get('type')
             payload = command.get('payload', {})
 
-            print(f"[INFO] Executing command: {command_type}")
+            log.info("Executing command: %s", command_type)
 
             if command_type == 'play':
+                self.first_frame_started_at = started_at
+                # The command takes over from an automatic advance still loading
+                self.cancel_advance()
                 if 'scheduleId' in payload:
-                    self.load_and_play_schedule(payload['scheduleId'])
+                    await self.load_and_play_schedule(payload['scheduleId'])
                 elif 'contentId' in payload:
-                    self.play_single_content(payload['contentId'])
+                    await self.play_single_content(payload['contentId'])
 
             elif command_type == 'pause':
                 self.pause_playback()
 
             elif command_type == 'stop':
-                self.stop_playback()
+                await self.stop_playback()
 
             elif command_type == 'skip':
-                self.skip_content()
+                await self.skip_content()
 
             elif command_type == 'volume':
                 self.set_volume(payload.get('volume', 80))
 
             elif command_type == 'brightness':
-                self.set_brightness(payload.get('brightness', 100))
+                await self.set_brightness(payload.get('brightness', 100))
+
+            elif command_type == 'upload_logs':
+                await self.upload_logs(payload.get('limit'), payload.get('level'))
 
             elif command_type == 'restart':
-                self.restart_device()
+                # Acknowledge first; cleanup flushes the ack before the reboot
+                self.mark_command(command_id, 'executed', 'Restarting device')
+                await self.restart_device()
+                return
 
             # Mark command as executed
-            command_ref = self.db.reference(
-                f'users/{self.user_id}/displays/{self.display_id}/commands/{command_id}'
-            )
-            command_ref.update({
-                'status': 'executed',
-                'result': 'Command executed successfully'
-            })
-            print(f"[INFO] Command {command_type} executed successfully")
-
+            self.mark_command(command_id, 'executed', 'Command executed successfully')
+            log.info("Command %s executed successfully", command_type)
+
+        except asyncio.CancelledError:
+            log.info("Command %s was cancelled", command_type)
+            outcome = 'cancelled'
+            self.mark_command(command_id, 'failed', 'Cancelled by a newer command')
+            raise
         except Exception as e:
-            print(f"[ERROR] Failed to execute command: {e}")
-            import traceback
-            traceback.print_exc()
-            
+            log.exception("Failed to execute command: %s", e)
+            outcome = 'failed'
+
             # Mark command as failed
-            try:
-                if command_ref is None:
-                    command_ref = self.db.reference(
-                        f'users/{self.user_id}/displays/{self.display_id}/commands/{command_id}'
-                    )
-                command_ref.update({
-                    'status': 'failed',
-                    'result': str(e)
-                })
-            except Exception as update_error:
-                print(f"[ERROR] Failed to update command status: {update_error}")
-
-    def load_and_play_schedule(self, schedule_id):
+            self.mark_command(command_id, 'failed', str(e))
+        finally:
+            self.m_commands.inc(type=command_type, status=outcome)
+            self.m_command_seconds.observe(time.monotonic() - started_at, type=command_type)
+
+    async def upload_logs(self, limit=None, level=None):
+        """Write the in-memory log buffer to deviceLogs for the dashboard to read"""
+        if self.log_buffer is None:
+            raise RuntimeError("Log buffer is disabled (log_buffer_size is 0)")
+        records = self.log_buffer.snapshot(limit, level)
+        logs_ref = self.db.reference(f'users/{self.user_id}/displays/{self.display_id}/deviceLogs')
+        await self.run_blocking(logs_ref.set, {
+            'uploadedAt': int(time.time() * 1000),
+            'records': records,
+        })
+        log.info("Uploaded %s log records", len(records))
+
+    def mark_command(self, command_id, status, result):
+        """Record a command's outcome locally and queue its ack to Firebase"""
+        try:
+            self.local_store.finish_command(command_id, status, result)
+        except Exception as e:
+            log.error("Failed to record command outcome: %s", e)
+        self.command_acker.ack(command_id, status, result)
+        self.command_compactor.note_finished(command_id, status, result, int(time.time() * 1000))
+
+    def replay_command_ack(self, command_id):
+        """Re-send the outcome of a command handled before the player restarted"""
+        outcome = self.local_store.get_command_outcome(command_id)
+        if outcome is None or outcome[0] == 'accepted':
+            # The player stopped while it was running (e.g. a restart command)
+            self.mark_command(command_id, 'failed', 'Interrupted by a player restart')
+        else:
+            self.command_acker.ack(command_id, *outcome)
+
+    async def load_and_play_schedule(self, schedule_id):
         """Load schedule from Firestore and start playback"""
         try:
-            print(f"[INFO] Loading schedule: {schedule_id}")
+            log.info("Loading schedule: %s", schedule_id)
 
             # Fetch schedule from Firestore
             schedule_ref = self.firestore_db.collection('schedules').document(schedule_id)
-            schedule_doc = schedule_ref.get()
+            schedule_doc = await self.run_blocking(schedule_ref.get)
             
             if not schedule_doc.exists:
-                print(f"[ERROR] Schedule not found in Firestore: {schedule_id}")
+                log.error("Schedule not found in Firestore: %s", schedule_id)
                 self.update_status("error", f"Schedule not found: {schedule_id}")
                 return
             
             schedule_data = schedule_doc.to_dict()
-            print(f"[INFO] Found schedule: {schedule_data.get('name')}")
-            print(f"[DEBUG] Schedule data: {schedule_data}")
-            
-            # Get content IDs from schedule (the field is 'contentIds')
-            content_ids = schedule_data.get('contentIds', [])
-            if not content_ids or len(content_ids) == 0:
-                print(f"[WARN] Schedule has no content items")
-                print(f"[DEBUG] Available schedule fields: {list(schedule_data.keys())}")
-                self.update_status("error", "Schedule has no content")
-                return
-            
-            # Set the content queue
-            self.content_queue = content_ids
-            print(f"[INFO] Loaded {len(self.content_queue)} content items: {self.content_queue}")
-
-            # Set current schedule info
-            self.current_schedule = {
-                'id': schedule_id,
-                'name': schedule_data.get('name', f"Schedule {schedule_id}"),
-            }
-
-            # Start playing the first content
-            self.current_index = 0
-            print(f"[INFO] Starting playback from index {self.current_index}")
-            self.play_from_queue()
+            log.info("Found schedule: %s", schedule_data.get('name'))
+            await self.start_schedule(schedule_id, schedule_data)
 
+        except asyncio.CancelledError:
+            log.info("Loading schedule %s cancelled", schedule_id)
+            raise
         except Exception as e:
-            print(f"[ERROR] Failed to load schedule: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Failed to load schedule: %s", e)
             self.update_status("error", str(e))
 
-    def play_single_content(self, content_id):
-        """Play a single content item"""
+    async def start_schedule(self, schedule_id, schedule_data):
+        """Start playing a schedule document, fetched or stored locally"""
+        log.debug("Schedule data: %s", schedule_data)
+
+        # Get content IDs from schedule (the field is 'contentIds')
+        content_ids = schedule_data.get('contentIds', [])
+        if not content_ids or len(content_ids) == 0:
+            log.warning("Schedule has no content items")
+            log.debug("Available schedule fields: %s", list(schedule_data.keys()))
+            self.update_status("error", "Schedule has no content")
+            return
+
+        # Install the new queue before anything is awaited, so an item ending
+        # meanwhile cannot advance the old index through it
+        name = schedule_data.get('name', f"Schedule {schedule_id}")
+        self.content_queue = content_ids
+        self.current_index = 0
+        self.current_schedule = {'id': schedule_id, 'name': name}
+        log.info("Loaded %s content items: %s", len(self.content_queue), self.content_queue)
+
+        self.schedules_starting += 1
         try:
-            print(f"[INFO] Playing content: {content_id}")
-            
-            # Fetch content metadata from Firestore (content is stored at root level)
-            content_ref = self.firestore_db.collection('content').document(content_id)
-            content_doc = content_ref.get()
+            # Starting a schedule refreshes its metadata in one batch;
+            # later loops through the queue are served from the metadata cache
+            documents = await self.resolve_content_metadata(content_ids, refresh=True)
+            self.local_store.save_active_schedule(schedule_id, name, content_ids, documents)
+
+            # Follow live edits to the schedule and its content
+            if self.online:
+                await self.run_blocking(self.schedule_watcher.watch, schedule_id, content_ids, executor=self.listener_pool)
+
+            # Start playing the first content
+            log.info("Starting playback from index %s", self.current_index)
+            await self.play_from_queue()
+        finally:
+            self.schedules_starting -= 1
+
+    def set_display_schedules(self, schedules, save=True):
+        """Evaluate a new set of the display's schedules; True if one of them went on air"""
+        if self.schedule_engine is None:
+            return False
+        if save:
+            self.local_store.save_schedules(schedules)
+        self.schedule_engine.set_schedules(schedules)
+        self.prefetched_schedule_id = None
+        return self.evaluate_schedules()
+
+    def evaluate_schedules(self):
+        """Play the schedule that is on air now, and arm the timer for the next transition
+
+        Playback only changes when the on-air schedule does, so a play or
+        stop command holds until the next transition. Returns True if a
+        schedule is on air.
+        """
+        if self.schedule_timer is not None:
+            self.schedule_timer.cancel()
+            self.schedule_timer = None
+        if self.schedule_engine is None or not self.running:
+            return False
+
+        now = datetime.now()
+        active = self.schedule_engine.active_at(now)
+        next_at = self.schedule_engine.next_transition(now)
+        delay = min((next_at - now).total_seconds(), SCHEDULE_TIMER_MAX_SECONDS)
+        self.schedule_timer = self.loop.call_later(max(0, delay), self.evaluate_schedules)
+
+        # Download what comes on air next before it is needed
+        upcoming = self.schedule_engine.next_on_air(now)
+        if upcoming is not None and upcoming not in (active, self.prefetched_schedule_id):
+            self.prefetched_schedule_id = upcoming
+            self.spawn(self.prefetch_schedule(upcoming))
+
+        previous, self.timed_schedule_id = self.timed_schedule_id, active
+        if active == previous:
+            return active is not None
+
+        current_id = self.current_schedule.get('id') if self.current_schedule else None
+        if active is not None:
+            schedule_data = self.schedule_engine.schedules[active]
+            log.info("Schedule on air until %s: %s", next_at.strftime('%Y-%m-%d %H:%M'), schedule_data.get('name', active))
+            if active != current_id:
+                self.cancel_advance()
+                self.advance_task = self.spawn(self.start_schedule(active, schedule_data))
+            return True
+
+        if previous is not None and current_id == previous:
+            log.info("Schedule off air until %s: %s", next_at.strftime('%Y-%m-%d %H:%M'), current_id)
+            self.cancel_advance()
+            self.advance_task = self.spawn(self.stop_playback())
+        return False
+
+    async def prefetch_schedule(self, schedule_id):
+        """Download an upcoming schedule's content in the background"""
+        schedule_data = self.schedule_engine.schedules.get(schedule_id) or {}
+        content_ids = schedule_data.get('contentIds', [])
+        await self.resolve_content_metadata(content_ids)
+        for content_id in dict.fromkeys(content_ids):
+            if self._needs_fetch(content_id) and content_id not in self.downloads_in_flight:
+                self.spawn(self._prefetch_content(content_id, queued_only=False))
+
+    async def resume_from_manifest(self):
+        """Start the last active schedule from the local manifest, without needing the network"""
+        manifest = self.local_store.get_active_schedule()
+        if not manifest or not manifest['contentIds']:
+            return False
+
+        log.info("Resuming schedule from local manifest: %s", manifest['name'])
+
+        content_ids = manifest['contentIds']
+        stale_documents = {}
+        for content_id, item in manifest['content'].items():
+            if self.metadata_cache.get(content_id, allow_stale=True) is None:
+                stale_documents[content_id] = item['data']
+
+            # Re-register files the cache index lost track of; adding one hashes
+            # the whole file, so that runs off the loop
+            local_path = item.get('localPath')
+            if local_path and self.media_cache.lookup(content_id) is None and os.path.exists(local_path):
+                await self.run_blocking(self.media_cache.add, content_id, local_path, item['data'].get('url'),
+                                        None, content_ids, executor=self.download_pool)
+
+        # Manifest documents are a fallback only; they are refreshed once online
+        self.metadata_cache.put_many(stale_documents)
+        self.metadata_cache.invalidate(list(stale_documents))
+
+        self.content_queue = content_ids
+        self.current_schedule = {
+            'id': manifest['id'],
+            'name': manifest['name'] or f"Schedule {manifest['id']}",
+        }
+        self.current_index = 0
+
+        if self.online:
+            await self.run_blocking(self.schedule_watcher.watch, manifest['id'], content_ids, executor=self.listener_pool)
+        else:
+            # Offline, start with the first item that can actually be played
+            for index, content_id in enumerate(content_ids):
+                if self.media_cache.lookup(content_id) is not None:
+                    self.current_index = index
+                    break
+
+        await self.play_from_queue()
+        return True
+
+    async def apply_schedule_change(self, schedule_id, schedule_data):
+        """Apply a live edit of the active schedule without restarting playback"""
+        # Snapshots are applied one at a time, in the order they arrived
+        async with self.schedule_lock:
+            await self._apply_schedule_change(schedule_id, schedule_data)
+
+    async def _apply_schedule_change(self, schedule_id, schedule_data):
+        if not self.current_schedule or self.current_schedule.get('id') != schedule_id:
+            return
+
+        if schedule_data is None:
+            log.warning("Active schedule was deleted: %s", schedule_id)
+            await self.stop_playback()
+            return
+
+        content_ids = schedule_data.get('contentIds', [])
+        if not content_ids:
+            log.warning("Active schedule no longer has content, stopping playback")
+            await self.stop_playback()
+            return
+
+        name = schedule_data.get('name', f"Schedule {schedule_id}")
+        name_changed = name != self.current_schedule.get('name')
+        self.current_schedule['name'] = name
+
+        if content_ids == self.content_queue:
+            if name_changed:
+                self.update_status(self.current_status())
+            return
+
+        log.info("Schedule updated: %s content items: %s", len(content_ids), content_ids)
+
+        # Only documents not already in the metadata cache are read
+        documents = await self.resolve_content_metadata(content_ids)
+        if not self.current_schedule or self.current_schedule.get('id') != schedule_id:
+            # Stopped or replaced while the documents were read
+            return
+        self.local_store.save_active_schedule(schedule_id, name, content_ids, documents)
+
+        # Keep the current item playing; the queue continues from its new position.
+        # If it was removed, continue with whatever now follows its old slot.
+        current_id = self.current_content.get('id') if self.current_content else None
+        if current_id in content_ids:
+            new_index = content_ids.index(current_id)
+        else:
+            new_index = (min(self.current_index, len(content_ids)) - 1) % len(content_ids)
+
+        self.content_queue = content_ids
+        self.current_index = new_index
+        await self.run_blocking(self.schedule_watcher.watch_content, content_ids, executor=self.listener_pool)
+
+        self.prefetch_upcoming()
+        self.preload_next()
+        self.update_status(self.current_status())
+
+    def apply_content_change(self, updated, removed):
+        """Apply live edits of content documents to the metadata cache"""
+        self.metadata_cache.put_many(updated)
+        for content_id in removed:
+            log.warning("Content removed: %s", content_id)
+            self.metadata_cache.remove(content_id)
+
+        # Replaced media gets a new URL; refetch it before it comes up in the queue
+        for content_id, content_data in updated.items():
+            entry = self.media_cache.get_entry(content_id)
+            if entry and content_id in self.content_queue and entry.get('sourceUrl') != content_data.get('url'):
+                log.info("Content replaced, refetching in background: %s", content_id)
+                self.spawn(self._prefetch_content(content_id))
+
+    async def play_single_content(self, content_id):
+        """Play a single content item; returns False if it could not be started"""
+        try:
+            log.info("Playing content: %s", content_id)
             
-            if not content_doc.exists:
-                print(f"[ERROR] Content not found in Firestore: {content_id}")
-                print(f"[DEBUG] Checked path: content/{content_id}")
+            content_data = await self.get_content_metadata(content_id)
+            if content_data is None:
                 self.update_status("error", f"Content not found: {content_id}")
-                return
-            
-            content_data = content_doc.to_dict()
-            print(f"[INFO] Found content: {content_data.get('name')} ({content_data.get('type')})")
+                return False
+            log.info("Found content: %s (%s)", content_data.get('name'), content_data.get('type'))
             
             # Get storage path
             storage_path = content_data.get('url', '')
             if not storage_path:
-                print(f"[ERROR] No storage URL for content: {content_id}")
+                log.error("No storage URL for content: %s", content_id)
                 self.update_status("error", "Content has no storage URL")
-                return
-            
-            print(f"[DEBUG] Storage URL: {storage_path}")
-            
-            # Determine file extension from content type or URL
-            content_type = content_data.get('type', 'video')
-            file_extension = self._get_file_extension(storage_path, content_type)
-            
-            # Create local file path
-            local_filename = f"{content_id}{file_extension}"
-            local_path = os.path.join(CONTENT_DIR, local_filename)
+                return False
             
-            # Download if not already cached
-            if not os.path.exists(local_path):
-                print(f"[INFO] Downloading content from: {storage_path}")
-                if not self.download_content(storage_path, local_path):
-                    self.update_status("error", "Failed to download content")
-                    return
-            else:
-                print(f"[INFO] Using cached content: {local_path}")
+            # Use the cached file, join an in-flight prefetch, or download now
+            local_path = await self.fetch_content(content_id, content_data)
+            if local_path is None:
+                # The URL may have changed; re-read the document next time
+                self.metadata_cache.invalidate([content_id])
+                self.update_status("error", "Failed to download content")
+                return False
+            self.media_cache.touch(content_id)
+            self.local_store.set_content_path(content_id, local_path)
+            pages = []
+            if content_data.get('type') == 'image':
+                await self.prepare_frame(local_path)
+            elif content_data.get('type') == 'document':
+                pages = await self.prepare_document(local_path)
+            elif content_data.get('type', 'video') == 'video':
+                self.normalize_later(content_id, local_path)
+                local_path = self.playable_path(content_id, local_path)
             
             # Prepare content info
             content_info = {
                 'id': content_id,
                 'name': content_data.get('name', 'Unknown'),
-                'type': content_type,
+                'type': content_data.get('type', 'video'),
                 'url': storage_path,
             }
             
             # Play the file
-            self.play_file(local_path, content_info)
+            return self.play_file(local_path, content_info, pages)
             
+        except asyncio.CancelledError:
+            log.info("Playing content %s cancelled", content_id)
+            raise
         except Exception as e:
-            print(f"[ERROR] Failed to play content: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Failed to play content: %s", e)
             self.update_status("error", str(e))
+            return False
+
+    async def get_content_metadata(self, content_id):
+        """Return content metadata from the metadata cache or Firestore, or None if it does not exist"""
+        content_data = self.metadata_cache.get(content_id)
+        if content_data is not None:
+            return content_data
+
+        return (await self.resolve_content_metadata([content_id])).get(content_id)
+
+    async def resolve_content_metadata(self, content_ids, refresh=False):
+        """Resolve metadata for many content items with one batched Firestore read
+
+        Only IDs missing from the metadata cache (or all of them with
+        `refresh`) are fetched. If Firestore is unreachable, expired cache
+        entries are used instead.
+        """
+        to_fetch = list(dict.fromkeys(content_ids)) if refresh else self.metadata_cache.missing(content_ids)
+
+        if to_fetch and self.online:
+            try:
+                # Content is stored at root level
+                content_refs = [self.firestore_db.collection('content').document(content_id) for content_id in to_fetch]
+                # get_all streams lazily; read it to the end on the executor
+                content_docs = await self.run_blocking(lambda: list(self.firestore_db.get_all(content_refs)))
+                found = {}
+                for content_doc in content_docs:
+                    if content_doc.exists:
+                        found[content_doc.id] = content_doc.to_dict()
+                    else:
+                        log.error("Content not found in Firestore: %s", content_doc.id)
+                        log.debug("Checked path: content/%s", content_doc.id)
+                        self.metadata_cache.remove(content_doc.id)
+                self.metadata_cache.put_many(found)
+                log.info("Resolved metadata for %s/%s content items in one batch", len(found), len(to_fetch))
+            except Exception as e:
+                log.warning("Failed to fetch content metadata, using cached copies: %s", e)
+
+        resolved = {}
+        for content_id in content_ids:
+            content_data = self.metadata_cache.get(content_id, allow_stale=True)
+            if content_data is not None:
+                resolved[content_id] = content_data
+        return resolved
+
+    async def fetch_content(self, content_id, content_data):
+        """Return a local path for a content item, downloading it at most once
+
+        If the same item is already being downloaded (typically by the
+        prefetcher), wait for that download instead of starting a duplicate.
+        Cached items are revalidated against the server at most once every
+        `cache_revalidate_seconds`, and refetched if they changed.
+        """
+        checked_at = int(time.time() * 1000)
+        cached_path = self.media_cache.lookup(content_id)
+        if cached_path is not None and await self._is_cache_current(content_id, content_data):
+            log.info("Using cached content: %s", cached_path)
+            self.m_cache_requests.inc(result='hit')
+            return cached_path
+
+        task = self.downloads_in_flight.get(content_id)
+        is_owner = task is None
+        if is_owner:
+            # Another task may have refetched it while we were revalidating
+            entry = self.media_cache.get_entry(content_id)
+            if entry and entry.get('validatedAt', 0) >= checked_at:
+                self.m_cache_requests.inc(result='hit')
+                return entry['path']
+            task = self.spawn(self._run_download(content_id, content_data))
+            self.downloads_in_flight[content_id] = task
+
+        self.m_cache_requests.inc(result='miss' if is_owner else 'shared')
+        if not is_owner:
+            log.info("Waiting for in-flight download: %s", content_id)
+
+        # A cancelled play stops waiting while the file still finishes into the cache
+        return await asyncio.shield(task)
+
+    async def _run_download(self, content_id, content_data):
+        """Download task resolving to the local path (None on failure)"""
+        try:
+            return await self._download_to_cache(content_id, content_data)
+        except Exception as e:
+            log.error("Download failed for %s: %s", content_id, e)
+            return None
+        finally:
+            self.downloads_in_flight.pop(content_id, None)
+
+    def _needs_fetch(self, content_id):
+        """True if an item is missing from the cache or due for revalidation"""
+        if self.media_cache.lookup(content_id) is None:
+            return True
+        entry = self.media_cache.get_entry(content_id)
+        age_ms = int(time.time() * 1000) - entry.get('validatedAt', 0)
+        return age_ms >= self.cache_revalidate_seconds * 1000
+
+    async def _is_cache_current(self, content_id, content_data):
+        """Check a cached item against the server, trusting it while offline"""
+        entry = self.media_cache.get_entry(content_id)
+        storage_path = content_data.get('url', '')
+
+        # Replaced content usually gets a new download URL
+        if entry.get('sourceUrl') and entry['sourceUrl'] != storage_path:
+            log.info("Content source changed, refetching: %s", content_id)
+            return False
+
+        age_ms = int(time.time() * 1000) - entry.get('validatedAt', 0)
+        if age_ms < self.cache_revalidate_seconds * 1000 or not self.online:
+            return True
+
+        try:
+            if await self.run_blocking(self.downloader.revalidate, storage_path, entry.get('validators')):
+                self.media_cache.mark_validated(content_id)
+                return True
+            log.info("Cached content is stale, refetching: %s", content_id)
+            return False
+        except Exception as e:
+            log.warning("Could not revalidate %s, using cached copy: %s", content_id, e)
+            return True
+
+    async def _download_to_cache(self, content_id, content_data):
+        """Download a content item into the media cache and return its path"""
+        storage_path = content_data.get('url', '')
+        content_type = content_data.get('type', 'video')
+        file_extension = self._get_file_extension(storage_path, content_type)
+        local_path = os.path.join(CONTENT_DIR, f"{content_id}{file_extension}")
+
+        log.info("Downloading content from: %s", storage_path)
+        # A resumed schedule can get here before the Storage client exists
+        await self.firebase_ready
+        self.media_cache.reserve(content_data.get('sizeBytes') or 0, protected=self.content_queue)
+        downloaded = await self.run_blocking(self.download_content, storage_path, local_path, executor=self.download_pool)
+        if downloaded is None:
+            return None
+        validators, checksum = downloaded
+        self.media_cache.add(content_id, local_path, storage_path, validators, protected=self.content_queue,
+                             checksum=checksum)
+        if content_type == 'video':
+            self.normalize_later(content_id, local_path)
+        return local_path
+
+    def playable_path(self, content_id, path):
+        """The cached copy to play: the normalized one once it is ready, else `path`"""
+        if self.transcoder is None:
+            return path
+        return self.media_cache.lookup_variant(content_id, self.transcoder.profile_key) or path
+
+    def normalize_later(self, content_id, path):
+        """Start a background check and transcode of a cached video, unless it was already done"""
+        if (self.transcoder is None or content_id in self.transcodes_in_flight
+                or content_id in self.transcode_failed
+                or self.media_cache.has_variant(content_id, self.transcoder.profile_key)):
+            return
+        self.transcodes_in_flight[content_id] = self.spawn(self._normalize_content(content_id, path))
+
+    async def _normalize_content(self, content_id, path):
+        """Transcode task: probe a cached video and transcode it if it is outside the device profile"""
+        profile_key = self.transcoder.profile_key
+        entry = self.media_cache.get_entry(content_id)
+        checksum = entry.get('checksum') if entry else None
+        try:
+            info = await self.run_blocking(self.transcoder.probe, path, executor=self.transcode_pool)
+            reasons = self.transcoder.mismatches(info)
+            if not reasons:
+                self.media_cache.add_variant(content_id, profile_key, None, checksum)
+                self.m_transcodes.inc(result='fits')
+                return
+
+            log.info("Transcoding %s in the background: %s", content_id, ', '.join(reasons))
+            started_at = time.monotonic()
+            output_path = await self.run_blocking(
+                self.transcoder.transcode, path, content_id, info, executor=self.transcode_pool)
+            if self.media_cache.add_variant(content_id, profile_key, output_path, checksum, protected=self.content_queue):
+                self.m_transcodes.inc(result='transcoded')
+                self.m_transcode_seconds.observe(time.monotonic() - started_at)
+                log.info("Transcoded %s in %.1fs; it plays from the next showing", content_id, time.monotonic() - started_at)
+                self._preload_if_next(content_id)
+        except Exception as e:
+            if not self.running:
+                return
+            # Not retried until restart; the original keeps playing
+            self.transcode_failed.add(content_id)
+            self.m_transcodes.inc(result='failed')
+            log.warning("Could not normalize %s, playing it as uploaded: %s", content_id, e)
+        finally:
+            self.transcodes_in_flight.pop(content_id, None)
+
+    async def scrub_loop(self):
+        """Re-verify cached files against their download checksums while the player is otherwise idle
+
+        Each file is checked at most once per `cache_scrub_period_hours`. A
+        corrupt one is dropped from the cache and fetched again.
+        """
+        if self.scrub_interval <= 0:
+            return
+        while self.running:
+            await asyncio.sleep(self.scrub_interval)
+            if self.media_cache is None or self.downloads_in_flight or self.transcodes_in_flight:
+                continue
+            content_id = self.media_cache.next_to_verify(self.scrub_period)
+            if content_id is None:
+                continue
+            try:
+                verified = await self.run_blocking(self.media_cache.verify, content_id, self.scrub_bytes_per_second,
+                                                   self.scrub_cancelled, executor=self.scrub_pool)
+            except Exception as e:
+                log.warning("Could not verify cached content %s: %s", content_id, e)
+                continue
+            if verified is None:
+                continue
+            self.m_cache_scrubs.inc(result='ok' if verified else 'corrupt')
+            if verified:
+                log.debug("Verified cached content: %s", content_id)
+                continue
+
+            log.warning("Cached content is corrupt, refetching: %s", content_id)
+            self.media_cache.remove(content_id)
+            # Offline, it is downloaded again when it next comes up
+            if self.online and content_id not in self.downloads_in_flight:
+                self.spawn(self._prefetch_content(content_id, queued_only=False))
+
+    def prefetch_upcoming(self):
+        """Start background downloads for the next items in the queue"""
+        queue = list(self.content_queue)
+        if len(queue) < 2 or self.prefetch_count <= 0:
+            return
+
+        upcoming = []
+        for offset in range(1, min(self.prefetch_count, len(queue) - 1) + 1):
+            content_id = queue[(self.current_index + offset) % len(queue)]
+            if content_id not in upcoming:
+                upcoming.append(content_id)
+
+        for content_id in upcoming:
+            if not self._needs_fetch(content_id) or content_id in self.downloads_in_flight:
+                continue
+            self.spawn(self._prefetch_content(content_id))
+
+    async def _prefetch_content(self, content_id, queued_only=True):
+        """Prefetch task: resolve metadata and download one item"""
+        try:
+            async with self.prefetch_slots:
+                if queued_only and content_id not in self.content_queue:
+                    # Queue changed while this task was waiting for a slot
+                    return
+                content_data = await self.get_content_metadata(content_id)
+                if content_data and content_data.get('url'):
+                    log.info("Prefetching content: %s", content_id)
+                    local_path = await self.fetch_content(content_id, content_data)
+                    if local_path:
+                        if content_data.get('type') == 'image':
+                            await self.prepare_frame(local_path)
+                        elif content_data.get('type') == 'document':
+                            await self.prepare_document(local_path)
+                        self._preload_if_next(content_id)
+        except Exception as e:
+            log.error("Prefetch failed for %s: %s", content_id, e)
     
+    async def prepare_frame(self, path):
+        """Decode and scale an image to the display ahead of showing it"""
+        if self.frame_cache is None:
+            return
+        try:
+            await self.run_blocking(self.frame_cache.prepare, path, executor=self.render_pool)
+        except Exception as e:
+            log.warning("Could not pre-scale %s, showing the original: %s", path, e)
+
+    async def prepare_document(self, path):
+        """Rasterize a document's pages, and their frames, ahead of showing it
+
+        Returns the page images, or an empty list if the PDF has to be
+        handed to libvlc as it is.
+        """
+        if self.page_cache is None:
+            return []
+        try:
+            pages = await self.run_blocking(self.page_cache.render, path, executor=self.render_pool)
+        except Exception as e:
+            log.warning("Could not rasterize %s, handing it to libvlc: %s", path, e)
+            return []
+        for page in pages:
+            await self.prepare_frame(page)
+        return pages
+
     def _get_file_extension(self, storage_path, content_type):
         """Determine file extension from path or content type"""
         # Try to get extension from path, handling URLs with query parameters
@@ -491,233 +1607,324 @@ class PanelSenaPlayer:
         return type_extensions.get(content_type, '.mp4')
 
     def download_content(self, storage_path, local_path):
-        """Download content from Firebase Storage"""
+        """Download content from Firebase Storage, returning (validators, md5) or None on failure"""
+        from downloader import ChecksumError
         try:
-            print(f"[INFO] Downloading: {storage_path}")
-            
-            # Check if it's a full HTTPS URL or just a path
-            if storage_path.startswith('http://') or storage_path.startswith('https://'):
-                # It's a full URL, download directly with requests
-                print(f"[INFO] Downloading from URL...")
-                response = requests.get(storage_path, stream=True)
-                response.raise_for_status()
-                
-                with open(local_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-            else:
-                # It's a blob path, use Firebase Storage SDK
-                print(f"[INFO] Downloading from blob path...")
-                blob = self.storage_bucket.blob(storage_path)
-                blob.download_to_filename(local_path)
-            
-            print(f"[INFO] Downloaded to: {local_path}")
-            return True
+            log.info("Downloading: %s", storage_path)
+            started_at = time.monotonic()
+            validators, checksum = self.downloader.download(storage_path, local_path)
+            elapsed = time.monotonic() - started_at
+            size = os.path.getsize(local_path)
+            self.m_downloads.inc(status='ok')
+            self.m_download_bytes.inc(size)
+            self.m_download_seconds.observe(elapsed)
+            if elapsed > 0:
+                self.m_download_throughput.observe(size / elapsed)
+            log.info("Downloaded to: %s", local_path)
+            return validators, checksum
+        except ChecksumError as e:
+            # Not cached; the next prefetch or play downloads it again
+            self.m_downloads.inc(status='corrupt')
+            log.error("Downloaded content is corrupt, discarded: %s: %s", storage_path, e)
+            return None
         except Exception as e:
-            print(f"[ERROR] Failed to download content: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+            self.m_downloads.inc(status='failed')
+            log.exception("Failed to download content: %s", e)
+            return None
+
+    def play_file(self, file_path, content_info, pages=None):
+        """Play a media file on the persistent libvlc player
 
-    def play_file(self, file_path, content_info):
-        """Play a media file using VLC via subprocess"""
+        A document with rasterized `pages` is shown as a timed sequence of
+        those images instead of `file_path`.
+        """
         try:
+            if pages:
+                file_path = pages[0]
             if not os.path.exists(file_path):
-                print(f"[ERROR] File not found: {file_path}")
+                log.error("File not found: %s", file_path)
                 return False
 
-            print(f"[INFO] Playing: {file_path}")
-            print(f"[DEBUG] Absolute file path: {os.path.abspath(file_path)}")
-            print(f"[DEBUG] File size: {os.path.getsize(file_path)} bytes")
-            
-            # Verify the file is a valid video
-            try:
-                import mimetypes
-                mime_type, _ = mimetypes.guess_type(file_path)
-                print(f"[DEBUG] MIME type: {mime_type}")
-            except:
-                pass
+            log.info("Playing: %s", file_path)
+            log.debug("File size: %s bytes", os.path.getsize(file_path))
             
             # Update state first
             self.current_content = {
                 **content_info,
                 'startedAt': int(time.time() * 1000)
             }
+            if self.transition_started_at is None:
+                self.transition_started_at = time.monotonic()
 
-            # Stop any current playback
-            if hasattr(self, 'vlc_process') and self.vlc_process:
-                try:
-                    self.vlc_process.terminate()
-                    self.vlc_process.wait(timeout=2)
-                except:
-                    try:
-                        self.vlc_process.kill()
-                    except:
-                        pass
-                self.vlc_process = None
-
-            # Get absolute path
-            abs_file_path = os.path.abspath(file_path)
-            
-            # Launch VLC as subprocess with fullscreen
-            vlc_command = [
-                'vlc',
-                '--fullscreen',
-                '--no-video-title-show',
-                '--play-and-exit',
-                '--no-qt-privacy-ask',
-                '--no-qt-system-tray',
-                '--mouse-hide-timeout=0',
-                abs_file_path
-            ]
-            
-            print(f"[DEBUG] Launching VLC with command: {' '.join(vlc_command)}")
-            
-            # Start VLC process
-            self.vlc_process = subprocess.Popen(
-                vlc_command,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-            
-            # Wait a bit to check if it started
-            time.sleep(1)
-            
-            # Check if process is running
-            if self.vlc_process.poll() is not None:
-                print(f"[ERROR] VLC process exited immediately with code {self.vlc_process.returncode}")
+            self.document_pages = pages or []
+            self.document_page = 0
+            if pages:
+                played = self.playback.play(file_path, 'image', self.document_page_seconds)
+            else:
+                # Swap the media on the running player; no process restart needed
+                played = self.playback.play(file_path, content_info.get('type', 'video'))
+            if not played:
+                self.m_plays.inc(type=content_info.get('type'), status='failed')
+                log.error("VLC failed to start playback of %s", file_path)
                 self.update_status("error", "Failed to start VLC playback")
                 return False
             
-            print(f"[INFO] VLC process started successfully (PID: {self.vlc_process.pid})")
-            
             # Update state
             self.is_playing = True
             self.is_paused = False
+            self.m_plays.inc(type=content_info.get('type'), status='started')
 
             self.update_status("playing")
-            
-            # Monitor playback in a separate thread
-            self.monitor_playback()
+
+            # Get the next queue item ready while this one plays
+            self.preload_next()
 
             return True
 
         except Exception as e:
-            print(f"[ERROR] Failed to play file: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Failed to play file: %s", e)
             self.update_status("error", str(e))
             return False
 
-    def monitor_playback(self):
-        """Monitor playback and handle end of media"""
-        def check_playback():
-            while self.is_playing:
-                # Check if VLC process is still running
-                if hasattr(self, 'vlc_process') and self.vlc_process:
-                    returncode = self.vlc_process.poll()
-                    if returncode is not None:
-                        print(f"[INFO] VLC process ended with code {returncode}")
-                        self.handle_content_end()
-                        break
-                else:
-                    # Process not found, stop playback
-                    print("[INFO] VLC process not found")
-                    self.handle_content_end()
-                    break
-                time.sleep(1)
-
-        monitor_thread = threading.Thread(target=check_playback)
-        monitor_thread.daemon = True
-        monitor_thread.start()
-
-    def handle_content_end(self):
-        """Handle end of content playback"""
+    def preload_next(self):
+        """Preload the next page of a document, or the next queue item if it is cached"""
+        if self.document_page + 1 < len(self.document_pages):
+            self.playback.preload(self.document_pages[self.document_page + 1], 'image', self.document_page_seconds)
+            return
+        if len(self.content_queue) < 2:
+            return
+        next_id = self.content_queue[(self.current_index + 1) % len(self.content_queue)]
+        self._preload_if_next(next_id)
+
+    def _preload_if_next(self, content_id):
+        queue = self.content_queue
+        if len(queue) < 2 or queue[(self.current_index + 1) % len(queue)] != content_id:
+            return
+        if self.document_page + 1 < len(self.document_pages):
+            # The next page is preloaded first; the next item follows the last page
+            return
+        path = self.media_cache.lookup(content_id)
+        if path is None:
+            return
+        path = self.playable_path(content_id, path)
+        try:
+            mime_type = mimetypes.guess_type(path)[0] or ''
+            pages = self.page_cache.lookup(path) if self.page_cache and mime_type == 'application/pdf' else None
+            if pages:
+                self.playback.preload(pages[0], 'image', self.document_page_seconds)
+                return
+            content_type = 'image' if mime_type.startswith('image/') else 'video'
+            self.playback.preload(path, content_type)
+        except Exception as e:
+            log.warning("Failed to preload %s: %s", content_id, e)
+
+    def on_playback_event(self, kind, path, event_time):
+        """Drive transitions from a playback engine event ('playing', 'ended' or 'error')"""
+        # Ignore events from media that has since been replaced or stopped
+        if path is None or path != self.playback.current_path or not self.is_playing:
+            return
+
+        if kind == 'playing':
+            if self.startup_first_frame_ms is None:
+                self.startup_first_frame_ms = int((event_time - self.started_at) * 1000)
+                self.m_startup_first_frame.observe(event_time - self.started_at)
+                log.info("First frame %s ms after startup", self.startup_first_frame_ms)
+            if self.transition_started_at is not None:
+                self.last_transition_ms = int((event_time - self.transition_started_at) * 1000)
+                self.m_transition_seconds.observe(event_time - self.transition_started_at)
+                self.transition_started_at = None
+                log.info("Transition took %s ms", self.last_transition_ms)
+            if self.first_frame_started_at is not None:
+                self.m_first_frame.observe(event_time - self.first_frame_started_at)
+                self.first_frame_started_at = None
+        elif kind in ('ended', 'error'):
+            if kind == 'ended' and self.document_page + 1 < len(self.document_pages):
+                self.show_page(self.document_page + 1)
+                return
+            if kind == 'error':
+                log.error("VLC reported a playback error for %s", path)
+            else:
+                log.info("Playback ended: %s", path)
+            self.transition_started_at = event_time
+            self.handle_content_end(kind)
+
+    def show_page(self, index):
+        """Move the playing document on to another of its pages"""
+        self.document_page = index
+        log.info("Showing page %s/%s", index + 1, len(self.document_pages))
+        if not self.playback.play(self.document_pages[index], 'image', self.document_page_seconds):
+            log.error("Failed to show page %s of %s", index + 1, self.playback.current_path)
+            self.handle_content_end('error')
+            return
+        self.preload_next()
+
+    async def supervise_playback(self):
+        """Check the current item for stalls; events are handled by on_playback_event"""
+        log.info("Playback supervisor started")
+        while self.running:
+            await asyncio.sleep(1)
+            if self.is_playing and not self.is_paused and self.playback.is_stalled(self.stall_timeout):
+                log.error("Playback stalled for %ss: %s", self.stall_timeout, self.playback.current_path)
+                self.transition_started_at = time.monotonic()
+                self.handle_content_end('stalled')
+
+        log.info("Playback supervisor ended")
+
+    def handle_content_end(self, reason='ended'):
+        """Handle end of content playback ('ended', 'error' or 'stalled')"""
+        self.m_content_ends.inc(reason=reason)
+        if self.schedules_starting:
+            # start_schedule plays the new queue itself
+            log.info("Content finished while a schedule is starting")
+            return
         if self.content_queue and len(self.content_queue) > 0:
-            # We have a queue, play next item
-            self.skip_content()
+            # We have a queue, play next item in the background
+            self.cancel_advance()
+            self.advance_task = self.spawn(self.skip_content())
         else:
             # No queue, just stop and go to idle state
-            print("[INFO] Content finished, no queue. Going to idle state.")
+            log.info("Content finished, no queue. Going to idle state.")
             self.is_playing = False
             self.is_paused = False
             self.current_content = None
             self.update_status("online")
 
-    def play_from_queue(self):
-        """Play next content from queue"""
-        if self.current_index < len(self.content_queue):
+    def cancel_advance(self):
+        """Cancel an automatic move to the next item that is still loading"""
+        task = self.advance_task
+        self.advance_task = None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    async def play_from_queue(self, retry_delay=QUEUE_RETRY_MIN_SECONDS):
+        """Play the content at current_index, moving on past items that cannot be played
+
+        When nothing in the queue can be played (offline with none of it
+        cached, say), it is tried again after a growing delay.
+        """
+        failed = set()
+        while self.content_queue:
+            if self.current_index >= len(self.content_queue):
+                # Loop back to start
+                self.current_index = 0
             content_id = self.content_queue[self.current_index]
-            # Play the content
-            self.play_single_content(content_id)
-        else:
-            # Loop back to start
-            self.current_index = 0
-            if self.content_queue:
-                self.play_from_queue()
+            if self.online or self.media_cache.lookup(content_id) is not None:
+                # Download the next items while this one plays
+                self.prefetch_upcoming()
+                if await self.play_single_content(content_id):
+                    return
+
+            failed.add(content_id)
+            next_index = self.next_playable_index(failed)
+            if next_index is None:
+                log.warning("Nothing in the queue can be played, retrying in %ss", retry_delay)
+                self.current_index = (self.current_index + 1) % len(self.content_queue)
+                # A new play or a stop cancels the retry
+                self.cancel_advance()
+                self.advance_task = self.spawn(self.retry_queue(retry_delay))
+                return
+            log.info("Moving on to index %s", next_index)
+            self.current_index = next_index
+
+    def next_playable_index(self, failed):
+        """Index of the next queue item worth trying after current_index, or None
+
+        Offline, only cached items can play.
+        """
+        queue = self.content_queue
+        for offset in range(1, len(queue) + 1):
+            index = (self.current_index + offset) % len(queue)
+            content_id = queue[index]
+            if content_id not in failed and (self.online or self.media_cache.lookup(content_id) is not None):
+                return index
+        return None
+
+    async def retry_queue(self, delay):
+        """Try the queue again after `delay` seconds, backing off if it still cannot play"""
+        await asyncio.sleep(delay)
+        await self.play_from_queue(min(delay * 2, QUEUE_RETRY_MAX_SECONDS))
 
     def pause_playback(self):
-        """Pause playback - not supported in subprocess mode"""
+        """Toggle pause/resume of the current item"""
         try:
-            print(f"[DEBUG] pause_playback called. is_playing={self.is_playing}, is_paused={self.is_paused}")
-            print(f"[WARN] Pause/Resume not supported in subprocess VLC mode")
-            # Note: Pausing requires using VLC's RC interface or similar
-            # For simplicity, we'll just report the current state
+            log.debug("pause_playback called. is_playing=%s, is_paused=%s", self.is_playing, self.is_paused)
+            if not self.is_playing:
+                log.info("Nothing is playing, ignoring pause")
+                return
+
+            if self.is_paused:
+                self.playback.resume()
+                self.is_paused = False
+                self.update_status("playing")
+                log.info("Playback resumed")
+            else:
+                self.playback.pause()
+                self.is_paused = True
+                self.update_status("paused")
+                log.info("Playback paused")
         except Exception as e:
-            print(f"[ERROR] Failed to pause/resume: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Failed to pause/resume: %s", e)
 
-    def stop_playback(self):
-        """Stop playback"""
+    async def stop_playback(self, forget_schedule=True):
+        """Stop playback
+
+        With `forget_schedule` the stored manifest is cleared too, so the
+        schedule is not resumed at the next boot.
+        """
+        # Clear state first so the monitor does not treat the stop as end of media
+        self.is_playing = False
+        self.is_paused = False
+        self.transition_started_at = None
+        self.first_frame_started_at = None
+        self.cancel_advance()
         try:
-            # Terminate VLC process if running
-            if hasattr(self, 'vlc_process') and self.vlc_process:
-                try:
-                    self.vlc_process.terminate()
-                    self.vlc_process.wait(timeout=2)
-                except:
-                    try:
-                        self.vlc_process.kill()
-                    except:
-                        pass
-                self.vlc_process = None
+            if self.playback is not None:
+                self.playback.stop()
         except Exception as e:
-            print(f"[ERROR] Failed to stop playback: {e}")
+            log.error("Failed to stop playback: %s", e)
         
-        self.is_playing = False
-        self.is_paused = False
         self.current_content = None
         self.current_schedule = None
         self.content_queue = []
         self.current_index = 0
+        self.document_pages = []
+        if self.schedule_watcher is not None:
+            await self.run_blocking(self.schedule_watcher.stop, executor=self.listener_pool)
+        if forget_schedule:
+            self.local_store.clear_active_schedule()
         self.update_status("online")
-        print("[INFO] Playback stopped")
+        log.info("Playback stopped")
 
-    def skip_content(self):
+    async def skip_content(self):
         """Skip to next content"""
         if self.content_queue and len(self.content_queue) > 0:
             self.current_index += 1
             if self.current_index >= len(self.content_queue):
                 self.current_index = 0
-            self.play_from_queue()
-            print(f"[INFO] Skipped to index {self.current_index}")
+            log.info("Skipping to index %s", self.current_index)
+            await self.play_from_queue()
         else:
-            print("[INFO] No content queue, stopping playback")
-            self.stop_playback()
+            log.info("No content queue, stopping playback")
+            await self.stop_playback()
 
     def set_volume(self, volume):
         """Set playback volume"""
         self.volume = max(0, min(100, volume))
-        self.player.audio_set_volume(self.volume)
+        self.playback.set_volume(self.volume)
         self.update_status()
-        print(f"[INFO] Volume set to {self.volume}%")
+        log.info("Volume set to %s%%", self.volume)
 
-    def set_brightness(self, brightness):
+    async def set_brightness(self, brightness):
         """Set display brightness"""
+        self.brightness = max(0, min(100, brightness))
+        # sysfs writes and the display tools can take seconds
+        await self.run_blocking(self.apply_brightness, self.brightness)
+        # Update status regardless of hardware control success
+        self.update_status()
+
+    def apply_brightness(self, brightness):
+        """Set the display hardware's brightness (0-100), as far as it allows"""
         try:
-            self.brightness = max(0, min(100, brightness))
-            
             # Convert 0-100 to actual brightness value
             # For Raspberry Pi official display, brightness is controlled via /sys/class/backlight
             brightness_path = "/sys/class/backlight/rpi_backlight/brightness"
@@ -731,18 +1938,18 @@ class PanelSenaPlayer:
                         max_brightness = int(f.read().strip())
                     
                     # Calculate actual brightness value
-                    actual_brightness = int((self.brightness / 100.0) * max_brightness)
+                    actual_brightness = int((brightness / 100.0) * max_brightness)
                     
                     # Write brightness value
                     with open(brightness_path, 'w') as f:
                         f.write(str(actual_brightness))
                     
-                    print(f"[INFO] Display brightness set to {self.brightness}% (value: {actual_brightness}/{max_brightness})")
+                    log.info("Display brightness set to %s%% (value: %s/%s)", brightness, actual_brightness, max_brightness)
                 except PermissionError:
-                    print(f"[WARN] Permission denied to set brightness. Run with sudo or add user to video group.")
-                    print(f"[WARN] To fix: sudo usermod -a -G video $USER")
+                    log.warning("Permission denied to set brightness. Run with sudo or add user to video group.")
+                    log.warning("To fix: sudo usermod -a -G video $USER")
                 except Exception as e:
-                    print(f"[ERROR] Failed to set hardware brightness: {e}")
+                    log.error("Failed to set hardware brightness: %s", e)
             else:
                 # Try alternative methods for different displays
                 # Method 1: vcgencmd (for official Raspberry Pi display)
@@ -754,74 +1961,122 @@ class PanelSenaPlayer:
                         timeout=5
                     )
                     if result.returncode == 0:
-                        print(f"[INFO] Display power on, brightness setting may require additional hardware support")
+                        log.info("Display power on, brightness setting may require additional hardware support")
                 except Exception as e:
-                    print(f"[DEBUG] vcgencmd not available: {e}")
+                    log.debug("vcgencmd not available: %s", e)
                 
                 # Method 2: ddcutil (for external displays with DDC/CI support)
                 try:
                     result = subprocess.run(
-                        ['ddcutil', 'setvcp', '10', str(self.brightness)],
+                        ['ddcutil', 'setvcp', '10', str(brightness)],
                         capture_output=True,
                         text=True,
                         timeout=10
                     )
                     if result.returncode == 0:
-                        print(f"[INFO] Display brightness set to {self.brightness}% via DDC/CI")
+                        log.info("Display brightness set to %s%% via DDC/CI", brightness)
                     else:
-                        print(f"[WARN] ddcutil failed: {result.stderr}")
+                        log.warning("ddcutil failed: %s", result.stderr)
                 except FileNotFoundError:
-                    print(f"[INFO] Brightness set to {self.brightness}% (hardware control not available)")
+                    log.info("Brightness set to %s%% (hardware control not available)", brightness)
                 except Exception as e:
-                    print(f"[DEBUG] ddcutil not available: {e}")
-            
-            # Update status regardless of hardware control success
-            self.update_status()
-            
+                    log.debug("ddcutil not available: %s", e)
+
         except Exception as e:
-            print(f"[ERROR] Failed to set brightness: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Failed to set brightness: %s", e)
 
-    def restart_device(self):
+    async def restart_device(self):
         """Restart the Raspberry Pi"""
-        print("[INFO] Restarting device...")
-        self.cleanup()
+        log.info("Restarting device...")
+        await self.cleanup()
         os.system('sudo reboot')
 
-    def cleanup(self):
+    async def cleanup(self):
         """Cleanup before shutdown"""
-        print("[INFO] Cleaning up...")
+        if self.cleaned_up:
+            return
+        self.cleaned_up = True
+        log.info("Cleaning up...")
         self.running = False
-        self.stop_playback()
+        await self.dispatcher.stop()
+        # Heartbeat, supervisor, downloads and the rest; the status writer finishes below
+        current = asyncio.current_task()
+        for task in list(self.tasks):
+            if task is not current and task is not self.status_task:
+                task.cancel()
+        await self.command_acker.flush()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.firebase_ready is not None:
+            self.firebase_ready.cancel()
+        if self.transcoder is not None:
+            self.transcoder.stop()
+        if self.schedule_timer is not None:
+            self.schedule_timer.cancel()
+        self.scrub_cancelled.set()
+        if self.schedule_watcher is not None:
+            await self.run_blocking(self.schedule_watcher.stop_display, executor=self.listener_pool)
+        # Keep the manifest so the schedule resumes after a reboot
+        await self.stop_playback(forget_schedule=False)
+        if self.playback is not None:
+            self.playback.release()
         self.update_status("offline")
+        if self.status_task is not None:
+            await self.status_task
+        for pool in (self.download_pool, self.sdk_pool, self.listener_pool, self.transcode_pool, self.scrub_pool,
+                     self.render_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.local_store.close()
 
     def run(self):
         """Main run loop"""
         try:
-            # Initialize status
-            self.update_status("online")
-
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            log.info("Shutting down...")
+
+    async def serve(self):
+        """Run the player's tasks on the current event loop until it stops"""
+        self.loop = asyncio.get_running_loop()
+        self.schedule_lock = asyncio.Lock()
+        self.prefetch_slots = asyncio.Semaphore(self.prefetch_workers)
+        self.heartbeat_wake = asyncio.Event()
+        try:
             # Start heartbeat
-            self.heartbeat_thread.start()
+            self.spawn(self.heartbeat_loop())
+
+            # Start playback supervisor
+            self.spawn(self.supervise_playback())
+
+            # Start command workers
+            self.dispatcher.start()
+            self.spawn(self.compaction_loop())
 
-            # Listen for commands
-            self.listen_for_commands()
+            # Background re-verification of cached files
+            self.spawn(self.scrub_loop())
+
+            # Local scrape endpoint
+            self.start_metrics_server()
+
+            # Firebase, libvlc and the caches. Playback may start before the
+            # device is authenticated; going online publishes the first status.
+            await self.start_up()
 
             # Keep running
-            print("[INFO] Player is running. Press Ctrl+C to exit.")
+            log.info("Player is running. Press Ctrl+C to exit.")
             while self.running:
-                time.sleep(1)
+                await asyncio.sleep(1)
 
-        except KeyboardInterrupt:
-            print("\n[INFO] Shutting down...")
         except Exception as e:
-            print(f"[ERROR] Unexpected error: {e}")
+            log.error("Unexpected error: %s", e)
         finally:
-            self.cleanup()
+            # Also runs when Ctrl+C cancels this task
+            await self.cleanup()
 
 def main():
     """Main entry point"""
+    # Defaults until the config is loaded
+    setup_logging()
     print("=" * 50)
     print("PanelSena Raspberry Pi Player")
     print("=" * 50)
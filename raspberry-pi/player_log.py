@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+PanelSena Player Logging
+Console output plus an in-memory ring buffer of recent records that can be uploaded on demand
+"""
+
+import collections
+import logging
+import sys
+import threading
+import time
+
+DEFAULT_LOG_LEVEL = "INFO"
+DEFAULT_LOG_BUFFER_LEVEL = "INFO"
+DEFAULT_LOG_BUFFER_SIZE = 1000
+
+# A traceback from the same place is printed at most once per window
+TRACE_REPEAT_WINDOW_SECONDS = 60
+
+# Keep the tags the player has always printed
+logging.addLevelName(logging.WARNING, 'WARN')
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the most recent records in memory as plain dicts"""
+
+    def __init__(self, capacity, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = collections.deque(maxlen=capacity)
+        self.trace_formatter = logging.Formatter()
+
+    def emit(self, record):
+        try:
+            exc = record.exc_text
+            if exc is None and record.exc_info:
+                exc = self.trace_formatter.formatException(record.exc_info)
+            self.records.append({
+                't': int(record.created * 1000),
+                'level': record.levelname,
+                'logger': record.name,
+                'msg': record.getMessage(),
+                'exc': exc,
+            })
+        except Exception:
+            self.handleError(record)
+
+    def snapshot(self, limit=None, level=None):
+        """Buffered records, oldest first, optionally the last `limit` at or above `level`"""
+        with self.lock:
+            records = list(self.records)
+        if level is not None:
+            levelno = logging.getLevelName(str(level).upper())
+            if isinstance(levelno, int):
+                records = [r for r in records if logging.getLevelName(r['level']) >= levelno]
+        if limit:
+            records = records[-int(limit):]
+        return records
+
+
+class TraceRateLimiter(logging.Filter):
+    """Drops the traceback of records that repeat one already printed within the window
+
+    Repeats are keyed on call site and exception type. The message itself is
+    kept; the next traceback that gets through reports how many were dropped.
+    """
+
+    def __init__(self, window_seconds=TRACE_REPEAT_WINDOW_SECONDS):
+        super().__init__()
+        self.window = window_seconds
+        self.last_printed = {}  # key -> time the traceback was last let through
+        self.suppressed = {}    # key -> tracebacks dropped since then
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        # Shared by every handler; only the first one to see a record decides
+        if not record.exc_info or getattr(record, 'trace_checked', False):
+            return True
+        record.trace_checked = True
+        key = (record.pathname, record.lineno, record.exc_info[0])
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_printed.get(key, float('-inf')) < self.window:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                record.exc_info = None
+                record.exc_text = None
+                return True
+            self.last_printed[key] = now
+            dropped = self.suppressed.pop(key, 0)
+        if dropped:
+            record.msg = f"{record.msg} ({dropped} similar traceback(s) suppressed)"
+        return True
+
+
+_installed = []
+
+
+def setup_logging(level=DEFAULT_LOG_LEVEL, buffer_level=DEFAULT_LOG_BUFFER_LEVEL,
+                  buffer_size=DEFAULT_LOG_BUFFER_SIZE):
+    """Configure the root logger; returns the ring buffer handler, or None if disabled
+
+    The root level is the lowest of the two handler levels, so calls below both
+    are rejected before their message is formatted. Safe to call again to
+    reconfigure.
+    """
+    root = logging.getLogger()
+    for handler in _installed:
+        root.removeHandler(handler)
+    _installed.clear()
+
+    rate_limiter = TraceRateLimiter()
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(str(level).upper())
+    console.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+    console.addFilter(rate_limiter)
+    _installed.append(console)
+
+    buffer = None
+    if buffer_size and buffer_size > 0:
+        buffer = RingBufferHandler(int(buffer_size), str(buffer_level).upper())
+        buffer.addFilter(rate_limiter)
+        _installed.append(buffer)
+
+    for handler in _installed:
+        root.addHandler(handler)
+    root.setLevel(min(handler.level for handler in _installed))
+    return buffer
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+PanelSena Schedule Engine
+Works out from the display's schedules which one should be playing, and when that next changes
+"""
+
+import bisect
+import logging
+from datetime import datetime, date, time, timedelta
+
+log = logging.getLogger(__name__)
+
+DEFAULT_HORIZON_HOURS = 24
+REPEATS = ('once', 'daily', 'weekly', 'monthly')
+
+
+def parse_date(value):
+    """'YYYY-MM-DD' (or an ISO timestamp) to a date, or None"""
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def parse_time(value):
+    """'HH:MM' or 'HH:MM:SS' to a time, or None"""
+    try:
+        return time.fromisoformat(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+def schedule_windows(schedule, start, end):
+    """Yield the (window_start, window_end) times a schedule is on air that overlap [start, end)
+
+    Times are naive local datetimes, like the dashboard's date and time
+    fields. A 'once' schedule runs from startDate startTime to endDate
+    endTime, running past midnight if that end is not after the start. A
+    repeating one runs from startTime to endTime on each matching
+    day between startDate and endDate: every day, the weekday of startDate,
+    or its day of the month. An endTime at or before startTime runs past
+    midnight, and a missing one means the end of the day. Schedules that are
+    not 'active', or have no startDate, are never on air.
+    """
+    if schedule.get('status', 'active') != 'active':
+        return
+    first_day = parse_date(schedule.get('startDate'))
+    if first_day is None:
+        return
+    last_day = parse_date(schedule.get('endDate'))
+    start_time = parse_time(schedule.get('startTime')) or time(0)
+    end_time = parse_time(schedule.get('endTime'))
+    repeat = schedule.get('repeat') or 'once'
+    if repeat not in REPEATS:
+        log.warning("Unknown repeat %r for schedule %s, treating it as 'once'", repeat, schedule.get('name'))
+        repeat = 'once'
+
+    if repeat == 'once':
+        window_start = datetime.combine(first_day, start_time)
+        if last_day is None:
+            window_end = datetime.max
+        elif end_time is None:
+            window_end = datetime.combine(last_day + timedelta(days=1), time(0))
+        else:
+            window_end = datetime.combine(last_day, end_time)
+            if window_end <= window_start:
+                # A single night, such as 22:00 to 02:00 on the same date
+                window_end += timedelta(days=1)
+        if window_start < end and window_end > start:
+            yield window_start, window_end
+        return
+
+    # A window that started the day before can still be running
+    day = max(first_day, start.date() - timedelta(days=1))
+    while day <= end.date() and (last_day is None or day <= last_day):
+        if (repeat == 'daily'
+                or (repeat == 'weekly' and day.weekday() == first_day.weekday())
+                or (repeat == 'monthly' and day.day == first_day.day)):
+            window_start = datetime.combine(day, start_time)
+            if end_time is not None and end_time > start_time:
+                window_end = datetime.combine(day, end_time)
+            else:
+                window_end = datetime.combine(day + timedelta(days=1), end_time or time(0))
+            if window_start < end and window_end > start:
+                yield window_start, window_end
+        day += timedelta(days=1)
+
+
+class ScheduleEngine:
+    """A precomputed timeline of which schedule is on air, for the next `horizon_hours`
+
+    The timeline is a list of contiguous (start, end, schedule_id) segments,
+    with None for idle stretches. It is built with a sweep over the sorted
+    window boundaries, and looked up by bisecting the segment starts. When
+    windows overlap, the one that started last wins, so a short daypart
+    overrides a day-long schedule; ties go to the most recently updated
+    schedule.
+    """
+
+    def __init__(self, horizon_hours=DEFAULT_HORIZON_HOURS):
+        self.horizon = timedelta(hours=horizon_hours)
+        self.schedules = {}
+        self.timeline = []
+        self.starts = []
+
+    def set_schedules(self, schedules):
+        """Replace the display's schedules ({schedule_id: data}); the timeline is rebuilt on next use"""
+        self.schedules = dict(schedules)
+        self.timeline = []
+        self.starts = []
+
+    def build(self, now):
+        """Precompute the timeline from `now` to the end of the horizon"""
+        end = now + self.horizon
+        # Boundary events: (time, 0 for an end or 1 for a start, window); ends sort first
+        events = []
+        for schedule_id, schedule in self.schedules.items():
+            rank = (str(schedule.get('updatedAt') or ''), schedule_id)
+            for window_start, window_end in schedule_windows(schedule, now, end):
+                # Sorting windows picks the winner: latest start, then latest update
+                window = (window_start, rank, schedule_id)
+                events.append((max(window_start, now), 1, window))
+                events.append((min(window_end, end), 0, window))
+        events.sort(key=lambda event: (event[0], event[1]))
+
+        timeline = []
+        active = set()
+        cursor = now
+        for at, is_start, window in events:
+            if at > cursor:
+                self._append(timeline, cursor, at, max(active)[2] if active else None)
+                cursor = at
+            if is_start:
+                active.add(window)
+            else:
+                active.discard(window)
+        if cursor < end:
+            self._append(timeline, cursor, end, max(active)[2] if active else None)
+
+        self.timeline = timeline
+        self.starts = [segment[0] for segment in timeline]
+        log.info("Schedule timeline until %s: %s", end.strftime('%Y-%m-%d %H:%M'), self.describe() or "nothing scheduled")
+        return timeline
+
+    @staticmethod
+    def _append(timeline, start, end, schedule_id):
+        if timeline and timeline[-1][2] == schedule_id:
+            timeline[-1] = (timeline[-1][0], end, schedule_id)
+        else:
+            timeline.append((start, end, schedule_id))
+
+    def _segment(self, now):
+        if not self.timeline or now < self.starts[0] or now >= self.timeline[-1][1]:
+            self.build(now)
+        return self.timeline[bisect.bisect_right(self.starts, now) - 1]
+
+    def active_at(self, now):
+        """The schedule that should be playing at `now`, or None"""
+        return self._segment(now)[2]
+
+    def next_transition(self, now):
+        """When the active schedule next changes (at the latest, the end of the horizon)"""
+        return self._segment(now)[1]
+
+    def next_on_air(self, now):
+        """The next schedule to come on air after the current segment, within the horizon, or None"""
+        segment = self._segment(now)
+        for _, _, schedule_id in self.timeline[self.timeline.index(segment) + 1:]:
+            if schedule_id is not None:
+                return schedule_id
+        return None
+
+    def describe(self):
+        """The timeline's on-air segments as 'HH:MM-HH:MM name' strings"""
+        return ', '.join(
+            f"{start.strftime('%H:%M')}-{end.strftime('%H:%M')} {self.schedules[schedule_id].get('name', schedule_id)}"
+            for start, end, schedule_id in self.timeline if schedule_id is not None
+        )
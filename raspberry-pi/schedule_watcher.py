@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+PanelSena Schedule Watcher
+Firestore snapshot listeners for the active schedule and the content it references
+"""
+
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# Firestore limits the number of values in an 'in' filter
+CONTENT_WATCH_CHUNK = 10
+
+# The document ID field path, what firestore.FieldPath.document_id() returns;
+# spelled out so the watcher also runs against the fake backend without the SDK
+DOCUMENT_ID_FIELD = '__name__'
+
+
+class ScheduleWatcher:
+    def __init__(self, firestore_db, on_schedule_change, on_content_change, on_display_schedules=None):
+        self.firestore_db = firestore_db
+
+        # on_schedule_change(schedule_id, schedule_data or None if deleted)
+        self.on_schedule_change = on_schedule_change
+        # on_content_change(updated {content_id: data}, removed [content_id])
+        self.on_content_change = on_content_change
+        # on_display_schedules({schedule_id: data}) with every schedule assigned to the display
+        self.on_display_schedules = on_display_schedules
+
+        self.schedule_id = None
+        self.schedule_watch = None
+        self.content_ids = []
+        self.content_watches = []
+        # Outlives stop(): the display's schedules are followed whatever is playing
+        self.display_watch = None
+        self.lock = threading.Lock()
+
+    def watch(self, schedule_id, content_ids):
+        """Follow a schedule document and its content documents, replacing any previous watch"""
+        self.stop()
+        with self.lock:
+            self.schedule_id = schedule_id
+            schedule_ref = self.firestore_db.collection('schedules').document(schedule_id)
+            self.schedule_watch = schedule_ref.on_snapshot(self._on_schedule_snapshot)
+        self.watch_content(content_ids)
+        log.info("Watching schedule %s and %s content items for changes", schedule_id, len(content_ids))
+
+    def watch_content(self, content_ids):
+        """Re-target the content listeners at a new set of content IDs"""
+        content_ids = sorted(set(content_ids))
+        with self.lock:
+            if content_ids == self.content_ids:
+                return
+            self._unsubscribe_content()
+            self.content_ids = content_ids
+
+            # One query listener per chunk of IDs rather than one per document
+            collection = self.firestore_db.collection('content')
+            for start in range(0, len(content_ids), CONTENT_WATCH_CHUNK):
+                refs = [collection.document(content_id) for content_id in content_ids[start:start + CONTENT_WATCH_CHUNK]]
+                query = collection.where(DOCUMENT_ID_FIELD, 'in', refs)
+                self.content_watches.append(query.on_snapshot(self._on_content_snapshot))
+
+    def watch_display(self, user_id, display_id):
+        """Follow every schedule assigned to a display, replacing any previous display watch"""
+        self.stop_display()
+        with self.lock:
+            query = (self.firestore_db.collection('schedules')
+                     .where('userId', '==', user_id)
+                     .where('displayIds', 'array_contains', display_id))
+            self.display_watch = query.on_snapshot(self._on_display_snapshot)
+        log.info("Watching schedules assigned to display %s", display_id)
+
+    def stop_display(self):
+        with self.lock:
+            if self.display_watch is not None:
+                self.display_watch.unsubscribe()
+                self.display_watch = None
+
+    def stop(self):
+        with self.lock:
+            if self.schedule_watch is not None:
+                self.schedule_watch.unsubscribe()
+                self.schedule_watch = None
+            self._unsubscribe_content()
+            self.content_ids = []
+            self.schedule_id = None
+
+    def _unsubscribe_content(self):
+        for watch in self.content_watches:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                log.warning("Failed to stop content listener: %s", e)
+        self.content_watches = []
+
+    def _on_schedule_snapshot(self, doc_snapshots, changes, read_time):
+        try:
+            for doc in doc_snapshots:
+                if doc.id != self.schedule_id:
+                    continue
+                self.on_schedule_change(doc.id, doc.to_dict() if doc.exists else None)
+        except Exception as e:
+            log.exception("Failed to apply schedule change: %s", e)
+
+    def _on_content_snapshot(self, doc_snapshots, changes, read_time):
+        try:
+            updated = {}
+            removed = []
+            for change in changes:
+                doc = change.document
+                if change.type.name == 'REMOVED' or not doc.exists:
+                    removed.append(doc.id)
+                else:
+                    updated[doc.id] = doc.to_dict()
+            if updated or removed:
+                self.on_content_change(updated, removed)
+        except Exception as e:
+            log.exception("Failed to apply content change: %s", e)
+
+    def _on_display_snapshot(self, doc_snapshots, changes, read_time):
+        try:
+            if self.on_display_schedules is not None:
+                self.on_display_schedules({doc.id: doc.to_dict() for doc in doc_snapshots if doc.exists})
+        except Exception as e:
+            log.exception("Failed to apply display schedules: %s", e)
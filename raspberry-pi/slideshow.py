@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+PanelSena Slideshow
+Images decoded and scaled to the display ahead of time, shown by a native fullscreen renderer
+"""
+
+import importlib.util
+import logging
+import os
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+FRAME_DIR = "frames"
+DEFAULT_FRAME_SIZE = (1920, 1080)
+DEFAULT_FRAME_CACHE_MAX_MB = 512
+DEFAULT_CROSSFADE_SECONDS = 0
+CROSSFADE_FPS = 30
+# How often an idle renderer services window events
+EVENT_PUMP_SECONDS = 0.5
+
+
+class FrameCache:
+    """Display-sized frames rendered from image content, bounded on disk
+
+    Frames are uncompressed BMPs letterboxed onto the full display size, so
+    showing one needs no decoding or scaling. A frame is current while it
+    is newer than its source file; the least recently used are evicted.
+    Needs Pillow.
+    """
+
+    def __init__(self, frame_dir, size=DEFAULT_FRAME_SIZE, max_bytes=DEFAULT_FRAME_CACHE_MAX_MB * 1024 * 1024):
+        self.frame_dir = frame_dir
+        self.size = tuple(size)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(frame_dir, exist_ok=True)
+
+    @staticmethod
+    def available():
+        return importlib.util.find_spec('PIL') is not None
+
+    def frame_path(self, path):
+        width, height = self.size
+        # Document pages share file names, so their directory is part of the name
+        parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        return os.path.join(self.frame_dir, f"{parent}_{os.path.basename(path)}.{width}x{height}.bmp")
+
+    def lookup(self, path):
+        """Return the frame for an image if it is ready, or None"""
+        frame_path = self.frame_path(path)
+        try:
+            if os.path.getmtime(frame_path) < os.path.getmtime(path):
+                return None
+            # The frame's access time orders eviction
+            os.utime(frame_path, (time.time(), os.path.getmtime(frame_path)))
+            return frame_path
+        except OSError:
+            return None
+
+    def prepare(self, path):
+        """Render the frame for an image unless it is already current; returns its path
+
+        Not safe to call concurrently; the player renders every frame on its
+        single render thread.
+        """
+        frame_path = self.lookup(path)
+        if frame_path is not None:
+            return frame_path
+        return self._render(path)
+
+    def _render(self, path):
+        from PIL import Image, ImageOps
+
+        frame_path = self.frame_path(path)
+        started_at = time.monotonic()
+        with Image.open(path) as image:
+            # Lets the JPEG decoder scale down by up to 8x while decoding
+            image.draft('RGB', self.size)
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail(self.size, Image.LANCZOS)
+            frame = Image.new('RGB', self.size)
+            frame.paste(image, ((self.size[0] - image.width) // 2, (self.size[1] - image.height) // 2))
+
+        tmp_path = frame_path + '.tmp'
+        frame.save(tmp_path, 'BMP')
+        os.replace(tmp_path, frame_path)
+        log.info("Rendered %s frame in %.0f ms: %s", 'x'.join(map(str, self.size)),
+                 (time.monotonic() - started_at) * 1000, path)
+        self.evict(keep=frame_path)
+        return frame_path
+
+    def evict(self, keep=None):
+        """Delete the least recently shown frames until the cache fits its quota"""
+        with self.lock:
+            frames = []
+            for name in os.listdir(self.frame_dir):
+                path = os.path.join(self.frame_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                frames.append((stat.st_atime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in frames)
+            for _, size, path in sorted(frames):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError as e:
+                    log.warning("Failed to remove frame %s: %s", path, e)
+
+
+class Slideshow:
+    """Fullscreen pygame window showing prepared frames for a fixed time
+
+    The window belongs to a thread of its own, driven through a command
+    queue. Events are reported like the playback engine's, as
+    on_event(kind, path) with kind 'playing', 'ended' or 'error'.
+    """
+
+    def __init__(self, pygame_module, crossfade_seconds=DEFAULT_CROSSFADE_SECONDS, on_event=None):
+        self.pygame = pygame_module
+        self.crossfade_seconds = crossfade_seconds
+        self.on_event = on_event
+        self.commands = queue.Queue()
+
+        # Renderer thread state
+        self.screen = None
+        self.shown = None  # (surface, offset) on screen
+        self.ready = {}  # frame path -> loaded surface, for the next slide only
+        self.path = None
+        self.deadline = None
+        self.remaining = None
+
+        # The display size is known once the renderer has initialized the display
+        self.size = None
+        started = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(started,), name="slideshow", daemon=True)
+        self.thread.start()
+        started.wait()
+        if self.size is None:
+            raise RuntimeError("No display available for the slideshow")
+
+    def show(self, frame_path, path, duration):
+        """Show a frame for `duration` seconds, reporting events for `path`"""
+        self.commands.put(('show', frame_path, path, duration))
+
+    def preload(self, frame_path):
+        """Load the next slide's frame while the current one is shown"""
+        self.commands.put(('preload', frame_path))
+
+    def pause(self):
+        self.commands.put(('pause',))
+
+    def resume(self):
+        self.commands.put(('resume',))
+
+    def hide(self):
+        """Close the window, e.g. so that libvlc's video window can be seen"""
+        self.commands.put(('hide',))
+
+    def close(self):
+        self.commands.put(('close',))
+        self.thread.join(timeout=5)
+
+    def _emit(self, kind, path):
+        if self.on_event and path is not None:
+            self.on_event(kind, path)
+
+    def _run(self, started):
+        try:
+            self.pygame.display.init()
+            info = self.pygame.display.Info()
+            self.size = (info.current_w, info.current_h)
+            log.info("Slideshow display: %sx%s", *self.size)
+        except Exception as e:
+            log.warning("Slideshow display unavailable: %s", e)
+            return
+        finally:
+            started.set()
+
+        while True:
+            timeout = EVENT_PUMP_SECONDS
+            if self.deadline is not None:
+                timeout = min(timeout, max(0, self.deadline - time.monotonic()))
+            try:
+                command = self.commands.get(timeout=timeout)
+            except queue.Empty:
+                command = None
+
+            if self.screen is not None:
+                # Keeps the window responsive to the window manager
+                self.pygame.event.pump()
+
+            if command is None:
+                if self.deadline is not None and time.monotonic() >= self.deadline:
+                    self.deadline = None
+                    self._emit('ended', self.path)
+                continue
+
+            name, args = command[0], command[1:]
+            try:
+                if name == 'show':
+                    self._show(*args)
+                elif name == 'preload':
+                    frame_path, = args
+                    if frame_path not in self.ready:
+                        self.ready = {frame_path: self.pygame.image.load(frame_path)}
+                elif name == 'pause' and self.deadline is not None:
+                    self.remaining = max(0, self.deadline - time.monotonic())
+                    self.deadline = None
+                elif name == 'resume' and self.remaining is not None:
+                    self.deadline = time.monotonic() + self.remaining
+                    self.remaining = None
+                elif name in ('hide', 'close'):
+                    self._close_window()
+                    if name == 'close':
+                        self.pygame.display.quit()
+                        return
+            except Exception as e:
+                log.error("Slideshow %s failed: %s", name, e)
+                if name == 'show':
+                    self.deadline = None
+                    self._emit('error', args[1])
+
+    def _show(self, frame_path, path, duration):
+        self.path = path
+        self.deadline = None
+        self.remaining = None
+        surface = self.ready.pop(frame_path, None)
+        if surface is None:
+            surface = self.pygame.image.load(frame_path)
+
+        if self.screen is None:
+            self.screen = self.pygame.display.set_mode(self.size, self.pygame.FULLSCREEN)
+            self.pygame.mouse.set_visible(False)
+        surface = surface.convert()
+        offset = ((self.size[0] - surface.get_width()) // 2, (self.size[1] - surface.get_height()) // 2)
+
+        previous = self.shown
+        self.shown = (surface, offset)
+        steps = int(self.crossfade_seconds * CROSSFADE_FPS)
+        if previous is not None and steps > 0:
+            for step in range(1, steps + 1):
+                surface.set_alpha(255 * step // steps)
+                self.screen.fill((0, 0, 0))
+                self.screen.blit(*previous)
+                self.screen.blit(surface, offset)
+                self.pygame.display.flip()
+                if step == 1:
+                    self._emit('playing', path)
+                # A newer command ends the fade early
+                if not self.commands.empty():
+                    break
+                time.sleep(1 / CROSSFADE_FPS)
+            surface.set_alpha(None)
+
+        self.screen.fill((0, 0, 0))
+        self.screen.blit(surface, offset)
+        self.pygame.display.flip()
+        if previous is None or steps <= 0:
+            self._emit('playing', path)
+        self.deadline = time.monotonic() + duration
+
+    def _close_window(self):
+        self.deadline = None
+        self.remaining = None
+        self.path = None
+        self.shown = None
+        if self.screen is not None:
+            self.pygame.display.quit()
+            self.pygame.display.init()
+            self.screen = None
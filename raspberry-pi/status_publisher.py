@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+PanelSena Status Publisher
+Writes display status to the Realtime Database as deltas against the last published snapshot
+"""
+
+import json
+
+# Written like any other field, but a change to these alone is not reported
+# as a status change
+QUIET_FIELDS = ('lastHeartbeat', 'metrics')
+
+
+class StatusPublisher:
+    def __init__(self, status_ref):
+        self.status_ref = status_ref
+
+        # Snapshot as last acknowledged by the database, None until the first full write
+        self.published = None
+
+    def reset(self):
+        """Force the next publish to be a full write"""
+        self.published = None
+
+    def publish(self, snapshot):
+        """Publish a status snapshot, returning (changed, bytes_written)
+
+        The first publish is a full `set()`. After that only fields that differ
+        from the last published snapshot are sent, as one multi-path
+        `update()`. Nested objects are diffed one level deep. If nothing
+        changed, only `lastHeartbeat` is written. Changes confined to
+        QUIET_FIELDS are written but not reported as a change.
+        """
+        if self.published is None:
+            self.status_ref.set(snapshot)
+            self.published = self._copy(snapshot)
+            return True, len(json.dumps(snapshot))
+
+        updates = self.diff(self.published, snapshot)
+        changed = any(path.split('/')[0] not in QUIET_FIELDS for path in updates)
+        if 'lastHeartbeat' in snapshot:
+            updates['lastHeartbeat'] = snapshot['lastHeartbeat']
+
+        if updates:
+            self.status_ref.update(updates)
+        self.published = self._copy(snapshot)
+        return changed, len(json.dumps(updates))
+
+    @staticmethod
+    def diff(old, new):
+        """Multi-path update turning `old` into `new`, ignoring lastHeartbeat"""
+        updates = {}
+        for key in set(old) | set(new):
+            if key == 'lastHeartbeat':
+                continue
+            old_value = old.get(key)
+            new_value = new.get(key)
+            if old_value == new_value:
+                continue
+
+            if isinstance(old_value, dict) and isinstance(new_value, dict):
+                for child in set(old_value) | set(new_value):
+                    if old_value.get(child) != new_value.get(child):
+                        updates[f'{key}/{child}'] = new_value.get(child)
+            else:
+                # Writing None deletes the field, matching a full set() without it
+                updates[key] = new_value
+        return updates
+
+    @staticmethod
+    def _copy(snapshot):
+        return json.loads(json.dumps(snapshot))
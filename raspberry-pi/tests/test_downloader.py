@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from downloader import Downloader, DownloadError
+
+
+class FakeBlob:
+    """A Storage blob whose downloads stop after `cut_at` bytes of the object"""
+
+    def __init__(self, data, cut_at=None):
+        self.data = data
+        self.cut_at = len(data) if cut_at is None else cut_at
+        self.size = len(data)
+        self.md5_hash = None
+        self.crc32c = None
+        self.generation = 1
+        self.ranges = []
+
+    def reload(self):
+        pass
+
+    def download_to_file(self, writer, start=0, end=None):
+        end = self.size - 1 if end is None else end
+        self.ranges.append((start, end))
+        writer.write(self.data[start:min(end + 1, self.cut_at)])
+
+
+class FakeBucket:
+    def __init__(self, blob):
+        self._blob = blob
+
+    def blob(self, path):
+        return self._blob
+
+
+DATA = bytes(range(256)) * 64
+
+
+def download(tmp_path, blob):
+    local_path = str(tmp_path / 'content.bin')
+    return local_path, Downloader(FakeBucket(blob)).download('content/file.bin', local_path)
+
+
+def test_complete_download(tmp_path):
+    local_path, (validators, checksum) = download(tmp_path, FakeBlob(DATA))
+    with open(local_path, 'rb') as f:
+        assert f.read() == DATA
+    assert validators['generation'] == 1
+    assert not os.path.exists(local_path + '.part')
+
+
+def test_cut_short_download_is_rejected(tmp_path):
+    local_path = str(tmp_path / 'content.bin')
+    with pytest.raises(DownloadError):
+        download(tmp_path, FakeBlob(DATA, cut_at=1000))
+    assert not os.path.exists(local_path)
+
+    # The bytes that did arrive are kept for the retry
+    with open(local_path + '.part.json') as f:
+        assert json.load(f)['segments'][0][2] == 1000
+
+
+def test_cut_short_resume_is_rejected(tmp_path):
+    local_path = str(tmp_path / 'content.bin')
+    with pytest.raises(DownloadError):
+        download(tmp_path, FakeBlob(DATA, cut_at=1000))
+
+    blob = FakeBlob(DATA, cut_at=3000)
+    with pytest.raises(DownloadError):
+        download(tmp_path, blob)
+    assert blob.ranges == [(1000, len(DATA) - 1)]
+    assert not os.path.exists(local_path)
+
+    blob = FakeBlob(DATA)
+    download(tmp_path, blob)
+    assert blob.ranges == [(3000, len(DATA) - 1)]
+    with open(local_path, 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_revalidate_without_validator_values_is_stale():
+    downloader = Downloader(FakeBucket(FakeBlob(DATA)))
+    assert not downloader.revalidate('https://example.com/a.mp4', {})
+    assert not downloader.revalidate('https://example.com/a.mp4', {'etag': None, 'lastModified': None})
+    assert not downloader.revalidate('content/file.bin', {'generation': None, 'md5': None})
+    assert downloader.revalidate('content/file.bin', {'generation': 1, 'md5': None})
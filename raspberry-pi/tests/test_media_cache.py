@@ -0,0 +1,44 @@
+import os
+
+from media_cache import MediaCache
+
+
+def make_cache(tmp_path):
+    content_dir = tmp_path / 'content'
+    cache_dir = tmp_path / 'cache'
+    content_dir.mkdir()
+    cache_dir.mkdir()
+    return MediaCache(str(content_dir), str(cache_dir), 10 * 1024 * 1024)
+
+
+def write(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    return str(path)
+
+
+def test_lookup_of_missing_file_removes_its_variants(tmp_path):
+    cache = make_cache(tmp_path)
+    path = write(tmp_path / 'content' / 'a.mp4', 1000)
+    cache.add('a', path, 'content/a.mp4')
+    variant = write(tmp_path / 'a.720p.mp4', 500)
+    assert cache.add_variant('a', '720p', variant, cache.get_entry('a')['checksum'])
+
+    os.remove(path)
+    assert cache.lookup('a') is None
+    assert not os.path.exists(variant)
+    assert cache.total_bytes() == 0
+
+
+def test_evict_removes_variants(tmp_path):
+    cache = make_cache(tmp_path)
+    path = write(tmp_path / 'content' / 'a.mp4', 1000)
+    cache.add('a', path, 'content/a.mp4')
+    variant = write(tmp_path / 'a.720p.mp4', 500)
+    cache.add_variant('a', '720p', variant, cache.get_entry('a')['checksum'])
+
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.get_entry('a') is None
+    assert not os.path.exists(path)
+    assert not os.path.exists(variant)
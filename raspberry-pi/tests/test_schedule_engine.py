@@ -0,0 +1,92 @@
+from datetime import datetime
+
+from schedule_engine import ScheduleEngine, schedule_windows
+
+
+def windows(schedule, start, end):
+    return list(schedule_windows(schedule, start, end))
+
+
+def test_once():
+    schedule = {'startDate': '2026-03-02', 'endDate': '2026-03-04', 'startTime': '09:00', 'endTime': '17:00'}
+    assert windows(schedule, datetime(2026, 3, 1), datetime(2026, 3, 10)) == [
+        (datetime(2026, 3, 2, 9), datetime(2026, 3, 4, 17)),
+    ]
+    assert windows(schedule, datetime(2026, 3, 5), datetime(2026, 3, 10)) == []
+
+
+def test_once_overnight():
+    schedule = {'startDate': '2026-03-02', 'endDate': '2026-03-02', 'startTime': '22:00', 'endTime': '02:00'}
+    assert windows(schedule, datetime(2026, 3, 2), datetime(2026, 3, 4)) == [
+        (datetime(2026, 3, 2, 22), datetime(2026, 3, 3, 2)),
+    ]
+
+
+def test_once_without_end_date_never_ends():
+    schedule = {'startDate': '2026-03-02', 'startTime': '09:00'}
+    assert windows(schedule, datetime(2027, 1, 1), datetime(2027, 1, 2)) == [
+        (datetime(2026, 3, 2, 9), datetime.max),
+    ]
+
+
+def test_daily():
+    schedule = {'startDate': '2026-03-02', 'endDate': '2026-03-03', 'repeat': 'daily',
+                'startTime': '09:00', 'endTime': '17:00'}
+    assert windows(schedule, datetime(2026, 3, 1), datetime(2026, 3, 10)) == [
+        (datetime(2026, 3, 2, 9), datetime(2026, 3, 2, 17)),
+        (datetime(2026, 3, 3, 9), datetime(2026, 3, 3, 17)),
+    ]
+
+
+def test_daily_overnight_window_from_the_day_before():
+    schedule = {'startDate': '2026-03-01', 'repeat': 'daily', 'startTime': '22:00', 'endTime': '02:00'}
+    assert windows(schedule, datetime(2026, 3, 3, 1), datetime(2026, 3, 3, 12)) == [
+        (datetime(2026, 3, 2, 22), datetime(2026, 3, 3, 2)),
+    ]
+
+
+def test_weekly_uses_the_start_date_weekday():
+    # 2026-03-02 is a Monday
+    schedule = {'startDate': '2026-03-02', 'repeat': 'weekly', 'startTime': '08:00', 'endTime': '09:00'}
+    assert [start for start, _ in windows(schedule, datetime(2026, 3, 1), datetime(2026, 3, 20))] == [
+        datetime(2026, 3, 2, 8), datetime(2026, 3, 9, 8), datetime(2026, 3, 16, 8),
+    ]
+
+
+def test_inactive_and_undated_schedules_never_air():
+    assert windows({'startDate': '2026-03-02', 'status': 'paused'}, datetime(2026, 3, 1), datetime(2026, 3, 10)) == []
+    assert windows({'repeat': 'daily'}, datetime(2026, 3, 1), datetime(2026, 3, 10)) == []
+
+
+def test_active_at_overnight_once():
+    engine = ScheduleEngine()
+    engine.set_schedules({
+        'night': {'startDate': '2026-03-02', 'endDate': '2026-03-02', 'startTime': '22:00', 'endTime': '02:00'},
+    })
+    assert engine.active_at(datetime(2026, 3, 2, 21)) is None
+    assert engine.active_at(datetime(2026, 3, 2, 23)) == 'night'
+    assert engine.active_at(datetime(2026, 3, 3, 1, 59)) == 'night'
+    assert engine.active_at(datetime(2026, 3, 3, 2)) is None
+
+
+def test_active_at_later_start_wins():
+    engine = ScheduleEngine()
+    engine.set_schedules({
+        'all-day': {'startDate': '2026-03-02', 'repeat': 'daily', 'startTime': '00:00'},
+        'lunch': {'startDate': '2026-03-02', 'repeat': 'daily', 'startTime': '12:00', 'endTime': '13:00'},
+    })
+    now = datetime(2026, 3, 3, 11)
+    assert engine.active_at(now) == 'all-day'
+    assert engine.next_transition(now) == datetime(2026, 3, 3, 12)
+    assert engine.active_at(datetime(2026, 3, 3, 12, 30)) == 'lunch'
+    assert engine.active_at(datetime(2026, 3, 3, 13)) == 'all-day'
+
+
+def test_active_at_weekly_and_next_on_air():
+    engine = ScheduleEngine()
+    engine.set_schedules({
+        'monday': {'startDate': '2026-03-02', 'repeat': 'weekly', 'startTime': '08:00', 'endTime': '09:00'},
+    })
+    assert engine.active_at(datetime(2026, 3, 9, 8, 30)) == 'monday'
+    assert engine.active_at(datetime(2026, 3, 10, 8, 30)) is None
+    assert engine.next_on_air(datetime(2026, 3, 9, 7)) == 'monday'
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+PanelSena Transcoder
+Normalizes downloaded video to a profile the device decodes smoothly, using ffprobe and ffmpeg
+"""
+
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import threading
+from fractions import Fraction
+
+log = logging.getLogger(__name__)
+
+TRANSCODE_DIR = "normalized"
+# H.264 at up to 1080p30 is what the Raspberry Pi decodes in hardware
+DEFAULT_DEVICE_PROFILE = {
+    'codec': 'h264',
+    'max_width': 1920,
+    'max_height': 1080,
+    'max_fps': 30,
+    'max_bitrate_kbps': 10000,
+}
+DEFAULT_ENCODER = 'libx264'
+# The hardware decoder only takes 8-bit 4:2:0
+DECODABLE_PIX_FMTS = ('yuv420p', 'yuvj420p')
+PROBE_TIMEOUT_SECONDS = 30
+AUDIO_BITRATE = '128k'
+
+
+class TranscodeError(Exception):
+    """ffprobe or ffmpeg failed"""
+
+
+class Transcoder:
+    """Probe cached videos and transcode the ones outside the device profile
+
+    Outputs are named by content ID and profile, so changing the profile
+    produces new copies instead of reusing old ones. ffmpeg runs at the
+    lowest CPU priority, one file at a time.
+    """
+
+    def __init__(self, output_dir, profile=None, encoder=DEFAULT_ENCODER, ffmpeg='ffmpeg', ffprobe='ffprobe'):
+        self.output_dir = output_dir
+        self.profile = {**DEFAULT_DEVICE_PROFILE, **(profile or {})}
+        self.encoder = encoder
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        p = self.profile
+        self.profile_key = f"{p['codec']}-{p['max_width']}x{p['max_height']}-{p['max_fps']}fps-{p['max_bitrate_kbps']}k"
+
+        self.process = None
+        self.stopped = False
+        self.lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    @staticmethod
+    def available(ffmpeg='ffmpeg', ffprobe='ffprobe'):
+        """True if both tools are on the PATH"""
+        return shutil.which(ffmpeg) is not None and shutil.which(ffprobe) is not None
+
+    def probe(self, path):
+        """Return the first video stream's codec, pix_fmt, size, frame rate and bit rate, or None if there is none"""
+        result = subprocess.run(
+            [self.ffprobe, '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=codec_name,pix_fmt,width,height,avg_frame_rate,bit_rate:format=bit_rate',
+             '-of', 'json', path],
+            capture_output=True,
+            text=True,
+            timeout=PROBE_TIMEOUT_SECONDS
+        )
+        if result.returncode != 0:
+            raise TranscodeError(f"ffprobe failed: {result.stderr.strip()}")
+
+        data = json.loads(result.stdout or '{}')
+        streams = data.get('streams') or []
+        if not streams:
+            return None
+        stream = streams[0]
+        try:
+            fps = float(Fraction(stream.get('avg_frame_rate') or '0'))
+        except (ValueError, ZeroDivisionError):
+            fps = 0.0
+        # Container bit rate when the stream does not carry its own
+        bit_rate = stream.get('bit_rate') or data.get('format', {}).get('bit_rate')
+        return {
+            'codec': stream.get('codec_name'),
+            'pix_fmt': stream.get('pix_fmt'),
+            'width': int(stream.get('width') or 0),
+            'height': int(stream.get('height') or 0),
+            'fps': fps,
+            'bit_rate': int(bit_rate) if bit_rate and str(bit_rate).isdigit() else None,
+        }
+
+    def mismatches(self, info):
+        """Reasons a probed video is outside the profile; empty if it fits"""
+        if info is None:
+            return []
+        p = self.profile
+        reasons = []
+        if info['codec'] != p['codec']:
+            reasons.append(f"codec {info['codec']}")
+        if info['pix_fmt'] and info['pix_fmt'] not in DECODABLE_PIX_FMTS:
+            reasons.append(f"pixel format {info['pix_fmt']}")
+        if info['width'] > p['max_width'] or info['height'] > p['max_height']:
+            reasons.append(f"{info['width']}x{info['height']}")
+        if info['fps'] > p['max_fps'] + 0.5:
+            reasons.append(f"{info['fps']:.0f} fps")
+        if info['bit_rate'] and info['bit_rate'] > p['max_bitrate_kbps'] * 1000:
+            reasons.append(f"{info['bit_rate'] // 1000} kbps")
+        return reasons
+
+    def output_path(self, content_id):
+        return os.path.join(self.output_dir, f"{content_id}.{self.profile_key}.mp4")
+
+    def transcode(self, source_path, content_id, info):
+        """Transcode a video into the profile and return the output path"""
+        p = self.profile
+        output_path = self.output_path(content_id)
+        tmp_path = output_path + '.tmp'
+
+        # Only ever scale down, to even dimensions
+        filters = [
+            f"scale='min({p['max_width']},iw)':'min({p['max_height']},ih)':force_original_aspect_ratio=decrease",
+            "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+        ]
+        if info and info['fps'] > p['max_fps'] + 0.5:
+            filters.append(f"fps={p['max_fps']}")
+
+        bitrate = p['max_bitrate_kbps']
+        command = [
+            self.ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+            '-i', source_path,
+            '-map', '0:v:0', '-map', '0:a:0?',
+            '-vf', ','.join(filters),
+            '-c:v', self.encoder, '-pix_fmt', 'yuv420p',
+            '-b:v', f"{bitrate * 4 // 5}k", '-maxrate', f"{bitrate}k", '-bufsize', f"{bitrate * 2}k",
+        ]
+        if self.encoder == 'libx264':
+            command += ['-preset', 'veryfast', '-profile:v', 'high']
+        command += ['-c:a', 'aac', '-b:a', AUDIO_BITRATE, '-movflags', '+faststart', '-f', 'mp4', tmp_path]
+        if shutil.which('nice'):
+            command = ['nice', '-n', '19'] + command
+
+        with self.lock:
+            if self.stopped:
+                raise TranscodeError("Transcoder stopped")
+            # A session of its own, so that stop() can kill it with anything it started
+            self.process = subprocess.Popen(
+                command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                start_new_session=True)
+        try:
+            _, stderr = self.process.communicate()
+            if self.process.returncode != 0:
+                raise TranscodeError(f"ffmpeg exited with {self.process.returncode}: {stderr.strip()[-500:]}")
+            os.replace(tmp_path, output_path)
+        finally:
+            with self.lock:
+                self.process = None
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return output_path
+
+    def stop(self):
+        """Kill a running transcode; no new ones start afterwards"""
+        with self.lock:
+            self.stopped = True
+            if self.process is not None:
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass